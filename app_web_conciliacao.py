@@ -1,412 +1,129 @@
+import io
+
 import streamlit as st
+import numpy as np
 import pandas as pd
-import re
-import io
-from fpdf import FPDF
 from datetime import datetime
-from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
-from openpyxl.utils import get_column_letter
 
-# --- Bloco 1: Lógica Principal da Conciliação ---
+from armazenamento import PASTA_CONTABEIS, PASTA_RESULTADOS, data_resultado, ler_resultado
+from auditoria import LINHAS_POR_PAGINA, RepositorioAuditoria
+from cache_fontes import limpar_cache
+from conciliacao import CAMINHO_DEPARA, MESES, carregar_depara, gerar_chave_padronizada
+from correspondencias import LADO_CONTABIL, LADO_EXTRATO, sugerir_correspondencias
+from historico import contas_divergentes_consecutivas, evolucao_conta, meses_registrados
+from lancamentos import JANELA_DIAS, conferir_lancamentos
+from rastreamento import Rastreamento, registrar_saida
+from relatorios import GERADORES, estilo_moeda_br, formatar_moeda_br, impressao_resultado, mascara_divergentes
+from tarefas import ExecutorTarefas, Tarefa
 
-def converter_saldo_internacional(valor_texto):
-    """
-    Converte uma string de moeda no formato internacional (ex: '1,234.56')
-    para um valor numérico (float).
-    
-    1. Garante que o valor de entrada seja um texto (string).
-    2. Apenas remove o separador de milhar (','). O ponto já é o
-       separador decimal correto para o Python.
-    3. Converte a string limpa para um número.
-    4. Se ocorrer qualquer erro, retorna 0.
-    """
-    if not isinstance(valor_texto, str):
-        return 0.0
-    try:
-        # Apenas remove as vírgulas de milhar
-        valor_limpo = valor_texto.replace(',', '', -1)
-        return pd.to_numeric(valor_limpo)
-    except (ValueError, TypeError):
-        return 0.0
-
-def converter_saldo_brasileiro(valor_texto):
-    """
-    Converte uma string de moeda no formato brasileiro (ex: '1.234,56')
-    para um valor numérico (float).
-    
-    1. Garante que o valor de entrada seja um texto (string).
-    2. Remove o separador de milhar ('.').
-    3. Substitui o separador decimal (',') por ('.').
-    4. Converte a string limpa para um número.
-    5. Se ocorrer qualquer erro, retorna 0.
-    """
-    if not isinstance(valor_texto, str):
-        return 0.0
-    try:
-        # Remove '.' de milhar e substitui ',' de decimal por '.'
-        valor_limpo = valor_texto.replace('.', '', -1).replace(',', '.', -1)
-        return pd.to_numeric(valor_limpo)
-    except (ValueError, TypeError):
-        return 0.0
-
-def gerar_chave_padronizada(texto_conta):
-    """
-    Padroniza a criação da chave para DE-PARA e Extratos.
-    1. Extrai apenas os dígitos.
-    2. Pega os últimos 7 dígitos.
-    3. Garante que a chave tenha SEMPRE 7 dígitos.
-    """
-    if isinstance(texto_conta, str):
-        parte_numerica = re.sub(r'\D', '', texto_conta)
-        ultimos_7_digitos = parte_numerica[-7:]
-        return ultimos_7_digitos.zfill(7)
-    return None
 
-def gerar_chave_contabil(texto_conta):
-    """
-    Extrai a chave do campo 'Domicílio bancário' e a padroniza para 7 dígitos.
+@st.cache_data(max_entries=6, show_spinner=False)
+def gerar_relatorio(impressao, formato, _resultado, _formatado=None, **opcoes):
     """
-    if not isinstance(texto_conta, str):
-        return None
-    try:
-        partes = texto_conta.split('-')
-        if len(partes) > 2:
-            parte_conta = partes[2]
-            conta_numerica = re.sub(r'\D', '', parte_conta)
-            ultimos_7_digitos = conta_numerica[-7:]
-            return ultimos_7_digitos.zfill(7)
-    except (IndexError, AttributeError):
-        return None
-    return None
-
-def carregar_depara():
-    """Carrega o arquivo DE-PARA e padroniza as chaves."""
-    try:
-        df_depara = pd.read_excel(
-            "depara/DEPARA_CONTAS BANCÁRIAS_CEF.xlsx",
-            sheet_name="2025_JUNHO (2)",
-            dtype=str
-        )
-        df_depara.columns = ['Conta Antiga', 'Conta Nova']
-        df_depara['Chave Antiga'] = df_depara['Conta Antiga'].apply(gerar_chave_padronizada)
-        df_depara['Chave Nova'] = df_depara['Conta Nova'].apply(gerar_chave_padronizada)
-        return df_depara
-    except FileNotFoundError:
-        st.warning("Aviso: Arquivo DE-PARA 'depara/DEPARA_CONTAS BANCÁRIAS_CEF.xlsx' não encontrado. A tradução de contas não será aplicada.")
-        return pd.DataFrame()
-
-def processar_relatorio_contabil(arquivo_carregado, df_depara):
-    """Lê o relatório contábil e aplica a tradução DE-PARA."""
-    df = pd.read_csv(arquivo_carregado, encoding='latin-1', sep=';', header=1)
-
-    df['Chave Primaria'] = df['Domicílio bancário'].apply(gerar_chave_contabil)
-    
-    df.dropna(subset=['Chave Primaria'], inplace=True)
-    df = df[df['Chave Primaria'] != '']
-
-    if not df_depara.empty:
-        df_depara_map = df_depara.copy()
-        df_depara_map['Chave Antiga'] = df_depara_map['Chave Antiga'].astype(str)
-        df['Chave Primaria'] = df['Chave Primaria'].astype(str)
-        
-        mapa_depara = df_depara_map.set_index('Chave Antiga')['Chave Nova'].to_dict()
-        df['Chave Primaria'] = df['Chave Primaria'].replace(mapa_depara)
-
-    df['Saldo Final'] = pd.to_numeric(
-        df['Saldo Final'].astype(str).str.replace('.', '', regex=False).str.replace(',', '.', regex=False),
-        errors='coerce'
-    ).fillna(0)
-
-    df_pivot = df.pivot_table(index='Chave Primaria', columns='Conta contábil', values='Saldo Final', aggfunc='sum').reset_index()
-
-    rename_dict = {c: 'Saldo_Corrente_Contabil' for c in df_pivot.columns if '111111901' in str(c)}
-    rename_dict.update({c: 'Saldo_Aplicado_Contabil' for c in df_pivot.columns if '111115001' in str(c)})
-    df_pivot.rename(columns=rename_dict, inplace=True)
-
-    mapa_conta = df[['Chave Primaria', 'Domicílio bancário']].drop_duplicates().set_index('Chave Primaria')
-    df_final = df_pivot.join(mapa_conta, on='Chave Primaria')
-
-    if 'Saldo_Corrente_Contabil' not in df_final.columns:
-        df_final['Saldo_Corrente_Contabil'] = 0
-    if 'Saldo_Aplicado_Contabil' not in df_final.columns:
-        df_final['Saldo_Aplicado_Contabil'] = 0
-
-    return df, df_final
-
-# --- FUNÇÃO ATUALIZADA ---
-
-def processar_extrato_bb_bruto_csv(caminho_arquivo):
+    Gera o arquivo do relatório sob demanda (no clique de download).
+    O cache é indexado pela impressão do resultado, calculada uma vez na
+    conciliação; '_resultado' e '_formatado' não são hasheados pelo Streamlit.
     """
-    Lê e transforma o arquivo .csv bruto do Banco do Brasil.
-    """
-    df = pd.read_csv(caminho_arquivo, sep=',', encoding='latin-1', dtype=str)
-    
-    # Padroniza os nomes das colunas importantes
-    df.rename(columns={
-        'Conta': 'Conta', # Ajuste se o nome no seu CSV for diferente
-        'Saldo em conta': 'Saldo_Corrente_Extrato',
-        'Saldo investido': 'Saldo_Aplicado_Extrato'
-    }, inplace=True)
-
-    # Cria a chave primária a partir da coluna 'Conta' já padronizada
-    if 'Conta' in df.columns:
-        df['Chave Primaria'] = df['Conta'].apply(gerar_chave_padronizada)
-    else:
-        st.error("Erro no arquivo do BB: A coluna 'Conta' não foi encontrada. Verifique o df.rename.")
-        return pd.DataFrame()
-
-    # Adiciona a coluna de agência como vazia para manter compatibilidade
-    df['Agencia_Extrato'] = None
-    
-    # --- BLOCO DE CONVERSÃO ATUALIZADO ---
-    # Agora chama a função correta para o formato internacional do BB.
-    for col in ['Saldo_Corrente_Extrato', 'Saldo_Aplicado_Extrato', 'Saldo total']:
-        if col in df.columns:
-            df[col] = df[col].apply(converter_saldo_internacional) # <--- MUDANÇA AQUI
-    # --- FIM DO BLOCO DE CONVERSÃO ---
-            
-    # Garante que as colunas de saldo existam no DataFrame final
-    if 'Saldo_Corrente_Extrato' not in df.columns:
-        df['Saldo_Corrente_Extrato'] = 0
-    if 'Saldo_Aplicado_Extrato' not in df.columns:
-        df['Saldo_Aplicado_Extrato'] = 0
-            
-    return df
-
-def processar_extrato_cef_bruto(caminho_arquivo):
-    """
-    Lê o arquivo .cef da Caixa e extrai o prefixo de banco/agência.
-    Esta versão é mais robusta e lida com variações no nome da coluna da conta.
-    """
-    with open(caminho_arquivo, 'r', encoding='latin-1') as f:
-        cef_content = f.readlines()
-        
-    header_line_index = -1
-    for i, line in enumerate(cef_content):
-        if line.strip().startswith("Conta Vinculada;") or line.strip().startswith("Nome Conta Vinculada;"):
-            header_line_index = i
-            break
-            
-    if header_line_index == -1:
-        st.error("Erro no arquivo da CEF: Não foi possível encontrar a linha de cabeçalho ('Conta Vinculada;' ou 'Nome Conta Vinculada;').")
-        return pd.DataFrame()
-
-    data_io = io.StringIO("".join(cef_content[header_line_index:]))
-    df = pd.read_csv(data_io, sep=';', dtype=str)
-    
-    nome_coluna_conta = None
-    if 'Conta Vinculada' in df.columns:
-        nome_coluna_conta = 'Conta Vinculada'
-    elif 'Nome Conta Vinculada' in df.columns:
-        nome_coluna_conta = 'Nome Conta Vinculada'
-    
-    if nome_coluna_conta is None:
-        st.error("Erro no arquivo da CEF: Não foi possível encontrar a coluna de identificação da conta ('Conta Vinculada' ou 'Nome Conta Vinculada').")
-        return pd.DataFrame()
-
-    df['Chave Primaria'] = df[nome_coluna_conta].apply(gerar_chave_padronizada)
-    df['Agencia_Extrato'] = df[nome_coluna_conta].str[:9]
-    
-    df.rename(columns={
-        'Saldo Conta Corrente (R$)': 'Saldo_Corrente_Extrato',
-        'Saldo Aplicado (R$)': 'Saldo_Aplicado_Extrato'
-    }, inplace=True)
-
-    # --- INÍCIO DO BLOCO CORRIGIDO ---
-    # Documentação: Converte as colunas de saldo para formato numérico.
-    for col in ['Saldo_Corrente_Extrato', 'Saldo_Aplicado_Extrato']:
-        if col in df.columns:
-            df[col] = df[col].apply(converter_saldo_brasileiro)
-    # --- FIM DO BLOCO CORRIGIDO ---
-            
-    # Garante que as colunas de saldo existam, mesmo que vazias
-    if 'Saldo_Corrente_Extrato' not in df.columns:
-        df['Saldo_Corrente_Extrato'] = 0
-    if 'Saldo_Aplicado_Extrato' not in df.columns:
-        df['Saldo_Aplicado_Extrato'] = 0
-        
-    return df
-
-def realizar_conciliacao(df_contabil, df_extrato_unificado):
+    if _formatado is not None:
+        opcoes['formatado'] = _formatado
+    return GERADORES[formato](_resultado, **opcoes)
+
+
+def exportar_relatorio(rastreamento, impressao, formato, resultado, formatado=None, **opcoes):
     """
-    Realiza a conciliação final, usando a informação de agência do extrato
-    da Caixa para construir a descrição correta da conta.
+    Gera o relatório para download e registra a exportação no rastreamento da
+    execução. Roda fora da execução do script (no clique do botão), então o
+    rastreamento vem lido da sessão pelo script e não de st.session_state.
     """
-    df_contabil_pivot = df_contabil[['Chave Primaria', 'Domicílio bancário', 'Saldo_Corrente_Contabil', 'Saldo_Aplicado_Contabil']]
-    
-    # Agrupa os extratos e mantém a informação da agência extraída
-    df_extrato_pivot = df_extrato_unificado.groupby('Chave Primaria').agg({
-        'Saldo_Corrente_Extrato': 'sum',
-        'Saldo_Aplicado_Extrato': 'sum',
-        'Agencia_Extrato': 'first' # 'first' pega o primeiro valor encontrado (ignora Nulos)
-    }).reset_index()
-    
-    df_contabil_pivot['Chave Primaria'] = df_contabil_pivot['Chave Primaria'].astype(str)
-    df_extrato_pivot['Chave Primaria'] = df_extrato_pivot['Chave Primaria'].astype(str)
-
-    df_final = pd.merge(df_contabil_pivot, df_extrato_pivot, on='Chave Primaria', how='inner')
-    if df_final.empty: return pd.DataFrame()
-
-    def criar_descricao_final(row):
-        agencia_extrato = row['Agencia_Extrato']
-        domicilio_contabil = row['Domicílio bancário']
-        
-        # Se a coluna 'Agencia_Extrato' não for nula (ou seja, é uma conta da CEF)
-        if pd.notna(agencia_extrato):
-            try:
-                # Tenta extrair o número da conta da descrição original
-                conta_parte = domicilio_contabil.split('-')[2].strip()
-                return f"{agencia_extrato} - {conta_parte}"
-            except IndexError:
-                # Se o formato original for inesperado, usa a chave como fallback
-                return f"{agencia_extrato} - {row['Chave Primaria']}"
-        else:
-            # Se for nulo (outros bancos), usa a descrição original do arquivo contábil
-            return domicilio_contabil
-
-    df_final['Conta Bancária'] = df_final.apply(criar_descricao_final, axis=1)
-
-    df_final['Diferenca_Movimento'] = df_final['Saldo_Corrente_Contabil'] - df_final['Saldo_Corrente_Extrato']
-    df_final['Diferenca_Aplicacao'] = df_final['Saldo_Aplicado_Contabil'] - df_final['Saldo_Aplicado_Extrato']
-    
-    df_final = df_final.set_index('Conta Bancária')
-    df_final = df_final[['Saldo_Corrente_Contabil', 'Saldo_Corrente_Extrato', 'Diferenca_Movimento','Saldo_Aplicado_Contabil', 'Saldo_Aplicado_Extrato', 'Diferenca_Aplicacao']]
-    df_final.columns = pd.MultiIndex.from_tuples([
-        ('Conta Movimento', 'Saldo Contábil'), ('Conta Movimento', 'Saldo Extrato'), ('Conta Movimento', 'Diferença'),
-        ('Aplicação Financeira', 'Saldo Contábil'), ('Aplicação Financeira', 'Saldo Extrato'), ('Aplicação Financeira', 'Diferença')
-    ], names=['Grupo', 'Item'])
-    return df_final
-
-
-# --- Bloco 2: Funções para Geração de Arquivos ---
-@st.cache_data
-def to_excel(df):
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, index=True, sheet_name='Conciliacao', startrow=1)
-        workbook = writer.book
-        worksheet = writer.sheets['Conciliacao']
-        font_header = Font(bold=True, color="FFFFFF")
-        align_header = Alignment(horizontal='center', vertical='center')
-        fill_header = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
-        border_thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
-        number_format_br = '#,##0.00'
-        worksheet.merge_cells('B1:D1'); cell_movimento = worksheet['B1']; cell_movimento.value = 'Conta Movimento'; cell_movimento.font = font_header; cell_movimento.alignment = align_header; cell_movimento.fill = fill_header
-        worksheet.merge_cells('E1:G1'); cell_aplicacao = worksheet['E1']; cell_aplicacao.value = 'Aplicação Financeira'; cell_aplicacao.font = font_header; cell_aplicacao.alignment = align_header; cell_aplicacao.fill = fill_header
-        for row in worksheet['A2:G2']:
-            for cell in row: cell.font = Font(bold=True); cell.alignment = Alignment(horizontal='center', vertical='center')
-        for col_idx, col in enumerate(worksheet.columns, 1):
-            max_length = 0; column_letter = get_column_letter(col_idx)
-            for cell_idx, cell in enumerate(col, 0):
-                if cell_idx > 0: cell.border = border_thin
-                if cell_idx > 1:
-                    if col_idx == 1: cell.alignment = Alignment(horizontal='left', vertical='center')
-                    else: cell.number_format = number_format_br; cell.alignment = Alignment(horizontal='right', vertical='center')
-                try:
-                    if len(str(cell.value)) > max_length: max_length = len(str(cell.value))
-                except: pass
-            adjusted_width = (max_length + 2); worksheet.column_dimensions[column_letter].width = adjusted_width
-    return output.getvalue()
-
-# --- Bloco 1 de 2 a ser SUBSTITUÍDO (a classe PDF inteira) ---
-
-class PDF(FPDF):
-    def header(self):
-        self.set_font('Arial', 'B', 12)
-        self.cell(0, 8, 'Prefeitura da Cidade do Rio de Janeiro', 0, 1, 'C')
-        self.set_font('Arial', '', 11)
-        self.cell(0, 8, 'Controladoria Geral do Município', 0, 1, 'C')
-        self.set_font('Arial', 'B', 10)
-        self.cell(0, 8, 'Relatório de Conciliação de Saldos Bancários', 0, 1, 'C')
-        self.ln(5)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
-
-    def _draw_table_header(self, col_widths, line_height, start_x, index_name, sub_headers):
-        self.set_font('Arial', 'B', 9)
-        self.set_x(start_x)
-        self.cell(col_widths[0], line_height, index_name, 1, 0, 'C')
-        self.cell(sum(col_widths[1:4]), line_height, 'Conta Movimento', 1, 0, 'C')
-        self.cell(sum(col_widths[4:7]), line_height, 'Aplicação Financeira', 1, 0, 'C')
-        self.ln(line_height)
-        
-        self.set_font('Arial', 'B', 8)
-        self.set_x(start_x)
-        self.cell(col_widths[0], line_height, '', 1, 0, 'C')
-        for i, sub_header in enumerate(sub_headers):
-            self.cell(col_widths[i+1], line_height, sub_header, 1, 0, 'C')
-        self.ln(line_height)
-
-    def create_table(self, data):
-        self.set_auto_page_break(False)
-
-        padding = 5 
-        index_name = data.index.name if data.index.name else 'ID'
-        sub_headers = ['Saldo Contábil', 'Saldo Extrato', 'Diferença'] * 2
-        
-        self.set_font('Arial', 'B', 9)
-        max_index_width = self.get_string_width(index_name)
-        self.set_font('Arial', '', 7)
-        for item in data.index:
-            max_index_width = max(max_index_width, self.get_string_width(str(item)))
-        
-        col_widths = []
-        formatted_data = data.copy()
-        for i, col_tuple in enumerate(data.columns):
-            formatted_data[col_tuple] = data[col_tuple].apply(
-                lambda x: '-' if pd.isna(x) else f'{x:,.2f}'.replace(",", "X").replace(".", ",").replace("X", ".")
-            )
-            self.set_font('Arial', 'B', 8)
-            max_w = self.get_string_width(sub_headers[i])
-            self.set_font('Arial', '', 7)
-            for item in formatted_data[col_tuple]:
-                max_w = max(max_w, self.get_string_width(str(item)))
-            col_widths.append(max_w)
-            
-        col_widths = [max_index_width + padding] + [w + padding for w in col_widths]
-        total_table_width = sum(col_widths)
-        start_x = (self.w - total_table_width) / 2
-        
-        self.set_font('Arial', '', 7)
-        line_height = self.font_size * 2.5
-        
-        self._draw_table_header(col_widths, line_height, start_x, index_name, sub_headers)
-        
-        self.set_font('Arial', '', 7)
-        for index, row in formatted_data.iterrows():
-            # --- ALTERAÇÃO CRUCIAL ---
-            # Documentação: Em vez de usar (self.h - self.b_margin), usamos um
-            # limite vertical absoluto de 180mm. Para uma página A4 paisagem (210mm),
-            # isso deixa 30mm de espaço no fundo, protegendo o rodapé.
-            if self.get_y() + line_height > 180:
-                self.add_page(self.cur_orientation)
-                self._draw_table_header(col_widths, line_height, start_x, index_name, sub_headers)
-                self.set_font('Arial', '', 7)
-
-            self.set_x(start_x)
-            display_index = str(index)
-            self.cell(col_widths[0], line_height, display_index, 1, 0, 'L')
-            for i, item in enumerate(row):
-                self.cell(col_widths[i+1], line_height, str(item), 1, 0, 'R')
-            self.ln(line_height)
-
-# --- Bloco 2 de 2 a ser SUBSTITUÍDO (a função create_pdf) ---
-
-def create_pdf(df):
-    pdf = PDF('L', 'mm', 'A4')
-    # A linha "pdf.b_margin = 40" foi removida pois não é mais necessária.
-    pdf.add_page()
-    pdf.create_table(df)
-    return bytes(pdf.output())
-    
+    if rastreamento is None:
+        return gerar_relatorio(impressao, formato, resultado, formatado, **opcoes)
+    with rastreamento.etapa(f'exportar_{formato}', linhas_entrada=len(resultado)) as registro:
+        dados = gerar_relatorio(impressao, formato, resultado, formatado, **opcoes)
+        registrar_saida(registro, dados)
+    return dados
+
+
+@st.cache_data(max_entries=6, show_spinner=False)
+def resultado_formatado(impressao, _resultado):
+    """Valores do resultado já em texto no padrão brasileiro, formatados uma vez para os rótulos da tela e o PDF."""
+    return formatar_moeda_br(_resultado)
+
+
+@st.cache_data(max_entries=6, show_spinner=False)
+def sugestoes_correspondencia(impressao, _orfas):
+    """Sugestões para as contas sem correspondência, calculadas uma vez por conjunto de órfãs."""
+    return sugerir_correspondencias(_orfas)
+
+
+@st.cache_resource
+def obter_executor():
+    """Executor de tarefas compartilhado por todas as sessões do servidor."""
+    return ExecutorTarefas(pasta_resultados=PASTA_RESULTADOS, pasta_contabeis=PASTA_CONTABEIS)
+
+
+@st.cache_resource
+def obter_repositorio_auditoria():
+    """Dados de origem das conciliações, guardados uma vez para todas as sessões (a sessão guarda só a chave)."""
+    return RepositorioAuditoria()
+
+
+def carregar_tarefa(tarefa):
+    """Copia para a sessão a saída de uma tarefa terminada."""
+    st.session_state['tarefa_carregada'] = tarefa.id
+    st.session_state['origem_resultado'] = ('tarefa', tarefa.mes_ano, None)
+    st.session_state['rastreamento'] = tarefa.rastreamento
+    if tarefa.estado == Tarefa.ERRO:
+        st.session_state['df_resultado'] = None
+        st.session_state['contas_alteradas'] = None
+        st.session_state['mensagens_tarefa'] = [('error', f"Ocorreu um erro {tarefa.erro}")]
+        return
+    saida = tarefa.saida
+    obter_repositorio_auditoria().registrar(tarefa.id, saida['audit_depara'], saida['audit_contabil'], saida['audit_extratos'])
+    st.session_state['auditoria'] = tarefa.id
+    st.session_state['df_resultado'] = saida['resultado']
+    st.session_state['impressao_resultado'] = saida['impressao']
+    st.session_state['contas_alteradas'] = saida['contas_alteradas']
+    for chave in ('resultado_completo', 'orfas', 'colisoes', 'chaves_divergentes'):
+        st.session_state[chave] = saida[chave]
+    st.session_state['conferencia_lancamentos'] = None
+    mensagens = list(saida['mensagens'])
+    if saida['resultado'] is not None:
+        mensagens.append(('success', "Conciliação Concluída com Sucesso!"))
+    st.session_state['mensagens_tarefa'] = mensagens
+
+
+def carregar_resultado_salvo(mes_ano, salvo, gravado_em):
+    """Copia para a sessão um resultado gravado (pelo monitor de extratos ou por uma conciliação anterior)."""
+    st.session_state['origem_resultado'] = ('monitor', mes_ano, gravado_em)
+    st.session_state['df_resultado'] = salvo['resultado']
+    st.session_state['impressao_resultado'] = salvo['impressao']
+    st.session_state['contas_alteradas'] = salvo['contas_alteradas']
+    for chave in ('resultado_completo', 'orfas', 'colisoes', 'chaves_divergentes'):
+        st.session_state[chave] = salvo[chave]
+    st.session_state['conferencia_lancamentos'] = None
+    st.session_state['mensagens_tarefa'] = salvo['mensagens']
+    st.session_state['rastreamento'] = Rastreamento.de_dict(salvo['rastreamento']) if salvo['rastreamento'] else None
+    st.session_state['auditoria'] = None
+
+
+@st.fragment(run_every=1)
+def acompanhar_tarefa(id_tarefa):
+    """Mostra o progresso da tarefa; ao terminar, recarrega a página com o resultado."""
+    tarefa = obter_executor().obter(id_tarefa)
+    if tarefa is None:
+        return
+    if not tarefa.em_andamento:
+        st.rerun()
+    st.info(f"Conciliação de {tarefa.mes_ano.replace('_', ' ')} em andamento (tarefa {tarefa.id}). "
+            "Você pode continuar usando o app ou recuperar o resultado depois pelo id da tarefa.")
+    st.progress(tarefa.progresso(), text=tarefa.descricao_estado())
+
+
 # --- Bloco 3: Interface Web com Streamlit ---
 st.set_page_config(page_title="Conciliação Bancária", layout="wide", page_icon="🏦")
 st.title("🏦 Prefeitura da Cidade do Rio de Janeiro"); st.header("Controladoria Geral do Município"); st.markdown("---"); st.subheader("Conciliação de Saldos Bancários e Contábeis")
 
-meses = {1: "janeiro", 2: "fevereiro", 3: "março", 4: "abril", 5: "maio", 6: "junho", 7: "julho", 8: "agosto", 9: "setembro", 10: "outubro", 11: "novembro", 12: "dezembro"}
+meses = MESES
 ano_atual = datetime.now().year
 opcoes_meses_formatadas = [f"{nome.capitalize()} {ano}" for ano in range(ano_atual, ano_atual + 2) for mes, nome in meses.items()]
 try:
@@ -414,127 +131,243 @@ try:
 except ValueError:
     index_padrao = 0
 st.selectbox("Selecione o Mês da Conciliação:", options=opcoes_meses_formatadas, index=index_padrao, key='mes_selecionado')
+partes_mes = st.session_state.mes_selecionado.lower().split()
+mes_ano_selecionado = f"{partes_mes[0]}_{partes_mes[1]}"
 
 st.sidebar.header("Carregar Relatório Contábil")
 contabilidade_bruto = st.sidebar.file_uploader(f"Selecione o seu Relatório Contábil Bruto de {st.session_state.mes_selecionado}", type=['csv'])
 
+st.sidebar.checkbox("Guardar linhas do relatório contábil para auditoria", key='auditar_contabil',
+                    help="Mantém todas as linhas e colunas do relatório em memória. Evite com relatórios muito grandes.")
+st.sidebar.checkbox("Medir pico de memória por etapa", key='medir_memoria',
+                    help="Usa tracemalloc para medir a memória de cada etapa. Deixa o processamento mais lento.")
+
+if st.sidebar.button("Limpar cache de arquivos", help="Força a releitura do DE-PARA e dos extratos na próxima conciliação."):
+    st.sidebar.info(f"Cache limpo: {limpar_cache()} arquivo(s) removido(s).")
+
 if st.sidebar.button("Conciliar Agora"):
     if contabilidade_bruto is not None:
-        with st.spinner("Processando..."):
-            try:
-                partes_mes = st.session_state.mes_selecionado.lower().split()
-                mes_ano = f"{partes_mes[0]}_{partes_mes[1]}"
-                
-                df_depara = carregar_depara()
-                st.session_state['audit_depara'] = df_depara
-                
-                extratos_encontrados = []
-                st.session_state['audit_bb'] = None
-                st.session_state['audit_cef'] = None
-                
-                try:
-                    caminho_bb = f"extratos_consolidados/extrato_bb_{mes_ano}.csv"
-                    df_bb = processar_extrato_bb_bruto_csv(caminho_bb)
-                    extratos_encontrados.append(df_bb)
-                    st.session_state['audit_bb'] = df_bb
-                except FileNotFoundError:
-                    st.warning(f"Aviso: Extrato do BB (.csv) para {st.session_state.mes_selecionado} não encontrado.")
-                
-                try:
-                    caminho_cef = f"extratos_consolidados/extrato_cef_{mes_ano}.cef"
-                    df_cef = processar_extrato_cef_bruto(caminho_cef)
-                    extratos_encontrados.append(df_cef)
-                    st.session_state['audit_cef'] = df_cef
-                except FileNotFoundError:
-                    st.warning(f"Aviso: Extrato da CEF (.cef) para {st.session_state.mes_selecionado} não encontrado.")
-
-                extratos_encontrados = [df for df in extratos_encontrados if df is not None and not df.empty]
-
-                if not extratos_encontrados:
-                    st.error("Nenhum arquivo de extrato válido foi encontrado no repositório para o mês selecionado.")
-                    st.session_state['df_resultado'] = None
-                else:
-                    df_extrato_unificado = pd.concat(extratos_encontrados, ignore_index=True)
-                    df_contabil_raw_audit, df_contabil_processado = processar_relatorio_contabil(contabilidade_bruto, df_depara)
-                    st.session_state['audit_contabil'] = df_contabil_raw_audit
-                    df_resultado_final = realizar_conciliacao(df_contabil_processado, df_extrato_unificado)
-                    st.success("Conciliação Concluída com Sucesso!")
-                    st.session_state['df_resultado'] = df_resultado_final
-            except Exception as e:
-                st.error(f"Ocorreu um erro durante o processamento: {e}")
-                st.session_state['df_resultado'] = None
+        conteudo_contabil = contabilidade_bruto.getvalue()
+        # A conciliação roda em segundo plano; a sessão continua livre. Ao
+        # concluir, o resultado e o relatório ficam guardados para o monitor de extratos
+        tarefa = obter_executor().submeter(
+            mes_ano_selecionado, conteudo_contabil,
+            manter_auditoria=st.session_state.auditar_contabil, medir_memoria=st.session_state.medir_memoria)
+        st.session_state['tarefa_id'] = tarefa.id
+        st.session_state['tarefa_carregada'] = None
+        st.session_state['mensagens_tarefa'] = []
     else:
         st.sidebar.warning("Por favor, carregue o seu arquivo de relatório contábil.")
 
+with st.sidebar.expander("Tarefas de conciliação"):
+    id_recuperar = st.text_input("Id da tarefa", key='id_tarefa_recuperar')
+    if st.button("Recuperar resultado"):
+        if obter_executor().obter(id_recuperar) is None:
+            st.error("Tarefa não encontrada. Ela pode ter expirado; envie a conciliação novamente.")
+        else:
+            st.session_state['tarefa_id'] = id_recuperar.strip()
+            st.session_state['tarefa_carregada'] = None
+    tarefas_recentes = obter_executor().listar()
+    if tarefas_recentes:
+        st.dataframe(pd.DataFrame([
+            {'Id': t.id, 'Mês': t.mes_ano, 'Estado': t.descricao_estado(), 'Enviada': f"{t.criada_em:%d/%m %H:%M:%S}"}
+            for t in tarefas_recentes
+        ]), hide_index=True)
+
+tarefa_atual = obter_executor().obter(st.session_state.get('tarefa_id'))
+if tarefa_atual is not None and st.session_state.get('tarefa_carregada') != tarefa_atual.id:
+    if tarefa_atual.em_andamento:
+        acompanhar_tarefa(tarefa_atual.id)
+    else:
+        carregar_tarefa(tarefa_atual)
+
+# Resultado gravado pelo monitor de extratos ou por uma conciliação anterior: carregado sem reprocessar,
+# a menos que a sessão já tenha conciliado este mês
+origem = st.session_state.get('origem_resultado')
+if not (tarefa_atual is not None and tarefa_atual.em_andamento) and not (origem and origem[:2] == ('tarefa', mes_ano_selecionado)):
+    gravado_em = data_resultado(mes_ano_selecionado)
+    if gravado_em is not None and origem != ('monitor', mes_ano_selecionado, gravado_em):
+        salvo = ler_resultado(mes_ano_selecionado)
+        if salvo is not None:
+            carregar_resultado_salvo(mes_ano_selecionado, salvo, gravado_em)
+            origem = st.session_state['origem_resultado']
+if origem and origem[0] == 'monitor':
+    st.caption(f"Último resultado gravado deste mês, em {datetime.fromtimestamp(origem[2]):%d/%m/%Y %H:%M:%S}.")
+
+for nivel, mensagem in st.session_state.get('mensagens_tarefa', []):
+    getattr(st, nivel)(mensagem)
+
 if 'df_resultado' in st.session_state and st.session_state['df_resultado'] is not None:
     resultado = st.session_state['df_resultado']
+    impressao = st.session_state.get('impressao_resultado')
+    resultado_completo = st.session_state.get('resultado_completo')
+    if resultado_completo is not None and len(resultado_completo) > len(resultado):
+        if st.checkbox(f"Incluir as {len(resultado_completo) - len(resultado)} conta(s) sem correspondência (join completo)",
+                       key='incluir_orfas', help="Contas que estão só no relatório contábil ou só nos extratos entram com saldo zero do lado em que faltam."):
+            resultado, impressao = resultado_completo, impressao_resultado(resultado_completo)
     if isinstance(resultado, pd.DataFrame):
         if resultado.empty:
             st.warning("Processamento concluído. Nenhuma conta correspondente foi encontrada entre o relatório contábil e os extratos para gerar um relatório de conciliação.")
         else:
             st.header("Resultado da Conciliação Consolidada")
-            df_para_mostrar = resultado[(resultado[('Conta Movimento', 'Diferença')].abs() > 0.01) | (resultado[('Aplicação Financeira', 'Diferença')].abs() > 0.01)].copy()
+            impressao = impressao or impressao_resultado(resultado)
+            formatado = resultado_formatado(impressao, resultado)
+            contas_alteradas = st.session_state.get('contas_alteradas')
+            if contas_alteradas is not None:
+                if len(contas_alteradas) == 0:
+                    st.caption("Nenhuma conta mudou desde a conciliação anterior deste mês.")
+                else:
+                    st.info(f"{len(contas_alteradas)} conta(s) mudaram desde a conciliação anterior deste mês e estão destacadas.")
+                    with st.expander("Contas alteradas desde a conciliação anterior"):
+                        alteradas = resultado.index.isin(contas_alteradas)
+                        st.dataframe(estilo_moeda_br(resultado[alteradas], formatado=formatado[alteradas]))
+            divergentes = mascara_divergentes(resultado)
+            df_para_mostrar = resultado[divergentes]
             if df_para_mostrar.empty:
                 st.success("✅ Ótima notícia! Nenhuma divergência encontrada.")
             else:
                 st.write("A tabela abaixo mostra apenas as contas com divergência de saldo.")
-                formatters = {col: (lambda x: f'{x:,.2f}'.replace(",", "X").replace(".", ",").replace("X", ".")) for col in resultado.columns}
-                st.dataframe(df_para_mostrar.style.format(formatter=formatters))
+                if contas_alteradas is not None and len(contas_alteradas):
+                    alteradas = df_para_mostrar.index.isin(contas_alteradas)
+                    st.dataframe(estilo_moeda_br(df_para_mostrar, formatado=formatado[divergentes])
+                                 .apply(lambda coluna: np.where(alteradas, 'background-color: #fff3cd', ''), axis=0))
+                else:
+                    st.dataframe(estilo_moeda_br(df_para_mostrar, formatado=formatado[divergentes]))
             st.header("Download do Relatório Completo")
+            # Os arquivos só são gerados quando o botão é clicado
+            rastreamento = st.session_state.get('rastreamento')
             col1, col2, col3 = st.columns(3)
             with col1:
-                df_csv = resultado.copy(); df_csv.columns = [' - '.join(map(str,col)).strip() for col in df_csv.columns.values]; st.download_button("Baixar em CSV", df_csv.to_csv(index=True, sep=';', decimal=',').encode('utf-8-sig'), 'relatorio_consolidado.csv', 'text/csv')
+                st.download_button("Baixar em CSV", lambda: exportar_relatorio(rastreamento, impressao, 'csv', resultado), 'relatorio_consolidado.csv', 'text/csv')
             with col2:
-                st.download_button("Baixar em Excel", to_excel(resultado), 'relatorio_consolidado.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+                st.download_button("Baixar em Excel", lambda: exportar_relatorio(rastreamento, impressao, 'xlsx', resultado), 'relatorio_consolidado.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
             with col3:
-                st.download_button("Baixar em PDF", create_pdf(resultado), 'relatorio_consolidado.pdf', 'application/pdf')
+                pdf_somente_divergentes = st.checkbox("PDF apenas com contas divergentes", key='pdf_somente_divergentes')
+                pdf_resumo = st.checkbox("Incluir página de resumo no PDF", key='pdf_resumo')
+                st.download_button("Baixar em PDF", lambda: exportar_relatorio(rastreamento, impressao, 'pdf', resultado, formatado, somente_divergentes=pdf_somente_divergentes, resumo=pdf_resumo), 'relatorio_consolidado.pdf', 'application/pdf')
         st.markdown("---")
+        orfas = st.session_state.get('orfas')
+        colisoes = st.session_state.get('colisoes')
+        if orfas is not None and (not orfas.empty or (colisoes is not None and not colisoes.empty)):
+            with st.expander("Contas sem correspondência e colisões de chave"):
+                for lado, titulo in ((LADO_CONTABIL, "Só no relatório contábil"), (LADO_EXTRATO, "Só nos extratos")):
+                    do_lado = orfas[orfas['Lado'] == lado].drop(columns='Lado')
+                    st.subheader(f"{titulo} ({len(do_lado)})")
+                    if not do_lado.empty:
+                        st.dataframe(estilo_moeda_br(do_lado, ['Saldo Corrente', 'Saldo Aplicado']), hide_index=True)
+                st.subheader("Sugestões de correspondência")
+                sugestoes = sugestoes_correspondencia(impressao_resultado(orfas), orfas)
+                if sugestoes.empty:
+                    st.caption("Nenhuma conta só nos extratos parece corresponder às contas só no relatório contábil.")
+                else:
+                    st.caption("Critérios: mesmo sufixo ou prefixo de 6 dígitos da conta, mesmo saldo total, mesma agência com saldo a até R$ 1,00. "
+                               "Confira cada sugestão e corrija o DE-PARA ou o cadastro da conta.")
+                    st.dataframe(estilo_moeda_br(sugestoes, ['Saldo Contábil', 'Saldo Extrato']), hide_index=True)
+                if colisoes is not None and not colisoes.empty:
+                    st.subheader(f"Chaves compartilhadas por contas diferentes ({len(colisoes)})")
+                    st.caption("Os últimos 7 dígitos destas contas são iguais, então os seus saldos são somados numa mesma linha da conciliação.")
+                    st.dataframe(colisoes, hide_index=True)
+        chaves_divergentes = st.session_state.get('chaves_divergentes')
+        if chaves_divergentes:
+            with st.expander("Conferência de lançamentos das contas divergentes"):
+                st.caption(f"Casa, linha a linha, os lançamentos contábeis com os movimentos dos extratos das {len(chaves_divergentes)} conta(s) divergentes; "
+                           "as demais contas dos arquivos são ignoradas. Arquivos ';' em latin-1: lançamentos com título na 1ª linha e colunas "
+                           "'Domicílio bancário;Data;Valor;Histórico'; movimentos com colunas 'Conta;Data;Valor;Histórico'.")
+                arquivo_lancamentos = st.file_uploader("Lançamentos contábeis do mês", type=['csv'], key='arquivo_lancamentos')
+                arquivos_movimentos = st.file_uploader("Movimentos dos extratos (um arquivo por banco)", type=['csv'],
+                                                       accept_multiple_files=True, key='arquivos_movimentos')
+                janela_dias = st.number_input("Diferença máxima de datas (dias)", min_value=0, max_value=15, value=JANELA_DIAS, step=1,
+                                              help="Lançamentos com a mesma conta e valor e datas até esta diferença também são casados.")
+                if st.button("Conferir lançamentos", disabled=arquivo_lancamentos is None or not arquivos_movimentos):
+                    try:
+                        df_depara = carregar_depara(CAMINHO_DEPARA)
+                    except FileNotFoundError:
+                        df_depara = None
+                    with st.spinner("Conferindo lançamentos..."):
+                        st.session_state['conferencia_lancamentos'] = conferir_lancamentos(
+                            io.BytesIO(arquivo_lancamentos.getvalue()), [io.BytesIO(arquivo.getvalue()) for arquivo in arquivos_movimentos],
+                            chaves_divergentes, df_depara, janela_dias)
+                conferencia = st.session_state.get('conferencia_lancamentos')
+                if conferencia is not None:
+                    contagens = conferencia['contagens']
+                    st.write(f"{contagens['lancamentos_conferidos']} de {contagens['lancamentos_lidos']} lançamento(s) contábeis e "
+                             f"{contagens['movimentos_conferidos']} de {contagens['movimentos_lidos']} movimento(s) são das contas divergentes.")
+                    aba_resumo, aba_pendentes, aba_vinculos = st.tabs(["Resumo por conta", "Pendentes", "Lançamentos casados"])
+                    with aba_resumo:
+                        st.dataframe(estilo_moeda_br(conferencia['resumo'], ['Pendente Contábil', 'Pendente Extrato', 'Diferença Pendente']),
+                                     hide_index=True)
+                    with aba_pendentes:
+                        pendentes = conferencia['pendentes']
+                        st.caption("Lançamentos sem par do outro lado: explicam a diferença de saldo da conta.")
+                        st.dataframe(estilo_moeda_br(pendentes, ['Valor']), hide_index=True,
+                                     column_config={'Data': st.column_config.DateColumn(format='DD/MM/YYYY')})
+                        st.download_button("Baixar pendentes em CSV", pendentes.to_csv(sep=';', index=False, decimal=','),
+                                           'lancamentos_pendentes.csv', 'text/csv')
+                    with aba_vinculos:
+                        st.caption("Tipos: exato (mesma data e valor), data_deslocada (mesmo valor em datas próximas) e "
+                                   "desdobramento (um lançamento igual à soma de vários do outro lado, mesmo 'Grupo').")
+                        st.dataframe(estilo_moeda_br(conferencia['vinculos'], ['Valor Contábil', 'Valor Extrato']), hide_index=True,
+                                     column_config={coluna: st.column_config.DateColumn(format='DD/MM/YYYY')
+                                                    for coluna in ('Data Contábil', 'Data Extrato')})
         with st.expander("Clique aqui para auditar os dados de origem"):
-            
-            st.subheader("Auditoria do Arquivo DE-PARA")
-            if 'audit_depara' in st.session_state and st.session_state['audit_depara'] is not None:
-                df_audit_view = st.session_state['audit_depara'].copy()
-                if not df_audit_view.empty:
-                    df_audit_view = df_audit_view[['Conta Antiga', 'Chave Antiga', 'Conta Nova', 'Chave Nova']]
-                    df_audit_view.columns = [
-                        'Conta Original (Antiga)', 
-                        'Chave Gerada (Antiga)', 
-                        'Conta Original (Nova)', 
-                        'Chave Gerada (Nova)'
-                    ]
-                    st.dataframe(df_audit_view)
-            
-            st.subheader("Auditoria do Relatório Contábil (com Chave Primária)")
-            if 'audit_contabil' in st.session_state and st.session_state['audit_contabil'] is not None:
-                st.dataframe(st.session_state['audit_contabil'])
-
-            st.subheader("Auditoria do Extrato do Banco do Brasil (com Chave Primária)")
-            if 'audit_bb' in st.session_state and st.session_state['audit_bb'] is not None:
-                st.dataframe(st.session_state['audit_bb'])
-
-            st.subheader("Auditoria do Extrato da Caixa Econômica (com Chave Primária)")
-            if 'audit_cef' in st.session_state and st.session_state['audit_cef'] is not None:
-                st.dataframe(st.session_state['audit_cef'])
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
+            fontes = obter_repositorio_auditoria().obter(st.session_state.get('auditoria'))
+            if not fontes:
+                st.caption("Os dados de origem só ficam disponíveis para as conciliações recentes feitas nesta sessão do servidor. Concilie novamente para auditá-los.")
+            else:
+                if 'contabil' not in fontes:
+                    st.caption("As linhas do relatório contábil não foram guardadas. Marque 'Guardar linhas do relatório contábil para auditoria' e concilie novamente.")
+                nome_fonte = st.selectbox("Fonte", list(fontes), format_func=lambda nome: fontes[nome].titulo, key='auditoria_fonte')
+                fonte = fontes[nome_fonte]
+                col1, col2, col3, col4 = st.columns(4)
+                chave_filtro = col1.text_input("Chave ou conta completa", key='auditoria_chave',
+                                               help="Os últimos 7 dígitos identificam a conta (ex: 0005752252942 ou 2252942).")
+                conta_filtro = col2.text_input("Trecho da conta", key='auditoria_conta')
+                agencia_filtro = col3.text_input("Agência", key='auditoria_agencia', disabled=not fonte.tem_agencia)
+                somente_divergentes = col4.checkbox("Só contas divergentes", key='auditoria_divergentes')
+                chave = int(gerar_chave_padronizada([chave_filtro]).iloc[0]) if chave_filtro.strip() else None
+                linhas = fonte.filtrar(chave, conta_filtro.strip(), agencia_filtro.strip(),
+                                       (st.session_state.get('chaves_divergentes') or []) if somente_divergentes else None)
+                col1, col2 = st.columns([1, 3])
+                linhas_por_pagina = col1.selectbox("Linhas por página", [LINHAS_POR_PAGINA, 500, 1000], key='auditoria_linhas_por_pagina')
+                paginas = max(1, -(-len(linhas) // linhas_por_pagina))
+                pagina = col2.number_input(f"Página (de {paginas})", min_value=1, max_value=paginas, value=1, step=1)
+                st.caption(f"{len(linhas)} de {len(fonte)} linha(s).")
+                st.dataframe(estilo_moeda_br(fonte.pagina(linhas, pagina, linhas_por_pagina), fonte.colunas_moeda), hide_index=True)
+
+if st.session_state.get('rastreamento') is not None:
+    rastreamento = st.session_state['rastreamento']
+    with st.expander("Rastreamento da execução (tempo, memória e linhas por etapa)"):
+        st.dataframe(rastreamento.como_dataframe())
+        st.download_button("Baixar rastreamento (JSON)", rastreamento.para_json(), 'rastreamento_conciliacao.json', 'application/json')
+
+with st.expander("Histórico de conciliações (consultas entre meses)"):
+    meses_gravados = meses_registrados()
+    if meses_gravados.empty:
+        st.caption("Nenhuma conciliação gravada no histórico ainda. Cada conciliação concluída é gravada automaticamente.")
+    else:
+        st.caption(f"{len(meses_gravados)} mês(es) no histórico: {', '.join(meses_gravados['Mês'])}.")
+        aba_recorrentes, aba_conta, aba_meses = st.tabs(["Divergências recorrentes", "Evolução de uma conta", "Meses gravados"])
+        with aba_recorrentes:
+            col1, col2 = st.columns(2)
+            meses_minimos = col1.number_input("Divergente por pelo menos (meses seguidos)", min_value=1, value=3, step=1)
+            em_aberto = col2.checkbox("Apenas divergências ainda em aberto no último mês gravado", value=True)
+            recorrentes = contas_divergentes_consecutivas(meses_minimos, em_aberto)
+            if recorrentes is None or recorrentes.empty:
+                st.success(f"Nenhuma conta divergente por {meses_minimos} mês(es) seguidos.")
+            else:
+                st.write(f"{len(recorrentes)} conta(s) divergentes por {meses_minimos} mês(es) seguidos ou mais (diferenças do último mês da sequência).")
+                st.dataframe(estilo_moeda_br(recorrentes, ['Diferença Movimento', 'Diferença Aplicação']), hide_index=True)
+        with aba_conta:
+            conta_consultada = st.text_input("Conta bancária ou chave", help="Os últimos 7 dígitos identificam a conta (ex: 0005752252942 ou 2252942).")
+            if conta_consultada.strip():
+                chave_consultada = int(gerar_chave_padronizada([conta_consultada]).iloc[0])
+                evolucao = evolucao_conta(chave_consultada)
+                if evolucao is None or evolucao.empty:
+                    st.info(f"A chave {chave_consultada:07d} não aparece no histórico.")
+                else:
+                    st.line_chart(evolucao.groupby('Mês')[['Diferença Movimento', 'Diferença Aplicação']].sum())
+                    colunas_valores = [coluna for coluna in evolucao.columns if coluna.startswith(('Saldo', 'Diferença'))]
+                    st.dataframe(estilo_moeda_br(evolucao, colunas_valores), hide_index=True,
+                                 column_config={'Mês': st.column_config.DateColumn(format='MM/YYYY')})
+        with aba_meses:
+            st.dataframe(meses_gravados, hide_index=True)
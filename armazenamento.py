@@ -0,0 +1,154 @@
+"""
+Armazenamento em disco dos relatórios contábeis enviados e dos resultados
+pré-calculados de cada mês.
+
+    relatorios_contabeis/contabil_<mes_ano>.csv      último relatório contábil do mês
+    resultados_conciliacao/<mes_ano>/resultado.parquet   (e resultado_completo, orfas, colisoes)
+    resultados_conciliacao/<mes_ano>/execucao.json   mensagens, contas alteradas, chaves divergentes, rastreamento,
+                                                     impressão das entradas
+
+O relatório contábil e o resultado são guardados pela interface a cada
+conciliação; o monitor de extratos (monitor_extratos.py) concilia de novo os
+meses afetados quando chegam extratos, e grava o resultado aqui para a
+interface apenas carregar. A impressão das entradas (tarefas.impressao_entradas)
+evita conciliar de novo um mês cujo resultado gravado já usa os arquivos atuais.
+As gravações são atômicas (arquivo temporário + os.replace).
+
+Configuração por variáveis de ambiente:
+    CONCILIACAO_PASTA_CONTABEIS    pasta dos relatórios contábeis (padrão: relatorios_contabeis)
+    CONCILIACAO_PASTA_RESULTADOS   pasta dos resultados (padrão: resultados_conciliacao)
+"""
+import datetime
+import json
+import os
+import re
+import tempfile
+
+import pandas as pd
+
+PASTA_CONTABEIS = os.environ.get('CONCILIACAO_PASTA_CONTABEIS', 'relatorios_contabeis')
+PASTA_RESULTADOS = os.environ.get('CONCILIACAO_PASTA_RESULTADOS', 'resultados_conciliacao')
+
+PADRAO_ARQUIVO_CONTABIL = re.compile(r'^contabil_(?P<mes_ano>[a-zç]+_\d{4})\.csv$')
+
+# Tabelas da saída de executar_conciliacao gravadas em parquet, uma por arquivo
+TABELAS_RESULTADO = ['resultado', 'resultado_completo', 'orfas', 'colisoes']
+
+
+def _gravar_atomico(caminho, gravar):
+    """Chama gravar(caminho_temporario) e move o arquivo pronto para o destino."""
+    pasta = os.path.dirname(caminho) or '.'
+    os.makedirs(pasta, exist_ok=True)
+    descritor, caminho_temporario = tempfile.mkstemp(dir=pasta, suffix='.tmp')
+    os.close(descritor)
+    try:
+        gravar(caminho_temporario)
+        os.replace(caminho_temporario, caminho)
+    except Exception:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        raise
+
+
+def caminho_contabil_mes(mes_ano, pasta=PASTA_CONTABEIS):
+    return os.path.join(pasta, f"contabil_{mes_ano}.csv")
+
+
+def guardar_relatorio_contabil(mes_ano, conteudo, pasta=PASTA_CONTABEIS):
+    """Guarda o conteúdo (bytes) do relatório contábil como o mais recente do mês."""
+    def gravar(caminho_temporario):
+        with open(caminho_temporario, 'wb') as f:
+            f.write(conteudo)
+    caminho = caminho_contabil_mes(mes_ano, pasta)
+    _gravar_atomico(caminho, gravar)
+    return caminho
+
+
+def ler_relatorio_contabil(mes_ano, pasta=PASTA_CONTABEIS):
+    """Conteúdo do último relatório contábil guardado do mês, ou None."""
+    try:
+        with open(caminho_contabil_mes(mes_ano, pasta), 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def meses_com_relatorio_contabil(pasta=PASTA_CONTABEIS):
+    """Meses (ex: 'julho_2025') que têm relatório contábil guardado."""
+    if not os.path.isdir(pasta):
+        return []
+    return [encontrado['mes_ano'] for encontrado in map(PADRAO_ARQUIVO_CONTABIL.match, os.listdir(pasta)) if encontrado]
+
+
+def _pasta_resultado(mes_ano, pasta):
+    return os.path.join(pasta, mes_ano)
+
+
+def gravar_resultado(mes_ano, saida, rastreamento=None, pasta=PASTA_RESULTADOS):
+    """
+    Grava o resultado de executar_conciliacao (e o rastreamento da execução).
+    Um mês sem resultado (ex: nenhum extrato válido) grava só as mensagens.
+    """
+    pasta_mes = _pasta_resultado(mes_ano, pasta)
+    for nome in TABELAS_RESULTADO:
+        tabela = saida.get(nome)
+        caminho_tabela = os.path.join(pasta_mes, f'{nome}.parquet')
+        if tabela is not None:
+            _gravar_atomico(caminho_tabela, tabela.to_parquet)
+        elif os.path.exists(caminho_tabela):
+            os.remove(caminho_tabela)
+
+    contas_alteradas = saida.get('contas_alteradas')
+    execucao = {
+        'mes_ano': mes_ano,
+        'gerado_em': datetime.datetime.now().isoformat(timespec='seconds'),
+        'impressao': saida.get('impressao'),
+        'impressao_entradas': saida.get('impressao_entradas'),
+        'mensagens': saida.get('mensagens', []),
+        'contas_alteradas': None if contas_alteradas is None else list(contas_alteradas),
+        'chaves_divergentes': saida.get('chaves_divergentes'),
+        'rastreamento': rastreamento.para_dict() if rastreamento is not None else None,
+    }
+    def gravar(caminho_temporario):
+        with open(caminho_temporario, 'w', encoding='utf-8') as f:
+            json.dump(execucao, f, ensure_ascii=False, indent=2, default=str)
+    _gravar_atomico(os.path.join(pasta_mes, 'execucao.json'), gravar)
+
+
+def ler_resultado(mes_ano, pasta=PASTA_RESULTADOS):
+    """
+    Resultado pré-calculado do mês: dict com as TABELAS_RESULTADO (DataFrame
+    ou None), 'gerado_em', 'impressao', 'impressao_entradas', 'mensagens',
+    'contas_alteradas', 'chaves_divergentes' e 'rastreamento';
+    None se o mês ainda não foi calculado.
+    """
+    pasta_mes = _pasta_resultado(mes_ano, pasta)
+    try:
+        with open(os.path.join(pasta_mes, 'execucao.json'), encoding='utf-8') as f:
+            execucao = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    for nome in TABELAS_RESULTADO:
+        caminho_tabela = os.path.join(pasta_mes, f'{nome}.parquet')
+        execucao[nome] = pd.read_parquet(caminho_tabela) if os.path.exists(caminho_tabela) else None
+    execucao['mensagens'] = [tuple(mensagem) for mensagem in execucao['mensagens']]
+    execucao.setdefault('chaves_divergentes', None)
+    execucao.setdefault('impressao_entradas', None)
+    return execucao
+
+
+def impressao_entradas_resultado(mes_ano, pasta=PASTA_RESULTADOS):
+    """Impressão das entradas do resultado gravado do mês (sem ler as tabelas), ou None."""
+    try:
+        with open(os.path.join(_pasta_resultado(mes_ano, pasta), 'execucao.json'), encoding='utf-8') as f:
+            return json.load(f).get('impressao_entradas')
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def data_resultado(mes_ano, pasta=PASTA_RESULTADOS):
+    """Momento (mtime) da última gravação do resultado do mês, ou None."""
+    try:
+        return os.path.getmtime(os.path.join(_pasta_resultado(mes_ano, pasta), 'execucao.json'))
+    except OSError:
+        return None
@@ -0,0 +1,198 @@
+"""
+Explorador dos dados de origem de uma conciliação (DE-PARA, relatório
+contábil e extratos), servido em páginas.
+
+As fontes de cada conciliação ficam uma única vez num RepositorioAuditoria
+compartilhado por todas as sessões do servidor (a sessão guarda só a chave),
+em forma compacta: textos repetidos viram categorias e cada fonte ganha um
+índice de chaves (as chaves de 7 dígitos ordenadas, com a linha de cada uma).
+Os filtros rodam no servidor:
+
+    chave        busca binária no índice de chaves
+    conta        trecho do texto da conta (avaliado uma vez por valor distinto)
+    agência      dígitos iniciais da agência
+    divergentes  só as chaves com divergência na conciliação (pelo índice)
+
+e só a página pedida é enviada ao navegador.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import LEITORES_EXTRATO, formatar_chave
+
+LINHAS_POR_PAGINA = 100
+# Colunas de texto com no máximo esta fração de valores distintos viram categorias
+FRACAO_MAXIMA_CATEGORIA = 0.5
+
+
+def _compactar(df):
+    """Cópia de df com as colunas de texto repetitivas convertidas em categorias."""
+    colunas = {}
+    for coluna in df.columns:
+        serie = df[coluna]
+        if (pd.api.types.is_string_dtype(serie) or serie.dtype == object) and len(serie):
+            if serie.nunique(dropna=True) <= FRACAO_MAXIMA_CATEGORIA * len(serie):
+                serie = serie.astype('category')
+        colunas[coluna] = serie
+    return pd.DataFrame(colunas, index=pd.RangeIndex(len(df)))
+
+
+def _corresponde(serie, teste):
+    """
+    Máscara das linhas em que teste(textos) é verdadeiro. Numa coluna
+    categórica, o teste roda uma vez por categoria, não por linha.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        # O código -1 (ausente) cai na última posição, que é sempre falsa
+        por_categoria = np.append(np.asarray(teste(serie.cat.categories.astype('string')).fillna(False), dtype=bool), False)
+        return por_categoria[serie.cat.codes.to_numpy()]
+    return np.asarray(teste(serie.astype('string')).fillna(False), dtype=bool)
+
+
+def _digitos(textos):
+    return textos.str.replace(r'\D', '', regex=True)
+
+
+class FonteAuditoria:
+    """
+    Uma fonte de dados da conciliação preparada para consulta em páginas.
+    - colunas_chave: colunas com chaves de 7 dígitos (int), todas indexadas;
+    - colunas_conta: colunas de texto pesquisadas pelo filtro de conta;
+    - agencias: agência de cada linha (texto), ou None se a fonte não a tem;
+    - renomear: nomes das colunas na exibição;
+    - colunas_centavos: colunas de valor em centavos (int64), exibidas em reais.
+    """
+
+    def __init__(self, titulo, df, colunas_chave, colunas_conta, agencias=None, renomear=None, colunas_centavos=()):
+        self.titulo = titulo
+        self.df = _compactar(df)
+        self.colunas_chave = list(colunas_chave)
+        self.colunas_conta = list(colunas_conta)
+        self.renomear = renomear or {}
+        self.colunas_centavos = [coluna for coluna in colunas_centavos if coluna in df.columns]
+        self.agencias = None
+        if agencias is not None:
+            self.agencias = _digitos(pd.Series(agencias).astype('string')).reset_index(drop=True).astype('category')
+        # Índice de chaves: as chaves de todas as colunas_chave ordenadas, com a linha de cada uma
+        chaves = np.concatenate([df[coluna].to_numpy(dtype='int64') for coluna in self.colunas_chave])
+        linhas = np.tile(np.arange(len(df)), len(self.colunas_chave))
+        ordem = np.argsort(chaves, kind='stable')
+        self._chaves = chaves[ordem]
+        self._linhas = linhas[ordem]
+
+    def __len__(self):
+        return len(self.df)
+
+    @property
+    def tem_agencia(self):
+        return self.agencias is not None
+
+    @property
+    def colunas_moeda(self):
+        """Colunas em reais na página (já com os nomes de exibição)."""
+        return [self.renomear.get(coluna, coluna) for coluna in self.colunas_centavos]
+
+    def linhas_das_chaves(self, chaves):
+        """Linhas (em ordem) com alguma das chaves, por busca binária no índice de chaves."""
+        chaves = np.unique(np.asarray(chaves, dtype='int64'))
+        inicios = np.searchsorted(self._chaves, chaves, 'left')
+        tamanhos = np.searchsorted(self._chaves, chaves, 'right') - inicios
+        # Concatena os intervalos [início, fim) de cada chave sem laço em Python
+        posicoes = np.repeat(inicios - np.cumsum(tamanhos) + tamanhos, tamanhos) + np.arange(tamanhos.sum())
+        return np.unique(self._linhas[posicoes])
+
+    def filtrar(self, chave=None, conta=None, agencia=None, chaves_divergentes=None):
+        """
+        Linhas que atendem a todos os filtros informados, em ordem: chave
+        (int), trecho da conta (sem diferenciar maiúsculas), dígitos iniciais
+        da agência e chaves divergentes (lista de chaves).
+        """
+        mascara = np.ones(len(self.df), dtype=bool)
+        for chaves in ([chave] if chave is not None else None, chaves_divergentes):
+            if chaves is not None:
+                pelo_indice = np.zeros(len(self.df), dtype=bool)
+                pelo_indice[self.linhas_das_chaves(chaves)] = True
+                mascara &= pelo_indice
+        if conta:
+            na_conta = np.zeros(len(self.df), dtype=bool)
+            for coluna in self.colunas_conta:
+                na_conta |= _corresponde(self.df[coluna], lambda textos: textos.str.contains(conta, case=False, regex=False))
+            mascara &= na_conta
+        if agencia and self.tem_agencia:
+            digitos = ''.join(caractere for caractere in agencia if caractere.isdigit())
+            mascara &= _corresponde(self.agencias, lambda textos: textos.str.startswith(digitos))
+        return np.flatnonzero(mascara)
+
+    def pagina(self, linhas, numero, linhas_por_pagina=LINHAS_POR_PAGINA):
+        """Página 'numero' (a partir de 1) das linhas filtradas, pronta para exibição (valores em reais)."""
+        inicio = (numero - 1) * linhas_por_pagina
+        df = self.df.iloc[linhas[inicio:inicio + linhas_por_pagina]].copy()
+        for coluna in self.colunas_chave:
+            df[coluna] = formatar_chave(df[coluna].to_numpy()).to_numpy()
+        for coluna in self.colunas_centavos:
+            df[coluna] = df[coluna].astype('int64') / 100
+        return df.rename(columns=self.renomear)
+
+
+def montar_fontes(audit_depara=None, audit_contabil=None, audit_extratos=None):
+    """
+    Fontes de auditoria de uma conciliação ({nome: FonteAuditoria}), na ordem
+    DE-PARA, relatório contábil e extratos por banco. Fontes ausentes ficam de fora.
+    """
+    fontes = {}
+    if audit_depara is not None and not audit_depara.empty:
+        fontes['depara'] = FonteAuditoria(
+            "Arquivo DE-PARA", audit_depara[['Aba', 'Conta Antiga', 'Chave Antiga', 'Conta Nova', 'Chave Nova']],
+            ['Chave Antiga', 'Chave Nova'], ['Conta Antiga', 'Conta Nova'],
+            renomear={'Conta Antiga': 'Conta Original (Antiga)', 'Chave Antiga': 'Chave Gerada (Antiga)',
+                      'Conta Nova': 'Conta Original (Nova)', 'Chave Nova': 'Chave Gerada (Nova)'})
+    if audit_contabil is not None:
+        # '001-2234-50920-BB': agência na 2ª parte do domicílio bancário
+        agencias = audit_contabil['Domicílio bancário'].astype('string').str.extract(r'^[^-]*-([^-]*)-', expand=False)
+        fontes['contabil'] = FonteAuditoria(
+            "Relatório Contábil (com Chave Primária)", audit_contabil, ['Chave Primaria'], ['Domicílio bancário'], agencias,
+            colunas_centavos=['Saldo Final'])
+    for banco, df in (audit_extratos or {}).items():
+        colunas_conta = list(dict.fromkeys([df.attrs.get('coluna_conta', 'Conta_Extrato'), 'Conta_Extrato']))
+        # Agência do leitor (CEF) ou a parte antes da 1ª '/' da conta ('2234-9/295004-9')
+        agencias = df['Agencia_Extrato'].astype('string').fillna(
+            df['Conta_Extrato'].astype('string').str.extract(r'^([^/]*)/', expand=False))
+        nome = LEITORES_EXTRATO[banco].nome if banco in LEITORES_EXTRATO else banco.upper()
+        fontes[banco] = FonteAuditoria(f"Extrato — {nome} (com Chave Primária)", df, ['Chave Primaria'], colunas_conta, agencias,
+                                       colunas_centavos=df.attrs.get('colunas_centavos', []))
+    return fontes
+
+
+class RepositorioAuditoria:
+    """
+    Fontes de auditoria das últimas 'max_conciliacoes' conciliações, por chave
+    (ex: o id da tarefa), compartilhadas por todas as sessões do servidor.
+    """
+
+    def __init__(self, max_conciliacoes=4):
+        self._fontes = OrderedDict()
+        self._trava = threading.Lock()
+        self.max_conciliacoes = max_conciliacoes
+
+    def registrar(self, chave, audit_depara=None, audit_contabil=None, audit_extratos=None):
+        """Prepara as fontes da conciliação, se ainda não estiverem no repositório."""
+        with self._trava:
+            if chave in self._fontes:
+                self._fontes.move_to_end(chave)
+                return
+        fontes = montar_fontes(audit_depara, audit_contabil, audit_extratos)
+        with self._trava:
+            self._fontes[chave] = fontes
+            while len(self._fontes) > self.max_conciliacoes:
+                self._fontes.popitem(last=False)
+
+    def obter(self, chave):
+        """As fontes da conciliação ({nome: FonteAuditoria}), ou None se não estiverem (mais) no repositório."""
+        with self._trava:
+            fontes = self._fontes.get(chave)
+            if fontes is not None:
+                self._fontes.move_to_end(chave)
+            return fontes
@@ -0,0 +1,201 @@
+"""
+Benchmark das etapas da conciliação sobre dados sintéticos.
+
+Para cada tamanho pedido, gera os arquivos de entrada (gerar_dados.py) e mede
+tempo de parede, tempo de CPU e pico de memória (tracemalloc) de cada etapa:
+carregar_depara, os leitores de extrato, processar_relatorio_contabil,
+realizar_conciliacao, to_excel e create_pdf. Os leitores são medidos sem o
+cache em Parquet, para que a leitura real dos arquivos seja cronometrada.
+Com --lancamentos N, gera também N lançamentos por conta e mede a conferência
+de lançamentos das contas divergentes (conferir_lancamentos).
+
+O resultado é gravado em JSON; com --comparar, as etapas são comparadas com
+um JSON de uma execução anterior (ex: de outra versão do código).
+
+O PDF cresce rápido com o número de contas; para os tamanhos maiores,
+restrinja as etapas (ex: --etapas extrato_bb,extrato_cef,realizar_conciliacao).
+
+Exemplos:
+    python benchmarks/executar_benchmark.py --tamanhos 1000 10000 100000
+    python benchmarks/executar_benchmark.py --tamanhos 10000 --comparar benchmarks/resultados/anterior.json
+    python benchmarks/executar_benchmark.py --tamanhos 100000 --lancamentos 30 --etapas conferir_lancamentos
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import pandas as pd
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+from conciliacao import (  # noqa: E402
+    ConciliacaoIncremental, carregar_depara, compilar_depara, processar_extrato_bb_bruto_csv, processar_extrato_cef_bruto,
+    processar_relatorio_contabil, realizar_conciliacao,
+)
+from gerar_dados import gerar_dados  # noqa: E402
+from lancamentos import chaves_divergentes, conferir_lancamentos  # noqa: E402
+from relatorios import create_pdf, to_excel  # noqa: E402
+
+ETAPAS = ['carregar_depara', 'extrato_bb', 'extrato_cef', 'processar_relatorio_contabil',
+          'realizar_conciliacao', 'to_excel', 'create_pdf', 'conferir_lancamentos']
+PASTA_RESULTADOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resultados')
+
+
+def _linhas(objeto):
+    """Quantidade de linhas do resultado de uma etapa (ou bytes, para os relatórios)."""
+    if isinstance(objeto, tuple):
+        objeto = objeto[-1]
+    if isinstance(objeto, (pd.DataFrame, pd.Series)):
+        return {'linhas': len(objeto)}
+    if isinstance(objeto, (bytes, bytearray)):
+        return {'bytes': len(objeto)}
+    if isinstance(objeto, dict) and 'contagens' in objeto:
+        return dict(objeto['contagens'])
+    return {}
+
+
+def medir(funcao, *args, repeticoes=1, **kwargs):
+    """
+    Executa a etapa 'repeticoes' vezes sem rastreamento (vale o melhor tempo) e
+    mais uma vez sob tracemalloc para o pico de memória, já que o rastreamento
+    deixa o código Python bem mais lento. Retorna (resultado, medição).
+    """
+    tempos, tempos_cpu = [], []
+    for _ in range(repeticoes):
+        inicio, inicio_cpu = time.perf_counter(), time.process_time()
+        funcao(*args, **kwargs)
+        tempos.append(time.perf_counter() - inicio)
+        tempos_cpu.append(time.process_time() - inicio_cpu)
+    tracemalloc.start()
+    try:
+        resultado = funcao(*args, **kwargs)
+        _, pico = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    medicao = {
+        'segundos': round(min(tempos), 4),
+        'cpu_segundos': round(min(tempos_cpu), 4),
+        'pico_memoria_mb': round(pico / (1024 * 1024), 2),
+    }
+    medicao.update(_linhas(resultado))
+    return resultado, medicao
+
+
+def executar_tamanho(quantidade_contas, pasta_dados, etapas, repeticoes, lancamentos_por_conta=0):
+    """Gera os dados de um tamanho e mede as etapas pedidas, na ordem do pipeline."""
+    caminhos = gerar_dados(quantidade_contas, pasta_dados, lancamentos_por_conta=lancamentos_por_conta)
+    medicoes = {}
+
+    def etapa(nome, funcao, *args, **kwargs):
+        if nome not in etapas:
+            return funcao(*args, **kwargs)
+        resultado, medicao = medir(funcao, *args, repeticoes=repeticoes, **kwargs)
+        medicoes[nome] = medicao
+        print(f"  {nome:<30} {medicao['segundos']:>9.3f} s  {medicao['pico_memoria_mb']:>9.1f} MB")
+        return resultado
+
+    # Etapas seguintes dependem das anteriores; as não pedidas rodam uma vez, sem registro
+    df_depara = etapa('carregar_depara', carregar_depara.sem_cache, caminhos['depara'])
+    mapa_depara = compilar_depara(df_depara)
+    df_bb = etapa('extrato_bb', processar_extrato_bb_bruto_csv.sem_cache, caminhos['bb'])
+    df_cef = etapa('extrato_cef', processar_extrato_cef_bruto.sem_cache, caminhos['cef'])
+    df_extrato_unificado = pd.concat([df_bb, df_cef], ignore_index=True)
+    _, df_contabil = etapa('processar_relatorio_contabil', processar_relatorio_contabil, caminhos['contabil'], mapa_depara)
+    if 'conferir_lancamentos' in etapas and lancamentos_por_conta:
+        conciliacao = ConciliacaoIncremental()
+        conciliacao.atualizar(df_contabil, {'bb': df_bb, 'cef': df_cef})
+        arquivos_movimentos = [caminhos['movimentos_bb'], caminhos['movimentos_cef']]
+        etapa('conferir_lancamentos', conferir_lancamentos, caminhos['lancamentos_contabeis'], arquivos_movimentos,
+              chaves_divergentes(conciliacao.linhas), mapa_depara)
+    if not {'realizar_conciliacao', 'to_excel', 'create_pdf'} & set(etapas):
+        return medicoes
+    resultado = etapa('realizar_conciliacao', realizar_conciliacao, df_contabil, df_extrato_unificado)
+    if 'to_excel' in etapas:
+        etapa('to_excel', to_excel, resultado)
+    if 'create_pdf' in etapas:
+        etapa('create_pdf', create_pdf, resultado)
+    return medicoes
+
+
+def _versao_codigo():
+    try:
+        saida = subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=RAIZ,
+                               capture_output=True, text=True, check=True)
+        return saida.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(atual, anterior):
+    """Imprime a razão atual/anterior de tempo e memória para cada tamanho e etapa em comum."""
+    anteriores = {(r['contas'], e): m for r in anterior['resultados'] for e, m in r['etapas'].items()}
+    print(f"\nComparação com {anterior.get('versao') or '?'} ({anterior.get('data', '?')}):")
+    for registro in atual['resultados']:
+        for nome, medicao in registro['etapas'].items():
+            base = anteriores.get((registro['contas'], nome))
+            if not base:
+                continue
+            razao_tempo = medicao['segundos'] / base['segundos'] if base['segundos'] else float('nan')
+            razao_memoria = medicao['pico_memoria_mb'] / base['pico_memoria_mb'] if base['pico_memoria_mb'] else float('nan')
+            print(f"  {registro['contas']:>9} {nome:<30} tempo x{razao_tempo:5.2f}  memória x{razao_memoria:5.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark das etapas da conciliação com dados sintéticos.")
+    parser.add_argument('--tamanhos', type=int, nargs='+', default=[1_000, 10_000],
+                        help="Quantidades de contas a medir (padrão: %(default)s).")
+    parser.add_argument('--etapas', default=','.join(ETAPAS),
+                        help="Etapas medidas, separadas por vírgula (padrão: todas).")
+    parser.add_argument('--lancamentos', type=int, default=0,
+                        help="Lançamentos por conta gerados para a etapa conferir_lancamentos (padrão: nenhum).")
+    parser.add_argument('--repeticoes', type=int, default=1, help="Execuções cronometradas por etapa; vale o melhor tempo (padrão: %(default)s).")
+    parser.add_argument('--pasta-dados', help="Pasta para os dados gerados (padrão: pasta temporária).")
+    parser.add_argument('--saida', help="Arquivo JSON de saída (padrão: benchmarks/resultados/benchmark_<data>.json).")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparação.")
+    args = parser.parse_args(argv)
+
+    etapas = [e.strip() for e in args.etapas.split(',') if e.strip()]
+    invalidas = [e for e in etapas if e not in ETAPAS]
+    if invalidas:
+        parser.error(f"Etapa(s) inválida(s): {', '.join(invalidas)}")
+
+    agora = datetime.datetime.now()
+    relatorio = {
+        'data': agora.isoformat(timespec='seconds'),
+        'versao': _versao_codigo(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'plataforma': platform.platform(),
+        'repeticoes': args.repeticoes,
+        'lancamentos_por_conta': args.lancamentos,
+        'resultados': [],
+    }
+    with tempfile.TemporaryDirectory() as pasta_temporaria:
+        for quantidade in args.tamanhos:
+            print(f"{quantidade} contas:")
+            pasta_dados = os.path.join(args.pasta_dados or pasta_temporaria, str(quantidade))
+            medicoes = executar_tamanho(quantidade, pasta_dados, etapas, args.repeticoes, args.lancamentos)
+            relatorio['resultados'].append({'contas': quantidade, 'lancamentos_por_conta': args.lancamentos, 'etapas': medicoes})
+
+    caminho_saida = args.saida or os.path.join(PASTA_RESULTADOS, f"benchmark_{agora:%Y%m%d_%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(caminho_saida)), exist_ok=True)
+    with open(caminho_saida, 'w', encoding='utf-8') as f:
+        json.dump(relatorio, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {caminho_saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(relatorio, json.load(f))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""
+Gerador de dados sintéticos nos formatos reais de entrada da conciliação.
+
+Gera, para N contas:
+- relatório contábil (';', latin-1, título na linha 1 e cabeçalho na linha 2,
+  colunas 'Domicílio bancário', 'Conta contábil' e 'Saldo Final');
+- extrato do BB (.csv com cabeçalho entre aspas e formatos de número
+  misturados: '0.00' em 'Saldo em conta' e '1.442,26' em 'Saldo investido');
+- extrato da CEF (.cef com preâmbulo de totais e linhas 'Conta Vinculada;...');
+- DE-PARA (.xlsx com duas abas datadas, incluindo cadeias entre as abas);
+- opcionalmente (--lancamentos), os lançamentos contábeis e os movimentos de
+  cada banco no leiaute da conferência de lançamentos (lancamentos.py), com
+  datas deslocadas, movimentos desdobrados, lançamentos sem movimento e
+  movimentos sem lançamento.
+
+Exemplo:
+    python benchmarks/gerar_dados.py --contas 100000 --pasta /tmp/dados_conciliacao
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conciliacao import chave_ordenacao_mes  # noqa: E402
+from relatorios import formatar_moeda_br  # noqa: E402
+
+MES_ANO_PADRAO = 'julho_2025'
+
+
+def _digito(numeros):
+    """Dígito verificador fictício (módulo 11 simplificado), vetorizado."""
+    return (numeros % 11 % 10).astype('int64')
+
+
+def _formato_internacional(valores_reais):
+    """'1,234.56': troca os separadores do formato brasileiro."""
+    return formatar_moeda_br(valores_reais).str.translate(str.maketrans({'.': ',', ',': '.'}))
+
+
+def _saldos(gerador, quantidade, proporcao_zerados=0.6):
+    """Saldos em reais com duas casas; boa parte das contas fica zerada, como nos extratos reais."""
+    saldos = np.round(gerador.lognormal(mean=9, sigma=2.5, size=quantidade), 2)
+    saldos[gerador.random(quantidade) < proporcao_zerados] = 0.0
+    return pd.Series(saldos)
+
+
+def _gravar_lancamentos(caminho, coluna_conta, contas, dias, centavos, historicos, mes_ano, titulo=None):
+    """Grava um arquivo de lançamentos (';', latin-1); as datas são dias 1 a 28 do mês."""
+    ano, mes = chave_ordenacao_mes(mes_ano)
+    datas = np.array([f'{dia:02d}/{mes:02d}/{ano}' for dia in range(29)], dtype=object)
+    df = pd.DataFrame({
+        coluna_conta: contas, 'Data': datas[dias], 'Valor': formatar_moeda_br(pd.Series(centavos / 100)).to_numpy(),
+        'Histórico': historicos,
+    })
+    with open(caminho, 'w', encoding='latin-1', newline='') as f:
+        if titulo:
+            f.write(titulo + ';;;\n')
+        df.to_csv(f, sep=';', index=False)
+
+
+def gerar_lancamentos(pasta, mes_ano, domicilios, contas_bancos, lancamentos_por_conta, gerador):
+    """
+    Lançamentos contábeis de cada domicílio e os movimentos correspondentes de
+    cada banco ({banco: contas do extrato, na ordem dos domicílios}). Dos
+    movimentos, 5% têm a data deslocada em até 3 dias, 2% vêm desdobrados em
+    dois, 1% faltam e 1% a mais não têm lançamento. Retorna os caminhos.
+    """
+    quantidade = len(domicilios) * lancamentos_por_conta
+    conta = np.repeat(np.arange(len(domicilios)), lancamentos_por_conta)
+    dias = gerador.integers(1, 29, quantidade)
+    centavos = np.maximum(np.round(gerador.lognormal(mean=7, sigma=1.5, size=quantidade) * 100), 1_000).astype('int64')
+    centavos[gerador.random(quantidade) < 0.5] *= -1
+    historicos = np.where(centavos > 0, 'CREDITO', 'DEBITO').astype(object)
+
+    caminhos = {}
+    caminho = os.path.join(pasta, f'lancamentos_contabeis_{mes_ano}.csv')
+    _gravar_lancamentos(caminho, 'Domicílio bancário', domicilios.to_numpy()[conta], dias, centavos, historicos,
+                        mes_ano, titulo='Relatório de Lançamentos Contábeis - Dados Sintéticos')
+    caminhos['lancamentos_contabeis'] = caminho
+
+    sorteio = gerador.random(quantidade)
+    dias_banco = dias.copy()
+    deslocados = sorteio < 0.05
+    deslocamento = gerador.choice([-3, -2, -1, 1, 2, 3], size=int(deslocados.sum()))
+    dias_banco[deslocados] = np.clip(dias[deslocados] + deslocamento, 1, 28)
+    desdobrados = (sorteio >= 0.05) & (sorteio < 0.07)
+    faltantes = (sorteio >= 0.07) & (sorteio < 0.08)
+
+    inteiros = ~desdobrados & ~faltantes
+    partes = np.round(centavos[desdobrados] * gerador.uniform(0.2, 0.8, int(desdobrados.sum()))).astype('int64')
+    n_extras = quantidade // 100
+    movimentos = pd.DataFrame({
+        'conta': np.concatenate([conta[inteiros], conta[desdobrados], conta[desdobrados],
+                                 gerador.integers(0, len(domicilios), n_extras)]),
+        'dia': np.concatenate([dias_banco[inteiros], dias[desdobrados], dias[desdobrados], gerador.integers(1, 29, n_extras)]),
+        'centavos': np.concatenate([centavos[inteiros], partes, centavos[desdobrados] - partes,
+                                    np.round(gerador.lognormal(mean=7, sigma=1.5, size=n_extras) * 100).astype('int64')]),
+    })
+    inicio = 0
+    for banco, contas in contas_bancos.items():
+        do_banco = movimentos[(movimentos['conta'] >= inicio) & (movimentos['conta'] < inicio + len(contas))]
+        do_banco = do_banco.sort_values(['conta', 'dia'], kind='stable')
+        caminho = os.path.join(pasta, f'movimentos_{banco}_{mes_ano}.csv')
+        _gravar_lancamentos(caminho, 'Conta', contas.to_numpy()[do_banco['conta'] - inicio], do_banco['dia'].to_numpy(),
+                            do_banco['centavos'].to_numpy(), np.where(do_banco['centavos'] > 0, 'CRED', 'DEB').astype(object),
+                            mes_ano)
+        caminhos[f'movimentos_{banco}'] = caminho
+        inicio += len(contas)
+    return caminhos
+
+
+def gerar_dados(quantidade_contas, pasta, mes_ano=MES_ANO_PADRAO, semente=42, proporcao_divergentes=0.05,
+                lancamentos_por_conta=0):
+    """
+    Gera os quatro arquivos de entrada em 'pasta' e retorna seus caminhos.
+    Metade das contas é do BB e metade da CEF; 'proporcao_divergentes' das
+    contas recebe saldo contábil diferente do extrato. Com
+    lancamentos_por_conta > 0, gera também os arquivos da conferência de
+    lançamentos (ver gerar_lancamentos).
+    """
+    gerador = np.random.default_rng(semente)
+    os.makedirs(pasta, exist_ok=True)
+    n_bb = quantidade_contas // 2
+    n_cef = quantidade_contas - n_bb
+
+    # --- Extrato do BB ---
+    numeros_bb = gerador.choice(np.arange(100_000, 999_999), size=n_bb, replace=False)
+    contas_bb = pd.Series(numeros_bb).astype(str) + '-' + pd.Series(_digito(numeros_bb)).astype(str)
+    corrente_bb = _saldos(gerador, n_bb)
+    aplicado_bb = _saldos(gerador, n_bb)
+    df_bb = pd.DataFrame({
+        'Agência': '2234-9',
+        'Conta': contas_bb,
+        'Saldo em conta': _formato_internacional(corrente_bb),
+        'Saldo investido': formatar_moeda_br(aplicado_bb),
+        'Saldo total': formatar_moeda_br(corrente_bb + aplicado_bb),
+    })
+    caminho_bb = os.path.join(pasta, f'extrato_bb_{mes_ano}.csv')
+    df_bb.to_csv(caminho_bb, index=False, quoting=1, encoding='utf-8', lineterminator='\r\n')
+
+    # --- Extrato da CEF ---
+    numeros_cef = gerador.choice(np.arange(1_000, 99_999_999), size=n_cef, replace=False)
+    sufixo_cef = pd.Series(numeros_cef).astype(str).str.zfill(8) + '-' + pd.Series(_digito(numeros_cef)).astype(str)
+    contas_cef = '4064/006/' + sufixo_cef
+    corrente_cef = _saldos(gerador, n_cef)
+    aplicado_cef = _saldos(gerador, n_cef)
+    linhas_cef = (
+        contas_cef + ';PCRJ CONTA ' + pd.Series(np.arange(n_cef)).astype(str) + ';'
+        + formatar_moeda_br(corrente_cef) + ';0,00;' + formatar_moeda_br(aplicado_cef) + ';'
+        + formatar_moeda_br(corrente_cef + aplicado_cef) + ';'
+    )
+    total_corrente = formatar_moeda_br(pd.Series([corrente_cef.sum()])).iloc[0]
+    total_aplicado = formatar_moeda_br(pd.Series([aplicado_cef.sum()])).iloc[0]
+    total_geral = formatar_moeda_br(pd.Series([corrente_cef.sum() + aplicado_cef.sum()])).iloc[0]
+    preambulo = [
+        '                            Caixa Econômica Federal',
+        '                                 GovConta Caixa',
+        '            Saldo Geral da GovConta (C/C, Investimento e Aplicações)',
+        '',
+        'GovConta: 4064600009 PCRJ-GERAL          ',
+        'Data de Solicitação.................: 15/08/2025 02:50:36 PM',
+        'Data de Referência..................: 31/07/2025',
+        f'Total Apurado (Conta Corrente)......: {total_corrente}C',
+        'Total Apurado (Conta Investimento)..: 0,00',
+        f'Total Apurado (Aplicações)..........: {total_aplicado}',
+        f'Total Geral.........................: {total_geral}C',
+        '',
+        'Conta Vinculada;Nome;Saldo Conta Corrente (R$);Saldo Conta Investimento (R$);Saldo Aplicado (R$);Saldo Total (R$);',
+    ]
+    caminho_cef = os.path.join(pasta, f'extrato_cef_{mes_ano}.cef')
+    with open(caminho_cef, 'w', encoding='utf-8', newline='\r\n') as f:
+        f.write('\n'.join(preambulo) + '\n')
+        f.write('\n'.join(linhas_cef.tolist()) + '\n')
+
+    # --- DE-PARA: 1% das contas da CEF migradas, em duas ondas (com cadeias) ---
+    n_depara = max(10, n_cef // 100)
+    migradas = contas_cef.iloc[:n_depara].str.replace('/', '', regex=False).str.replace('-', '', regex=False)
+    antigas = pd.Series(gerador.choice(np.arange(10_000_000, 99_999_999), size=n_depara, replace=False)).astype(str)
+    intermediarias = pd.Series(gerador.choice(np.arange(10_000_000, 99_999_999), size=n_depara // 2, replace=False)).astype(str)
+    onda_1 = pd.DataFrame({'Conta Antiga': antigas, 'Conta Nova': migradas})
+    # Na segunda onda, parte das contas antigas passa por uma conta intermediária
+    onda_1.loc[:len(intermediarias) - 1, 'Conta Nova'] = intermediarias.to_numpy()
+    onda_2 = pd.DataFrame({'Conta Antiga': intermediarias, 'Conta Nova': migradas.iloc[:len(intermediarias)].to_numpy()})
+    caminho_depara = os.path.join(pasta, 'DEPARA_CONTAS.xlsx')
+    with pd.ExcelWriter(caminho_depara, engine='openpyxl') as writer:
+        onda_1.to_excel(writer, sheet_name='2025_JUNHO', index=False)
+        onda_2.to_excel(writer, sheet_name='2025_JULHO', index=False)
+
+    # --- Relatório contábil: uma linha por conta e por conta contábil ---
+    chaves_bb = contas_bb.str.replace('-', '', regex=False)
+    chaves_cef = sufixo_cef.str.replace('-', '', regex=False)
+    # Contas da CEF migradas aparecem no contábil com o número antigo
+    chaves_cef_contabil = chaves_cef.copy()
+    chaves_cef_contabil.iloc[:n_depara] = antigas.str[-9:].str.zfill(9).to_numpy()
+    domicilios = pd.concat([
+        '001-2234-' + chaves_bb + ' - BANCO DO BRASIL',
+        '104-4064-' + chaves_cef_contabil + ' - CAIXA ECONOMICA',
+    ], ignore_index=True)
+    corrente = pd.concat([corrente_bb, corrente_cef], ignore_index=True)
+    aplicado = pd.concat([aplicado_bb, aplicado_cef], ignore_index=True)
+    divergentes = gerador.random(quantidade_contas) < proporcao_divergentes
+    corrente[divergentes] += np.round(gerador.normal(0, 500, divergentes.sum()), 2)
+
+    df_contabil = pd.DataFrame({
+        'Domicílio bancário': pd.concat([domicilios, domicilios], ignore_index=True),
+        'Conta contábil': ['111111901'] * quantidade_contas + ['111115001'] * quantidade_contas,
+        'Saldo Final': pd.concat([formatar_moeda_br(corrente), formatar_moeda_br(aplicado)], ignore_index=True),
+    })
+    caminho_contabil = os.path.join(pasta, f'contabil_{mes_ano}.csv')
+    with open(caminho_contabil, 'w', encoding='latin-1', newline='') as f:
+        f.write('Relatório de Saldos Contábeis - Dados Sintéticos;;\n')
+        df_contabil.to_csv(f, sep=';', index=False)
+
+    caminhos = {
+        'contabil': caminho_contabil,
+        'bb': caminho_bb,
+        'cef': caminho_cef,
+        'depara': caminho_depara,
+    }
+    if lancamentos_por_conta:
+        contas_bancos = {'bb': '2234-9/' + contas_bb, 'cef': contas_cef}
+        caminhos.update(gerar_lancamentos(pasta, mes_ano, domicilios, contas_bancos, lancamentos_por_conta, gerador))
+    return caminhos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera arquivos sintéticos de entrada para a conciliação.")
+    parser.add_argument('--contas', type=int, default=10_000, help="Quantidade de contas (padrão: %(default)s).")
+    parser.add_argument('--pasta', required=True, help="Pasta onde os arquivos serão gravados.")
+    parser.add_argument('--mes-ano', default=MES_ANO_PADRAO, help="Mês dos arquivos (padrão: %(default)s).")
+    parser.add_argument('--semente', type=int, default=42, help="Semente do gerador aleatório (padrão: %(default)s).")
+    parser.add_argument('--lancamentos', type=int, default=0,
+                        help="Lançamentos por conta para a conferência de lançamentos (padrão: nenhum).")
+    args = parser.parse_args(argv)
+
+    caminhos = gerar_dados(args.contas, args.pasta, args.mes_ano, args.semente, lancamentos_por_conta=args.lancamentos)
+    for tipo, caminho in caminhos.items():
+        print(f"{tipo}: {caminho}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
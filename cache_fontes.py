@@ -0,0 +1,172 @@
+"""
+Cache em disco (Parquet) dos arquivos de origem já processados.
+
+A chave de cada entrada é o hash do conteúdo do arquivo mais o nome e a versão
+do leitor: se o arquivo ou a normalização mudarem, a entrada antiga deixa de
+ser usada. O tamanho total da pasta é limitado e as entradas menos usadas
+recentemente são removidas primeiro (LRU pela data de modificação).
+
+Configuração por variáveis de ambiente:
+    CONCILIACAO_CACHE_DIR   pasta do cache (padrão: .cache_conciliacao)
+    CONCILIACAO_CACHE_MB    tamanho máximo em MB (padrão: 512)
+    CONCILIACAO_SEM_CACHE   '1' desativa o cache
+"""
+import functools
+import glob
+import hashlib
+import inspect
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401  (necessário para ler/gravar Parquet)
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
+PASTA_CACHE = os.environ.get('CONCILIACAO_CACHE_DIR', '.cache_conciliacao')
+TAMANHO_MAXIMO_CACHE = int(os.environ.get('CONCILIACAO_CACHE_MB', '512')) * 1024 * 1024
+CACHE_HABILITADO = os.environ.get('CONCILIACAO_SEM_CACHE', '') != '1'
+
+_TAMANHO_BLOCO = 1024 * 1024
+# Temporários de gravação mais velhos que isto são de processos que morreram
+# antes do os.replace (gravações em andamento duram segundos)
+IDADE_TEMPORARIO_ABANDONADO = 60 * 60
+
+
+def cache_habilitado():
+    return CACHE_HABILITADO and PARQUET_DISPONIVEL
+
+
+def hash_arquivo(caminho_arquivo):
+    """Hash (BLAKE2b) do conteúdo do arquivo, lido em blocos."""
+    h = hashlib.blake2b(digest_size=20)
+    with open(caminho_arquivo, 'rb') as f:
+        for bloco in iter(lambda: f.read(_TAMANHO_BLOCO), b''):
+            h.update(bloco)
+    return h.hexdigest()
+
+
+def _caminho_entrada(nome, versao, hash_conteudo):
+    return os.path.join(PASTA_CACHE, f"{nome}-v{versao}-{hash_conteudo}.parquet")
+
+
+def ler_cache(caminho_entrada):
+    """Retorna o DataFrame da entrada ou None. Um acerto renova a entrada no LRU."""
+    try:
+        df = pd.read_parquet(caminho_entrada)
+    except (FileNotFoundError, OSError, ValueError):
+        return None
+    try:
+        os.utime(caminho_entrada)
+    except OSError:
+        pass
+    return df
+
+
+def gravar_cache(caminho_entrada, df):
+    """Grava a entrada de forma atômica e aplica o limite de tamanho da pasta."""
+    os.makedirs(PASTA_CACHE, exist_ok=True)
+    # O prefixo ('bb-v5-<hash>.parquet.') permite limpar os temporários por leitor
+    descritor, caminho_temporario = tempfile.mkstemp(dir=PASTA_CACHE, prefix=os.path.basename(caminho_entrada) + '.', suffix='.tmp')
+    os.close(descritor)
+    try:
+        df.to_parquet(caminho_temporario, index=False)
+        os.replace(caminho_temporario, caminho_entrada)
+    except Exception:
+        if os.path.exists(caminho_temporario):
+            os.remove(caminho_temporario)
+        raise
+    aplicar_limite_cache()
+
+
+def _remover_temporarios(padrao='*.tmp', idade_minima=0):
+    """Remove os temporários de gravação (padrao) modificados há pelo menos idade_minima segundos."""
+    limite = time.time() - idade_minima
+    for caminho in glob.glob(os.path.join(PASTA_CACHE, padrao)):
+        try:
+            if os.stat(caminho).st_mtime <= limite:
+                os.remove(caminho)
+        except OSError:
+            continue
+
+
+def aplicar_limite_cache(tamanho_maximo=None):
+    """
+    Remove as entradas usadas há mais tempo até a pasta caber no limite, e os
+    temporários abandonados por gravações interrompidas.
+    """
+    tamanho_maximo = TAMANHO_MAXIMO_CACHE if tamanho_maximo is None else tamanho_maximo
+    _remover_temporarios(idade_minima=IDADE_TEMPORARIO_ABANDONADO)
+    entradas = []
+    for caminho in glob.glob(os.path.join(PASTA_CACHE, '*.parquet')):
+        try:
+            info = os.stat(caminho)
+        except OSError:
+            continue
+        entradas.append((info.st_mtime, info.st_size, caminho))
+    total = sum(tamanho for _, tamanho, _ in entradas)
+    for _, tamanho, caminho in sorted(entradas):
+        if total <= tamanho_maximo:
+            break
+        try:
+            os.remove(caminho)
+        except OSError:
+            continue
+        total -= tamanho
+
+
+def limpar_cache(nome=None):
+    """
+    Invalida o cache explicitamente: todas as entradas, ou só as de um leitor
+    (ex: nome='depara'), junto com os temporários de gravação. Retorna quantas
+    entradas foram removidas.
+    """
+    padrao = f"{nome}-v*.parquet" if nome else '*.parquet'
+    _remover_temporarios(padrao + '.*.tmp' if nome else '*.tmp')
+    removidas = 0
+    for caminho in glob.glob(os.path.join(PASTA_CACHE, padrao)):
+        try:
+            os.remove(caminho)
+            removidas += 1
+        except OSError:
+            pass
+    return removidas
+
+
+def em_cache(nome, versao):
+    """
+    Decorador para leitores cujo primeiro argumento é o caminho do arquivo.
+    Aumente 'versao' sempre que a normalização do leitor mudar.
+    Arquivos enviados pelo navegador (objetos, não caminhos) não usam o cache.
+    A função original continua acessível em 'funcao.sem_cache'.
+    """
+    def decorador(funcao):
+        assinatura = inspect.signature(funcao)
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            argumentos = assinatura.bind(*args, **kwargs)
+            argumentos.apply_defaults()
+            caminho_arquivo, *extras = argumentos.arguments.values()
+            if not cache_habilitado() or not isinstance(caminho_arquivo, (str, os.PathLike)):
+                return funcao(*args, **kwargs)
+            hash_conteudo = hash_arquivo(caminho_arquivo)
+            if extras:
+                hash_extras = hashlib.blake2b(repr(extras).encode('utf-8'), digest_size=6).hexdigest()
+                hash_conteudo += '-' + hash_extras
+            caminho_entrada = _caminho_entrada(nome, versao, hash_conteudo)
+            df = ler_cache(caminho_entrada)
+            if df is None:
+                df = funcao(*args, **kwargs)
+                try:
+                    gravar_cache(caminho_entrada, df)
+                except (OSError, ValueError, TypeError):
+                    pass  # Falha ao gravar o cache não impede a conciliação
+            return df
+        envoltorio.sem_cache = funcao
+        return envoltorio
+    return decorador
@@ -0,0 +1,1011 @@
+"""
+Lógica principal da conciliação de saldos bancários e contábeis.
+
+Este módulo não depende do Streamlit: é usado tanto pela interface web
+(app_web_conciliacao.py) quanto pelo processamento em lote (conciliar_lote.py).
+"""
+import mmap
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache_fontes import em_cache
+
+PASTA_EXTRATOS = "extratos_consolidados"
+CAMINHO_DEPARA = "depara/DEPARA_CONTAS BANCÁRIAS_CEF.xlsx"
+
+MESES = {1: "janeiro", 2: "fevereiro", 3: "março", 4: "abril", 5: "maio", 6: "junho", 7: "julho", 8: "agosto", 9: "setembro", 10: "outubro", 11: "novembro", 12: "dezembro"}
+
+# Nome dos arquivos de extrato: extrato_{banco}_{mes}_{ano}[_{parte}].{extensão}
+# (ex: extrato_bb_julho_2025.csv, extrato_itau_julho_2025_2.csv). Os bancos e
+# as extensões aceitas vêm do registro de leitores (LEITORES_EXTRATO).
+# Os leitores de arquivos usam o cache em disco (cache_fontes.py). Ao mudar a
+# normalização de um leitor, aumente a 'versao' do seu @em_cache.
+
+PADRAO_ARQUIVO_EXTRATO = re.compile(
+    r'^extrato_(?P<banco>[a-z0-9]+)_(?P<mes>[a-zç]+)_(?P<ano>\d{4})(?:_(?P<parte>[\w-]+))?\.(?P<extensao>[a-z0-9]+)$')
+
+
+class ErroArquivoExtrato(ValueError):
+    """O arquivo de extrato não está no formato esperado."""
+
+
+def converter_moeda_centavos(valores, formato=None):
+    """
+    Converte uma coluna (Series) de textos monetários em centavos exatos (int64),
+    processando a coluna inteira de uma vez, sem chamadas por célula.
+
+    1. Aceita o formato brasileiro ('1.234,56') e o internacional ('1,234.56').
+       Com formato=None o separador decimal é detectado por célula; células
+       ambíguas (ex: '1.442', um único separador seguido de 3 dígitos) seguem
+       o formato predominante da coluna.
+    2. Use formato='br' ou formato='internacional' para fixar o separador.
+    3. Mantém o sufixo 'C'/'D' dos arquivos da Caixa: 'D' (devedor), o sinal
+       '-' e valores entre parênteses viram valores negativos.
+    4. Valores vazios ou inválidos resultam em 0.
+    """
+    valores = pd.Series(valores)
+    texto = valores.astype('string').fillna('').str.strip().str.upper()
+    negativo = (
+        texto.str.endswith('D') | texto.str.startswith('-') | texto.str.endswith('-')
+        | (texto.str.startswith('(') & texto.str.endswith(')'))
+    ).to_numpy(dtype=bool)
+    texto = texto.str.replace(r'[^0-9.,]', '', regex=True)
+
+    pos_ponto = texto.str.rfind('.').to_numpy(dtype='int64')
+    pos_virgula = texto.str.rfind(',').to_numpy(dtype='int64')
+    qtd_pontos = texto.str.count(r'\.').to_numpy(dtype='int64')
+    qtd_virgulas = texto.str.count(',').to_numpy(dtype='int64')
+    tamanho = texto.str.len().to_numpy(dtype='int64')
+
+    # Dígitos após o último separador encontrado na célula
+    digitos_finais = tamanho - 1 - np.maximum(pos_ponto, pos_virgula)
+    so_ponto = (qtd_pontos == 1) & (qtd_virgulas == 0)
+    so_virgula = (qtd_virgulas == 1) & (qtd_pontos == 0)
+    ambiguo = (so_ponto | so_virgula) & (digitos_finais == 3)
+
+    decimal_virgula = ((pos_virgula > pos_ponto) & (pos_ponto >= 0)) | (so_virgula & ~ambiguo)
+    decimal_ponto = ((pos_ponto > pos_virgula) & (pos_virgula >= 0)) | (so_ponto & ~ambiguo)
+
+    if formato == 'br':
+        decimal_virgula = qtd_virgulas > 0
+        decimal_ponto = np.zeros(len(texto), dtype=bool)
+    elif formato == 'internacional':
+        decimal_ponto = qtd_pontos > 0
+        decimal_virgula = np.zeros(len(texto), dtype=bool)
+    elif ambiguo.any():
+        # Resolve as células ambíguas pelo formato predominante da coluna
+        if decimal_virgula.sum() > decimal_ponto.sum():
+            decimal_virgula = decimal_virgula | (ambiguo & so_virgula)
+        elif decimal_ponto.sum() > decimal_virgula.sum():
+            decimal_ponto = decimal_ponto | (ambiguo & so_ponto)
+
+    # Normaliza para '1234.56': remove o separador de milhar e troca o decimal por '.'
+    normalizado = texto.str.replace(r'[.,]', '', regex=True)
+    if decimal_virgula.any():
+        normalizado[decimal_virgula] = (
+            texto[decimal_virgula].str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+        )
+    if decimal_ponto.any():
+        normalizado[decimal_ponto] = texto[decimal_ponto].str.replace(',', '', regex=False)
+
+    partes = normalizado.str.extract(r'^(\d*)(?:\.(\d*))?$')
+    inteiro = pd.to_numeric(partes[0].fillna('').str.replace(r'^$', '0', regex=True), errors='coerce')
+    # Três casas para arredondar corretamente o centavo (meio para cima)
+    milesimos = pd.to_numeric(partes[1].fillna('').str[:3].str.ljust(3, '0'), errors='coerce')
+
+    inteiro = inteiro.fillna(0).to_numpy(dtype='int64')
+    milesimos = milesimos.fillna(0).to_numpy(dtype='int64')
+    centavos = inteiro * 100 + (milesimos + 5) // 10
+    centavos = np.where(negativo, -centavos, centavos)
+    return pd.Series(centavos, index=valores.index, dtype='int64')
+
+# Chave Primaria: os últimos 7 dígitos da conta como inteiro (int32). O próprio
+# número da conta é o índice compartilhado entre contábil, BB, CEF e DE-PARA.
+CHAVE_AUSENTE = -1
+
+def _digitos_para_chave(textos):
+    """Converte textos com dígitos em chaves int32 (últimos 7 dígitos)."""
+    digitos = textos.str.replace(r'\D', '', regex=True).str[-7:]
+    chaves = pd.to_numeric(digitos.replace('', '0'), errors='coerce')
+    return chaves.fillna(CHAVE_AUSENTE).astype('int32')
+
+def gerar_chave_padronizada(textos_conta):
+    """
+    Padroniza a criação da chave para DE-PARA e Extratos (coluna inteira).
+    1. Extrai apenas os dígitos.
+    2. Pega os últimos 7 dígitos.
+    3. Retorna a chave como int32; valores ausentes viram CHAVE_AUSENTE.
+    """
+    return _digitos_para_chave(pd.Series(textos_conta).astype('string'))
+
+def gerar_chave_contabil(textos_conta):
+    """
+    Extrai a chave do campo 'Domicílio bancário' (3ª parte separada por '-')
+    e a padroniza como a chave dos extratos. Sem 3ª parte: CHAVE_AUSENTE.
+    """
+    parte_conta = pd.Series(textos_conta).astype('string').str.extract(r'^[^-]*-[^-]*-([^-]*)', expand=False)
+    return _digitos_para_chave(parte_conta)
+
+def formatar_chave(chaves):
+    """Formata chaves int32 como texto de 7 dígitos (ex: 54 -> '0000054')."""
+    return pd.Series(chaves).astype('string').str.zfill(7)
+
+def colisoes_chave(chaves, contas):
+    """
+    Chaves compartilhadas por contas diferentes: números de conta distintos
+    (ignorando zeros à esquerda e separadores) cujos últimos 7 dígitos são
+    iguais e que, por isso, seriam somados numa mesma linha da conciliação.
+    Retorna [{'chave': int, 'contas': [texto, ...]}, ...] (vazia se não houver),
+    num formato que sobrevive ao cache em parquet (df.attrs).
+    """
+    pares = pd.DataFrame({'chave': np.asarray(chaves), 'conta': pd.Series(contas).astype('string').to_numpy()})
+    pares = pares[pares['chave'] != CHAVE_AUSENTE].drop_duplicates()
+    pares['digitos'] = pares['conta'].str.replace(r'\D', '', regex=True).str.lstrip('0')
+    pares = pares.drop_duplicates(['chave', 'digitos'])
+    repetidas = pares[pares['chave'].duplicated(keep=False)]
+    return [{'chave': int(chave), 'contas': grupo['conta'].tolist()} for chave, grupo in repetidas.groupby('chave')]
+
+# Abas datadas do DE-PARA: '2025_JUNHO', '2025_JUNHO (2)' (revisão do mesmo mês)
+_PADRAO_ABA_DEPARA = re.compile(r'^\s*(?P<ano>\d{4})[\W_]*(?P<mes>[A-Za-zÇç]+)\s*(?:\((?P<revisao>\d+)\))?\s*$')
+
+def ordem_aba_depara(nome_aba):
+    """
+    Posição cronológica de uma aba datada do DE-PARA: (ano, mês, revisão).
+    Retorna None se o nome da aba não contém uma data reconhecível.
+    """
+    encontrado = _PADRAO_ABA_DEPARA.match(str(nome_aba))
+    if encontrado is None:
+        return None
+    numero_mes = {nome: numero for numero, nome in MESES.items()}.get(encontrado['mes'].lower())
+    if numero_mes is None:
+        return None
+    return (int(encontrado['ano']), numero_mes, int(encontrado['revisao'] or 1))
+
+@em_cache('depara', versao=2)
+def carregar_depara(caminho_arquivo=CAMINHO_DEPARA):
+    """
+    Carrega todas as abas datadas do arquivo DE-PARA (em ordem cronológica)
+    e padroniza as chaves. A coluna 'Aba' indica a origem de cada linha.
+    Sem abas datadas, todas as abas são lidas na ordem do arquivo.
+    Lança FileNotFoundError se o arquivo não existir; quem chama decide
+    se segue sem a tradução de contas.
+    """
+    abas = pd.read_excel(caminho_arquivo, sheet_name=None, dtype=str)
+    datadas = [nome for nome in abas if ordem_aba_depara(nome) is not None]
+    nomes_abas = sorted(datadas, key=ordem_aba_depara) if datadas else list(abas)
+
+    partes = []
+    for nome_aba in nomes_abas:
+        df_aba = abas[nome_aba].iloc[:, :2].copy()
+        df_aba.columns = ['Conta Antiga', 'Conta Nova']
+        df_aba['Aba'] = nome_aba
+        partes.append(df_aba)
+    df_depara = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=['Conta Antiga', 'Conta Nova', 'Aba'])
+    df_depara['Chave Antiga'] = gerar_chave_padronizada(df_depara['Conta Antiga'])
+    df_depara['Chave Nova'] = gerar_chave_padronizada(df_depara['Conta Nova'])
+    return df_depara
+
+class MapaDepara:
+    """
+    DE-PARA compilado para busca vetorizada: chaves antigas ordenadas e a
+    chave final de cada uma, já resolvendo cadeias (antiga -> nova -> mais nova).
+
+    Problemas encontrados na compilação:
+    - conflitos: DataFrame com as chaves antigas mapeadas para mais de uma
+      chave nova (vale a mapeação da aba mais recente);
+    - ciclos: listas de chaves que formam ciclos (essas chaves não são traduzidas);
+    - levam_a_ciclo: chaves cuja cadeia entra num ciclo (também não traduzidas).
+    """
+
+    def __init__(self, antigas, finais, conflitos, ciclos, levam_a_ciclo=()):
+        self.antigas = antigas
+        self.finais = finais
+        self.conflitos = conflitos
+        self.ciclos = ciclos
+        self.levam_a_ciclo = list(levam_a_ciclo)
+
+    def __len__(self):
+        return len(self.antigas)
+
+    @property
+    def vazio(self):
+        return len(self.antigas) == 0
+
+    def aplicar(self, chaves):
+        """Traduz uma coluna de chaves int32 de uma só vez (busca binária)."""
+        chaves = pd.Series(chaves)
+        if self.vazio:
+            return chaves.astype('int32')
+        valores = chaves.to_numpy(dtype='int32')
+        posicoes = np.minimum(np.searchsorted(self.antigas, valores), len(self.antigas) - 1)
+        encontradas = self.antigas[posicoes] == valores
+        return pd.Series(np.where(encontradas, self.finais[posicoes], valores).astype('int32'), index=chaves.index)
+
+    def avisos(self):
+        """Mensagens sobre conflitos e ciclos, para exibição ao usuário."""
+        mensagens = []
+        for _, conflito in self.conflitos.iterrows():
+            mensagens.append(
+                f"DE-PARA: a conta {conflito['Chave Antiga']:07d} aparece com mais de uma conta nova "
+                f"({conflito['Chaves Novas']}, abas: {conflito['Abas']}); vale a da aba mais recente."
+            )
+        for ciclo in self.ciclos:
+            mensagens.append(
+                f"DE-PARA: ciclo entre as contas {' -> '.join(f'{chave:07d}' for chave in ciclo)}; "
+                "essas contas não serão traduzidas."
+            )
+        if self.levam_a_ciclo:
+            exemplos = ', '.join(f'{chave:07d}' for chave in self.levam_a_ciclo[:10])
+            if len(self.levam_a_ciclo) > 10:
+                exemplos += f" e outras {len(self.levam_a_ciclo) - 10}"
+            mensagens.append(
+                f"DE-PARA: {len(self.levam_a_ciclo)} conta(s) levam a um ciclo ({exemplos}); "
+                "essas contas não serão traduzidas."
+            )
+        return mensagens
+
+def compilar_depara(df_depara):
+    """
+    Compila o DE-PARA (saída de carregar_depara) em um MapaDepara.
+    1. Descarta linhas sem chave e mapeações de uma conta para ela mesma.
+    2. Detecta conflitos; a última ocorrência (aba mais recente) prevalece.
+    3. Resolve cadeias por duplicação de ponteiros (log2 n passos vetorizados).
+    4. Detecta ciclos: chaves que nunca chegam a uma conta final.
+    """
+    colunas_conflito = ['Chave Antiga', 'Chaves Novas', 'Abas']
+    if df_depara is None or df_depara.empty:
+        return MapaDepara(np.zeros(0, dtype='int32'), np.zeros(0, dtype='int32'), pd.DataFrame(columns=colunas_conflito), [])
+
+    pares = df_depara[['Chave Antiga', 'Chave Nova']].copy()
+    pares['Aba'] = df_depara['Aba'] if 'Aba' in df_depara.columns else ''
+    pares = pares[(pares['Chave Antiga'] != CHAVE_AUSENTE) & (pares['Chave Nova'] != CHAVE_AUSENTE)
+                  & (pares['Chave Antiga'] != pares['Chave Nova'])]
+
+    destinos = pares.drop_duplicates(['Chave Antiga', 'Chave Nova'])
+    repetidas = destinos['Chave Antiga'].duplicated(keep=False)
+    conflitos = (
+        destinos[repetidas].groupby('Chave Antiga', sort=True)
+        .agg(**{
+            'Chaves Novas': ('Chave Nova', lambda chaves: ', '.join(f'{c:07d}' for c in chaves)),
+            'Abas': ('Aba', lambda abas: ', '.join(dict.fromkeys(map(str, abas)))),
+        })
+        .reset_index()
+    )
+
+    unicos = pares.drop_duplicates('Chave Antiga', keep='last').sort_values('Chave Antiga')
+    antigas = unicos['Chave Antiga'].to_numpy(dtype='int32')
+    proximas = unicos['Chave Nova'].to_numpy(dtype='int32')
+
+    # Cadeias por duplicação de ponteiros: 'salto' começa no próximo elo de
+    # cada chave (ou nela mesma, se a chave nova já é final) e cada passo
+    # dobra a distância percorrida, então log2(n) passos bastam mesmo com ciclos.
+    posicoes = np.minimum(np.searchsorted(antigas, proximas), len(antigas) - 1)
+    tem_proxima = antigas[posicoes] == proximas
+    salto = np.where(tem_proxima, posicoes, np.arange(len(antigas)))
+    for _ in range(int(np.ceil(np.log2(len(antigas) + 1))) + 1):
+        novo_salto = salto[salto]
+        if np.array_equal(novo_salto, salto):
+            break
+        salto = novo_salto
+    # Quem não chega a uma chave com conta nova final está em um ciclo (ou leva a um)
+    em_ciclo = tem_proxima[salto]
+    finais = np.where(em_ciclo, antigas, proximas[salto])
+
+    ciclos, levam_a_ciclo = [], []
+    if em_ciclo.any():
+        proxima_de = dict(zip(antigas.tolist(), proximas.tolist()))
+        vistas = set()
+        for inicio in antigas[em_ciclo].tolist():
+            # Posição de cada chave no caminho percorrido a partir de 'inicio'
+            caminho, chave = {}, inicio
+            while chave in proxima_de and chave not in vistas and chave not in caminho:
+                caminho[chave] = len(caminho)
+                chave = proxima_de[chave]
+            chaves_caminho = list(caminho)
+            entrada = caminho.get(chave, len(caminho))
+            if chave in caminho:
+                ciclos.append(chaves_caminho[entrada:] + [chave])
+            levam_a_ciclo.extend(chaves_caminho[:entrada])
+            vistas.update(caminho)
+
+    return MapaDepara(antigas, finais.astype('int32'), conflitos[colunas_conflito], ciclos, sorted(levam_a_ciclo))
+
+COLUNAS_RELATORIO_CONTABIL = ['Domicílio bancário', 'Conta contábil', 'Saldo Final']
+LINHAS_POR_BLOCO_CONTABIL = 250_000
+
+# Trecho do código da conta contábil -> coluna de saldo que ela alimenta
+CONTAS_CONTABEIS_SALDO = {'111111901': 'Saldo_Corrente_Contabil', '111115001': 'Saldo_Aplicado_Contabil'}
+_TIPO_OUTRAS_CONTAS = len(CONTAS_CONTABEIS_SALDO)
+
+def _tipo_saldo_contabil(contas):
+    """
+    Classifica cada linha pela conta contábil (categórica): 0 = corrente,
+    1 = aplicado, 2 = outras. Só as categorias distintas são comparadas.
+    """
+    categorias = contas.cat.categories.astype(str)
+    tipos = np.full(len(categorias) + 1, _TIPO_OUTRAS_CONTAS, dtype='int8')
+    for tipo, trecho in enumerate(CONTAS_CONTABEIS_SALDO):
+        tipos[:-1][categorias.str.contains(trecho, regex=False)] = tipo
+    # Código -1 (célula vazia) cai na última posição, 'outras'
+    return tipos[contas.cat.codes.to_numpy()]
+
+def processar_relatorio_contabil(arquivo_carregado, df_depara, manter_auditoria=False, linhas_por_bloco=LINHAS_POR_BLOCO_CONTABIL):
+    """
+    Lê o relatório contábil e aplica a tradução DE-PARA.
+    df_depara pode ser a saída de carregar_depara ou um MapaDepara já compilado.
+
+    O arquivo é lido em blocos e só com as colunas necessárias; cada bloco é
+    somado por chave e tipo de conta contábil, então a memória depende do
+    número de contas e não do tamanho do arquivo. As linhas brutas (com todas
+    as colunas) só são guardadas com manter_auditoria=True, com 'Saldo Final'
+    já em centavos (int64); caso contrário o primeiro valor retornado é None.
+    As contagens de linhas (lidas e descartadas sem chave) ficam em
+    df_final.attrs['contagens'] e as chaves compartilhadas por contas
+    diferentes (antes do DE-PARA), em df_final.attrs['colisoes_chave'].
+    """
+    leitor = pd.read_csv(
+        arquivo_carregado, encoding='latin-1', sep=';', header=1,
+        usecols=None if manter_auditoria else COLUNAS_RELATORIO_CONTABIL,
+        dtype={'Domicílio bancário': str, 'Conta contábil': 'category', 'Saldo Final': str},
+        chunksize=linhas_por_bloco,
+    )
+    mapa_depara = df_depara if isinstance(df_depara, MapaDepara) else compilar_depara(df_depara)
+
+    linhas_lidas = linhas_validas = 0
+    parciais, descricoes, contas_por_chave, blocos_auditoria = [], [], [], []
+    with leitor:
+        for df in leitor:
+            linhas_lidas += len(df)
+            df['Chave Primaria'] = gerar_chave_contabil(df['Domicílio bancário'])
+            df = df[df['Chave Primaria'] != CHAVE_AUSENTE]
+            linhas_validas += len(df)
+            contas_por_chave.append(df[['Chave Primaria', 'Domicílio bancário']].drop_duplicates())
+
+            if not mapa_depara.vazio:
+                # Busca binária nas chaves antigas ordenadas; chaves sem tradução permanecem iguais
+                df['Chave Primaria'] = mapa_depara.aplicar(df['Chave Primaria'])
+
+            # Saldo em centavos (int64) para que as diferenças sejam exatas
+            df['Saldo Final'] = converter_moeda_centavos(df['Saldo Final'], formato='br')
+
+            tipo = _tipo_saldo_contabil(df['Conta contábil'])
+            parciais.append(df['Saldo Final'].groupby([df['Chave Primaria'], tipo]).sum())
+            # Uma descrição por chave (a primeira do arquivo), para que o join não duplique contas
+            descricoes.append(df[['Chave Primaria', 'Domicílio bancário']].drop_duplicates('Chave Primaria'))
+            if manter_auditoria:
+                blocos_auditoria.append(df)
+
+    colunas_saldo = list(CONTAS_CONTABEIS_SALDO.values())
+    if parciais:
+        # Chaves que só têm outras contas contábeis continuam presentes, com saldo zero
+        saldos = pd.concat(parciais).groupby(level=[0, 1]).sum().unstack(fill_value=0)
+        saldos = saldos.reindex(columns=range(len(colunas_saldo)), fill_value=0)
+        saldos.columns = colunas_saldo
+        saldos.index.name = 'Chave Primaria'
+        mapa_conta = pd.concat(descricoes).drop_duplicates('Chave Primaria').set_index('Chave Primaria')
+        df_final = saldos.join(mapa_conta).reset_index()
+    else:
+        df_final = pd.DataFrame(columns=['Chave Primaria', *colunas_saldo, 'Domicílio bancário'])
+
+    df_auditoria = pd.concat(blocos_auditoria, ignore_index=True) if blocos_auditoria else None
+    df_final.attrs['contagens'] = {'linhas_lidas': linhas_lidas, 'linhas_sem_chave': linhas_lidas - linhas_validas}
+    colisoes = []
+    if contas_por_chave:
+        contas = pd.concat(contas_por_chave)
+        parte_conta = contas['Domicílio bancário'].str.extract(r'^[^-]*-[^-]*-([^-]*)', expand=False)
+        colisoes = colisoes_chave(contas['Chave Primaria'], parte_conta.str.strip())
+    df_final.attrs['colisoes_chave'] = colisoes
+    return df_auditoria, df_final
+
+def _contagens_extrato(df):
+    """Linhas lidas do extrato e quantas ficarão de fora da conciliação por não terem chave."""
+    return {'linhas_lidas': len(df), 'linhas_sem_chave': int((df['Chave Primaria'] == CHAVE_AUSENTE).sum())}
+
+COLUNAS_SALDO_EXTRATO = ['Saldo_Corrente_Extrato', 'Saldo_Aplicado_Extrato']
+
+def normalizar_extrato(df, coluna_conta, renomear, colunas_valor=COLUNAS_SALDO_EXTRATO, formato=None,
+                       agencia=None, conta_extrato=None):
+    """
+    Leva o extrato lido de um banco ao esquema comum da conciliação:
+    1. Renomeia as colunas de saldo do arquivo ({coluna do arquivo: coluna comum}).
+    2. 'Chave Primaria' (int32) a partir de coluna_conta.
+    3. 'Agencia_Extrato' (None se o banco não a usa na descrição da conta) e
+       'Conta_Extrato' (padrão: coluna_conta), a identificação da conta no extrato.
+    4. colunas_valor em centavos (int64), com o 'formato' de converter_moeda_centavos;
+       os saldos ausentes do arquivo ficam zerados.
+    5. Contagens, colisões de chave, o nome de coluna_conta e as colunas
+       convertidas em centavos ('colunas_centavos') em df.attrs.
+    """
+    df.rename(columns=renomear, inplace=True)
+    df['Chave Primaria'] = gerar_chave_padronizada(df[coluna_conta])
+    df['Agencia_Extrato'] = agencia
+    df['Conta_Extrato'] = df[coluna_conta] if conta_extrato is None else conta_extrato
+    for col in colunas_valor:
+        if col in df.columns:
+            df[col] = converter_moeda_centavos(df[col], formato=formato)
+    for col in COLUNAS_SALDO_EXTRATO:
+        if col not in df.columns:
+            df[col] = 0
+
+    df.attrs['colunas_centavos'] = [col for col in dict.fromkeys([*colunas_valor, *COLUNAS_SALDO_EXTRATO]) if col in df.columns]
+    df.attrs['contagens'] = _contagens_extrato(df)
+    df.attrs['colisoes_chave'] = colisoes_chave(df['Chave Primaria'], df[coluna_conta])
+    df.attrs['coluna_conta'] = coluna_conta
+    return df
+
+def _ler_csv_utf8_ou_latin1(arquivo, **opcoes):
+    """
+    read_csv em UTF-8 (com ou sem BOM) e, se o arquivo não for UTF-8 válido,
+    em latin-1. Ler um UTF-8 como latin-1 não dá erro, mas troca os acentos
+    ('Agência' vira 'AgÃªncia'), então a ordem das tentativas importa.
+    """
+    try:
+        return pd.read_csv(arquivo, encoding='utf-8-sig', **opcoes)
+    except UnicodeDecodeError:
+        if hasattr(arquivo, 'seek'):
+            arquivo.seek(0)
+        return pd.read_csv(arquivo, encoding='latin-1', **opcoes)
+
+@em_cache('bb', versao=6)
+def processar_extrato_bb_bruto_csv(caminho_arquivo):
+    """
+    Lê e transforma o arquivo .csv bruto do Banco do Brasil (exportado em
+    UTF-8; arquivos antigos em latin-1 também são aceitos).
+    'Conta_Extrato' identifica a conta como 'agência/conta'.
+    """
+    df = _ler_csv_utf8_ou_latin1(caminho_arquivo, sep=',', dtype=str)
+    if 'Conta' not in df.columns:
+        raise ErroArquivoExtrato("Erro no arquivo do BB: A coluna 'Conta' não foi encontrada.")
+
+    # O BB mistura formatos no mesmo arquivo ('0.00' e '1.442,26'), então o
+    # formato é detectado por coluna/célula.
+    return normalizar_extrato(
+        df, 'Conta',
+        {'Saldo em conta': 'Saldo_Corrente_Extrato', 'Saldo investido': 'Saldo_Aplicado_Extrato'},
+        colunas_valor=[*COLUNAS_SALDO_EXTRATO, 'Saldo total'],
+        conta_extrato=df['Agência'] + '/' + df['Conta'] if 'Agência' in df.columns else None,
+    )
+
+# Linha de cabeçalho da tabela de contas no arquivo .cef
+_PADRAO_CABECALHO_CEF = re.compile(rb'^[ \t]*(?:Nome )?Conta Vinculada;', re.MULTILINE)
+# Linhas do preâmbulo: 'Total Geral.........................: 592.973.645,61C'
+_PADRAO_LINHA_PREAMBULO = re.compile(r'^\s*(?P<rotulo>[^:]*?)\.*:\s*(?P<valor>.*?)\s*$')
+# Início do rótulo no preâmbulo -> nome do total (comparado só pelo prefixo
+# ASCII, pois os acentos variam conforme a codificação da exportação)
+ROTULOS_TOTAIS_CEF = {
+    'Total Apurado (Conta Corrente)': 'total_corrente',
+    'Total Apurado (Conta Investimento)': 'total_investimento',
+    'Total Apurado (Aplica': 'total_aplicado',
+    'Total Geral': 'total_geral',
+}
+
+def localizar_cabecalho_cef(arquivo):
+    """
+    Procura a linha de cabeçalho ('Conta Vinculada;' ou 'Nome Conta Vinculada;')
+    com o arquivo mapeado em memória, sem carregá-lo em uma lista de linhas.
+    Retorna (posição em bytes do cabeçalho ou -1, bytes do preâmbulo).
+    """
+    try:
+        with mmap.mmap(arquivo.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            encontrado = _PADRAO_CABECALHO_CEF.search(mm)
+            if encontrado is None:
+                return -1, b''
+            return encontrado.start(), mm[:encontrado.start()]
+    except ValueError:
+        # Arquivo vazio não pode ser mapeado
+        return -1, b''
+
+def ler_preambulo_cef(preambulo):
+    """
+    Lê as linhas 'rótulo....: valor' antes da tabela do arquivo .cef.
+    Retorna (campos em texto, totais em centavos).
+    """
+    try:
+        texto = preambulo.decode('utf-8')
+    except UnicodeDecodeError:
+        texto = preambulo.decode('latin-1')
+    campos = {}
+    for linha in texto.splitlines():
+        encontrado = _PADRAO_LINHA_PREAMBULO.match(linha)
+        if encontrado and encontrado['rotulo'].strip():
+            campos[encontrado['rotulo'].strip()] = encontrado['valor']
+
+    totais = {}
+    for rotulo, valor in campos.items():
+        for prefixo, nome_total in ROTULOS_TOTAIS_CEF.items():
+            if rotulo.startswith(prefixo):
+                totais[nome_total] = int(converter_moeda_centavos(pd.Series([valor]), formato='br').iloc[0])
+    return campos, totais
+
+@em_cache('cef', versao=6)
+def processar_extrato_cef_bruto(caminho_arquivo):
+    """
+    Lê o arquivo .cef da Caixa e extrai o prefixo de banco/agência.
+    Esta versão é mais robusta e lida com variações no nome da coluna da conta.
+    O arquivo não é copiado para a memória: o leitor de CSV começa direto na
+    linha de cabeçalho. Os campos e totais do preâmbulo ficam em
+    df.attrs['preambulo_cef'] e df.attrs['totais_cef'] (ver verificar_totais_cef).
+    """
+    with open(caminho_arquivo, 'rb') as f:
+        posicao_cabecalho, preambulo = localizar_cabecalho_cef(f)
+        if posicao_cabecalho == -1:
+            raise ErroArquivoExtrato("Erro no arquivo da CEF: Não foi possível encontrar a linha de cabeçalho ('Conta Vinculada;' ou 'Nome Conta Vinculada;').")
+        f.seek(posicao_cabecalho)
+        df = pd.read_csv(f, sep=';', dtype=str, encoding='latin-1')
+
+    campos_preambulo, totais = ler_preambulo_cef(preambulo)
+    df.attrs['preambulo_cef'] = campos_preambulo
+    df.attrs['totais_cef'] = totais
+    
+    nome_coluna_conta = None
+    if 'Conta Vinculada' in df.columns:
+        nome_coluna_conta = 'Conta Vinculada'
+    elif 'Nome Conta Vinculada' in df.columns:
+        nome_coluna_conta = 'Nome Conta Vinculada'
+    
+    if nome_coluna_conta is None:
+        raise ErroArquivoExtrato("Erro no arquivo da CEF: Não foi possível encontrar a coluna de identificação da conta ('Conta Vinculada' ou 'Nome Conta Vinculada').")
+
+    return normalizar_extrato(
+        df, nome_coluna_conta,
+        {'Saldo Conta Corrente (R$)': 'Saldo_Corrente_Extrato', 'Saldo Aplicado (R$)': 'Saldo_Aplicado_Extrato'},
+        formato='br', agencia=df[nome_coluna_conta].str[:9],
+    )
+
+def verificar_totais_cef(df):
+    """
+    Confere as linhas lidas do .cef com os totais do preâmbulo do arquivo.
+    Retorna uma lista de mensagens de divergência (vazia se tudo confere).
+    """
+    totais = df.attrs.get('totais_cef', {})
+    if not totais:
+        return []
+    soma_corrente = int(df['Saldo_Corrente_Extrato'].sum())
+    soma_aplicado = int(df['Saldo_Aplicado_Extrato'].sum())
+    soma_investimento = 0
+    if 'Saldo Conta Investimento (R$)' in df.columns:
+        soma_investimento = int(converter_moeda_centavos(df['Saldo Conta Investimento (R$)'], formato='br').sum())
+
+    somas = {
+        'total_corrente': ('Total Apurado (Conta Corrente)', soma_corrente),
+        'total_investimento': ('Total Apurado (Conta Investimento)', soma_investimento),
+        'total_aplicado': ('Total Apurado (Aplicações)', soma_aplicado),
+        'total_geral': ('Total Geral', soma_corrente + soma_investimento + soma_aplicado),
+    }
+    divergencias = []
+    for nome_total, (rotulo, soma) in somas.items():
+        if nome_total in totais and totais[nome_total] != soma:
+            divergencias.append(
+                f"Extrato da CEF: '{rotulo}' informa {formatar_centavos(totais[nome_total])}, "
+                f"mas a soma das contas é {formatar_centavos(soma)}."
+            )
+    return divergencias
+
+def formatar_centavos(centavos):
+    """Formata centavos no padrão brasileiro (ex: 123456 -> '1.234,56')."""
+    return f'{centavos / 100:,.2f}'.replace(",", "X").replace(".", ",").replace("X", ".")
+
+# --- Registro de leitores de extrato ---
+# Para incluir um banco: escreva o leitor (arquivo -> DataFrame no esquema de
+# normalizar_extrato, com @em_cache) e uma função de reconhecimento do
+# conteúdo, e registre os dois com registrar_leitor_extrato. Descoberta dos
+# arquivos, carga, interface, monitor e lote passam a tratar o banco.
+
+class LeitorExtrato:
+    """
+    Leitor do extrato de um banco.
+    - banco: código no nome dos arquivos e nome da fonte na conciliação ('bb');
+    - nome: nome do banco nas mensagens;
+    - extensoes: extensões de arquivo do banco ('csv',);
+    - reconhecer: função(bytes do início do arquivo) -> bool, usada quando o
+      nome do arquivo não identifica o banco;
+    - ler: função(caminho) -> extrato normalizado (ver normalizar_extrato);
+    - verificar: função(extrato) -> lista de avisos (opcional).
+    """
+
+    def __init__(self, banco, nome, extensoes, reconhecer, ler, verificar=None):
+        self.banco = banco
+        self.nome = nome
+        self.extensoes = tuple(extensoes)
+        self.reconhecer = reconhecer
+        self.ler = ler
+        self.verificar = verificar
+
+    def descricao_arquivos(self):
+        """Ex: 'Banco do Brasil (.csv)'."""
+        return f"{self.nome} ({', '.join('.' + extensao for extensao in self.extensoes)})"
+
+
+LEITORES_EXTRATO = {}  # banco -> LeitorExtrato, na ordem de registro
+
+def registrar_leitor_extrato(leitor):
+    """Registra (ou substitui) o leitor do banco leitor.banco."""
+    LEITORES_EXTRATO[leitor.banco] = leitor
+    return leitor
+
+# Bytes lidos do início do arquivo para reconhecer o banco pelo conteúdo
+BYTES_RECONHECIMENTO = 64 * 1024
+
+def _primeira_linha(inicio):
+    texto = inicio.decode('latin-1').lstrip('\ufeff\xef\xbb\xbf')
+    return texto.split('\n', 1)[0].strip()
+
+def reconhecer_extrato_bb(inicio):
+    """Cabeçalho do BB (com ou sem aspas): 'Agência,Conta,Saldo em conta,...'."""
+    colunas = {coluna.strip().strip('"') for coluna in _primeira_linha(inicio).split(',')}
+    return 'Conta' in colunas and bool(colunas & {'Saldo em conta', 'Saldo investido'})
+
+def reconhecer_extrato_cef(inicio):
+    """Linha 'Conta Vinculada;...' (ou 'Nome Conta Vinculada;') depois do preâmbulo da Caixa."""
+    return _PADRAO_CABECALHO_CEF.search(inicio) is not None
+
+registrar_leitor_extrato(LeitorExtrato('bb', 'Banco do Brasil', ['csv'], reconhecer_extrato_bb, processar_extrato_bb_bruto_csv))
+registrar_leitor_extrato(LeitorExtrato('cef', 'Caixa Econômica Federal', ['cef'], reconhecer_extrato_cef,
+                                       processar_extrato_cef_bruto, verificar_totais_cef))
+
+def identificar_leitor(caminho, banco=None, extensao=None):
+    """
+    Leitor do arquivo: o do banco do nome do arquivo, se registrado e com a
+    extensão aceita; senão, o primeiro que reconhece o conteúdo. None se
+    nenhum leitor reconhece o arquivo.
+    """
+    leitor = LEITORES_EXTRATO.get(banco)
+    if leitor is not None and extensao in leitor.extensoes:
+        return leitor
+    try:
+        with open(caminho, 'rb') as f:
+            inicio = f.read(BYTES_RECONHECIMENTO)
+    except OSError:
+        return None
+    return next((leitor for leitor in LEITORES_EXTRATO.values() if leitor.reconhecer(inicio)), None)
+
+COLUNAS_AGREGADO_CONTABIL = ['Domicílio bancário', 'Saldo_Corrente_Contabil', 'Saldo_Aplicado_Contabil']
+_AGREGACAO_EXTRATO = {
+    'Saldo_Corrente_Extrato': 'sum',
+    'Saldo_Aplicado_Extrato': 'sum',
+    'Agencia_Extrato': 'first', # 'first' pega o primeiro valor encontrado (ignora Nulos)
+    'Conta_Extrato': 'first'
+}
+COLUNAS_RESULTADO = pd.MultiIndex.from_tuples([
+    ('Conta Movimento', 'Saldo Contábil'), ('Conta Movimento', 'Saldo Extrato'), ('Conta Movimento', 'Diferença'),
+    ('Aplicação Financeira', 'Saldo Contábil'), ('Aplicação Financeira', 'Saldo Extrato'), ('Aplicação Financeira', 'Diferença')
+], names=['Grupo', 'Item'])
+
+def agregar_contabil(df_contabil):
+    """Saldos do relatório contábil processado, indexados pela chave int32 ordenada."""
+    return df_contabil.set_index('Chave Primaria')[COLUNAS_AGREGADO_CONTABIL].sort_index()
+
+def agregar_extrato(df_extrato):
+    """Saldos por chave de um ou mais extratos (linhas sem chave ficam de fora)."""
+    df_extrato_validos = df_extrato[df_extrato['Chave Primaria'] != CHAVE_AUSENTE]
+    return df_extrato_validos.groupby('Chave Primaria', sort=True).agg(_AGREGACAO_EXTRATO)
+
+def _combinar_agregados_extrato(agregados):
+    """Junta os agregados de cada banco como se os extratos tivessem sido agregados juntos."""
+    agregados = [agregado for agregado in agregados if not agregado.empty]
+    if len(agregados) == 1:
+        return agregados[0]
+    if not agregados:
+        return pd.DataFrame(columns=list(_AGREGACAO_EXTRATO)).rename_axis('Chave Primaria')
+    return pd.concat(agregados).groupby(level=0, sort=True).agg(_AGREGACAO_EXTRATO)
+
+# Situação de cada chave nas linhas da conciliação
+SITUACAO_CONCILIADA = 'conciliada'
+SITUACAO_SOMENTE_CONTABIL = 'somente_contabil'
+SITUACAO_SOMENTE_EXTRATO = 'somente_extrato'
+
+_COLUNAS_SALDOS = ['Saldo_Corrente_Contabil', 'Saldo_Corrente_Extrato', 'Saldo_Aplicado_Contabil', 'Saldo_Aplicado_Extrato']
+_COLUNAS_LINHAS = [
+    'Conta Bancária', 'Saldo_Corrente_Contabil', 'Saldo_Corrente_Extrato', 'Diferenca_Movimento',
+    'Saldo_Aplicado_Contabil', 'Saldo_Aplicado_Extrato', 'Diferenca_Aplicacao', 'Situacao',
+]
+
+def _linhas_conciliacao(agregado_contabil, agregado_extrato):
+    """
+    Linhas da conciliação em centavos, indexadas pela chave: descrição da
+    conta ('Conta Bancária'), saldos dos dois lados, diferenças e a situação
+    da chave. O join é completo: uma chave presente só num dos lados entra com
+    saldo zero do outro e situação SITUACAO_SOMENTE_CONTABIL/_EXTRATO.
+    """
+    # Ambos os lados indexados pela chave int32 já ordenada: o join é feito
+    # por intercalação (merge-join) sobre inteiros, sem hashing de strings.
+    df_final = agregado_contabil.join(agregado_extrato, how='outer')
+    if df_final.empty:
+        return pd.DataFrame(columns=_COLUNAS_LINHAS, index=df_final.index)
+    no_contabil = df_final.index.isin(agregado_contabil.index)
+    no_extrato = df_final.index.isin(agregado_extrato.index)
+    df_final['Situacao'] = np.select(
+        [no_contabil & no_extrato, no_contabil], [SITUACAO_CONCILIADA, SITUACAO_SOMENTE_CONTABIL], SITUACAO_SOMENTE_EXTRATO)
+    df_final[_COLUNAS_SALDOS] = df_final[_COLUNAS_SALDOS].fillna(0).astype('int64')
+    # Conta só no extrato: descrita pela identificação do próprio extrato
+    df_final['Domicílio bancário'] = df_final['Domicílio bancário'].fillna(df_final['Conta_Extrato'])
+    df_final = df_final.reset_index()
+
+    # Descrição da conta, por colunas: com agência no extrato (CEF), 'agência -
+    # conta', com a conta tirada do domicílio contábil ('104-4064-0005752252942
+    # - CAIXA') ou, se o formato for inesperado, a chave; nos outros bancos, o
+    # próprio domicílio contábil.
+    com_agencia = df_final['Agencia_Extrato'].notna().to_numpy()
+    domicilio = df_final['Domicílio bancário']
+    descricao = domicilio.astype('string')
+    if com_agencia.any():
+        # extract devolve sempre texto (NA sem a 3ª parte, ex: domicílio tirado do extrato '4064/006/00000054-9')
+        conta_parte = domicilio[com_agencia].astype('string').str.extract(r'^[^-]*-[^-]*-([^-]*)', expand=False).str.strip()
+        conta_parte = conta_parte.fillna(formatar_chave(df_final.loc[com_agencia, 'Chave Primaria']).set_axis(conta_parte.index))
+        descricao[com_agencia] = df_final.loc[com_agencia, 'Agencia_Extrato'].astype('string') + ' - ' + conta_parte
+    df_final['Conta Bancária'] = descricao.astype(domicilio.dtype)
+
+    # Diferenças calculadas em centavos (aritmética inteira, sem ruído de float)
+    df_final['Diferenca_Movimento'] = df_final['Saldo_Corrente_Contabil'] - df_final['Saldo_Corrente_Extrato']
+    df_final['Diferenca_Aplicacao'] = df_final['Saldo_Aplicado_Contabil'] - df_final['Saldo_Aplicado_Extrato']
+    return df_final.set_index('Chave Primaria')[_COLUNAS_LINHAS]
+
+def _formatar_resultado(linhas, contagens, incluir_orfas=False):
+    """
+    Resultado final: indexado pela conta bancária, em reais, com colunas
+    agrupadas. Só as contas conciliadas, a menos que incluir_orfas=True; as
+    linhas sem correspondência incluídas são contadas por lado em
+    attrs['contas_orfas'] ({'contabil': n, 'extrato': n}).
+    """
+    if not incluir_orfas:
+        linhas = linhas[linhas['Situacao'] == SITUACAO_CONCILIADA]
+    contas_orfas = {'contabil': int((linhas['Situacao'] == SITUACAO_SOMENTE_CONTABIL).sum()),
+                    'extrato': int((linhas['Situacao'] == SITUACAO_SOMENTE_EXTRATO).sum())}
+    if linhas.empty:
+        vazio = pd.DataFrame()
+        vazio.attrs['contagens'] = contagens
+        vazio.attrs['contas_orfas'] = contas_orfas
+        return vazio
+    df_final = linhas.drop(columns='Situacao').set_index('Conta Bancária')
+    # Converte de centavos para reais apenas na saída (relatórios e tela)
+    df_final = df_final.astype('int64') / 100
+    df_final.columns = COLUNAS_RESULTADO
+    df_final.attrs['contagens'] = contagens
+    df_final.attrs['contas_orfas'] = contas_orfas
+    return df_final
+
+def _contagens_conciliacao(contas_contabil, contas_extrato, linhas_extrato_sem_chave, linhas):
+    contas_conciliadas = int((linhas['Situacao'] == SITUACAO_CONCILIADA).sum())
+    return {
+        'contas_contabil': contas_contabil,
+        'contas_extrato': contas_extrato,
+        'linhas_extrato_sem_chave': linhas_extrato_sem_chave,
+        'contabil_sem_correspondencia': contas_contabil - contas_conciliadas,
+        'extrato_sem_correspondencia': contas_extrato - contas_conciliadas,
+    }
+
+def realizar_conciliacao(df_contabil, df_extrato_unificado, incluir_orfas=False):
+    """
+    Realiza a conciliação final, usando a informação de agência do extrato
+    da Caixa para construir a descrição correta da conta.
+    Quantas contas de cada lado ficaram sem correspondência no join fica em
+    resultado.attrs['contagens']; com incluir_orfas=True (join completo) elas
+    também entram no resultado, com saldo zero do lado em que faltam.
+    """
+    agregado_contabil = agregar_contabil(df_contabil)
+    agregado_extrato = agregar_extrato(df_extrato_unificado)
+    linhas = _linhas_conciliacao(agregado_contabil, agregado_extrato)
+    contagens = _contagens_conciliacao(
+        len(agregado_contabil), len(agregado_extrato),
+        int((df_extrato_unificado['Chave Primaria'] == CHAVE_AUSENTE).sum()), linhas)
+    return _formatar_resultado(linhas, contagens, incluir_orfas)
+
+
+class ConciliacaoIncremental:
+    """
+    Conciliação que guarda, entre uma execução e outra, os agregados por chave
+    de cada fonte (relatório contábil e cada extrato) e as linhas do resultado.
+
+    Em atualizar(), fontes com a mesma assinatura (hash do conteúdo) não são
+    reagregadas; das que mudaram, só as chaves cujos agregados mudaram são
+    conciliadas de novo e substituídas no resultado. O resultado é o mesmo de
+    realizar_conciliacao sobre as mesmas entradas. As linhas guardadas vêm do
+    join completo, então o resultado com ou sem as contas sem correspondência
+    sai das mesmas linhas (ver resultado()).
+    """
+
+    def __init__(self):
+        self.fontes = {}  # nome -> (assinatura, agregado, linhas sem chave)
+        self.linhas = None
+        self.contagens = None
+        # Contas ('Conta Bancária') cujas linhas mudaram na última atualização;
+        # None quando não havia execução anterior
+        self.contas_alteradas = None
+
+    def _atualizar_fonte(self, nome, assinatura, agregar, df):
+        """Reagrega a fonte se a assinatura mudou e retorna as chaves com agregado diferente."""
+        anterior = self.fontes.get(nome)
+        if anterior is not None and assinatura is not None and anterior[0] == assinatura:
+            return None
+        agregado = agregar(df)
+        sem_chave = int((df['Chave Primaria'] == CHAVE_AUSENTE).sum()) if nome != 'contabil' else 0
+        self.fontes[nome] = (assinatura, agregado, sem_chave)
+        if anterior is None:
+            return agregado.index
+        return _chaves_diferentes(anterior[1], agregado)
+
+    def atualizar(self, df_contabil, extratos, assinaturas=None, incluir_orfas=False):
+        """
+        df_contabil: saída de processar_relatorio_contabil; extratos: {banco: df};
+        assinaturas: {fonte: assinatura} para 'contabil' e cada banco (fonte sem
+        assinatura é sempre reagregada).
+        Retorna o resultado no mesmo formato de realizar_conciliacao.
+        """
+        assinaturas = assinaturas or {}
+        alteradas = [self._atualizar_fonte('contabil', assinaturas.get('contabil'), agregar_contabil, df_contabil)]
+        for banco, df in extratos.items():
+            alteradas.append(self._atualizar_fonte(banco, assinaturas.get(banco), agregar_extrato, df))
+        for nome in [nome for nome in self.fontes if nome != 'contabil' and nome not in extratos]:
+            # Extrato que deixou de existir: todas as suas chaves mudaram
+            alteradas.append(self.fontes.pop(nome)[1].index)
+
+        agregado_contabil = self.fontes['contabil'][1]
+        agregados_extrato = [agregado for nome, (_, agregado, _) in self.fontes.items() if nome != 'contabil']
+        chaves = [indice for indice in alteradas if indice is not None]
+
+        if self.linhas is None:
+            self.linhas = _linhas_conciliacao(agregado_contabil, _combinar_agregados_extrato(agregados_extrato))
+        elif chaves:
+            chaves = chaves[0].append(chaves[1:]).unique()
+            self._substituir_linhas(chaves, agregado_contabil, agregados_extrato)
+        else:
+            self.contas_alteradas = pd.Index([], name='Conta Bancária')
+
+        indice_extrato = agregados_extrato[0].index.append([a.index for a in agregados_extrato[1:]]).unique() if agregados_extrato else []
+        linhas_sem_chave = sum(sem_chave for nome, (_, _, sem_chave) in self.fontes.items() if nome != 'contabil')
+        self.contagens = _contagens_conciliacao(len(agregado_contabil), len(indice_extrato), linhas_sem_chave, self.linhas)
+        return self.resultado(incluir_orfas)
+
+    def resultado(self, incluir_orfas=False):
+        """Resultado da última atualização, com ou sem as contas sem correspondência."""
+        return _formatar_resultado(self.linhas, self.contagens, incluir_orfas)
+
+    def agregados(self):
+        """(agregado do relatório contábil, agregado combinado dos extratos) da última atualização."""
+        agregados_extrato = [agregado for nome, (_, agregado, _) in self.fontes.items() if nome != 'contabil']
+        return self.fontes['contabil'][1], _combinar_agregados_extrato(agregados_extrato)
+
+    def bancos_por_chave(self):
+        """
+        Banco do extrato de cada linha do resultado ('bb', 'cef'; 'bb+cef' se a
+        chave aparece em mais de um extrato), indexado pela chave.
+        """
+        bancos = [pd.Series(nome, index=agregado.index) for nome, (_, agregado, _) in sorted(self.fontes.items()) if nome != 'contabil']
+        if not bancos or self.linhas is None:
+            return pd.Series(dtype='object')
+        bancos = pd.concat(bancos)
+        repetidas = bancos.index.duplicated(keep=False)
+        if repetidas.any():
+            bancos = pd.concat([bancos[~repetidas], bancos[repetidas].groupby(level=0).agg('+'.join)])
+        return bancos.reindex(self.linhas.index)
+
+    def _substituir_linhas(self, chaves, agregado_contabil, agregados_extrato):
+        contabil = agregado_contabil[agregado_contabil.index.isin(chaves)]
+        extrato = _combinar_agregados_extrato([agregado[agregado.index.isin(chaves)] for agregado in agregados_extrato])
+        novas = _linhas_conciliacao(contabil, extrato)
+
+        anteriores = self.linhas[self.linhas.index.isin(chaves)]
+        mantidas = self.linhas[~self.linhas.index.isin(chaves)]
+        self.linhas = pd.concat([mantidas, novas]).sort_index() if not novas.empty else mantidas
+        # Só contam como alteradas as linhas novas ou com algum valor diferente
+        alteradas = _chaves_diferentes(anteriores, novas).intersection(novas.index)
+        self.contas_alteradas = pd.Index(novas.loc[alteradas, 'Conta Bancária'], name='Conta Bancária')
+
+
+def _chaves_diferentes(anterior, novo):
+    """Chaves presentes em só um dos agregados ou com algum valor diferente entre eles."""
+    indice = anterior.index.union(novo.index)
+    a = anterior.reindex(indice)
+    b = novo.reindex(indice)
+    iguais = ((a == b) | (a.isna() & b.isna())).all(axis=1)
+    return indice[~iguais.to_numpy()]
+
+
+def _extratos_pasta(pasta):
+    """{mes_ano: {banco: [caminhos em ordem de nome]}} dos arquivos de extrato reconhecidos na pasta."""
+    por_mes = {}
+    try:
+        nomes = sorted(os.listdir(pasta))
+    except FileNotFoundError:
+        return por_mes
+    for nome_arquivo in nomes:
+        encontrado = PADRAO_ARQUIVO_EXTRATO.match(nome_arquivo)
+        if encontrado is None:
+            continue
+        caminho = os.path.join(pasta, nome_arquivo)
+        leitor = identificar_leitor(caminho, encontrado['banco'], encontrado['extensao'])
+        if leitor is None:
+            continue
+        mes_ano = f"{encontrado['mes']}_{encontrado['ano']}"
+        por_mes.setdefault(mes_ano, {}).setdefault(leitor.banco, []).append(caminho)
+    return por_mes
+
+
+def caminhos_extratos_mes(mes_ano, pasta=PASTA_EXTRATOS):
+    """Arquivos de extrato de um mês por banco (ex: mes_ano='julho_2025' -> {'bb': [caminho], ...})."""
+    return _extratos_pasta(pasta).get(mes_ano, {})
+
+
+def chave_ordenacao_mes(mes_ano):
+    """Ordena 'julho_2025' cronologicamente: (2025, 7)."""
+    mes, ano = mes_ano.rsplit('_', 1)
+    numero_mes = {nome: numero for numero, nome in MESES.items()}.get(mes, 0)
+    return (int(ano), numero_mes)
+
+
+def descobrir_extratos(pasta=PASTA_EXTRATOS):
+    """
+    Varre a pasta de extratos e agrupa os arquivos por mês e banco.
+    Retorna {'julho_2025': {'bb': [caminhos], 'cef': [caminhos]}, ...} em ordem cronológica.
+    """
+    por_mes = _extratos_pasta(pasta)
+    return {mes_ano: por_mes[mes_ano] for mes_ano in sorted(por_mes, key=chave_ordenacao_mes)}
+
+
+# Arquivos de extrato lidos ao mesmo tempo por carregar_extratos
+THREADS_LEITURA_EXTRATOS = 4
+
+def _ler_arquivo_extrato(leitor, caminho):
+    """Lê um arquivo com o leitor; retorna (extrato ou None, avisos como (nível, texto), registro da leitura)."""
+    registro = {'etapa': f'extrato_{leitor.banco}', 'status': 'ok', 'arquivo': os.path.basename(caminho)}
+    inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+    df, avisos = None, []
+    try:
+        df = leitor.ler(caminho)
+        registro['linhas_saida'] = len(df)
+        registro.update(df.attrs.get('contagens', {}))
+        if leitor.verificar is not None:
+            avisos.extend(('warning', f"Aviso: {aviso}") for aviso in leitor.verificar(df))
+    except FileNotFoundError:
+        avisos.append(('warning', f"Aviso: Extrato {leitor.descricao_arquivos()} não encontrado: {caminho}"))
+    except ErroArquivoExtrato as e:
+        registro.update(status='erro', erro=f"{type(e).__name__}: {e}")
+        avisos.append(('error', f"{e} ({os.path.basename(caminho)})"))
+    registro['segundos'] = round(time.perf_counter() - inicio, 4)
+    registro['cpu_segundos'] = round(time.thread_time() - inicio_cpu, 4)
+    return df, avisos, registro
+
+
+def carregar_extratos(caminhos, registrar_leitura=None, threads=THREADS_LEITURA_EXTRATOS):
+    """
+    Lê os extratos em {banco: [caminhos]} (ver caminhos_extratos_mes): todos os
+    arquivos ao mesmo tempo num pool de threads, concatenando os de cada banco
+    uma vez só. registrar_leitura(registro), se informada, recebe o registro de
+    cada arquivo lido (etapa, tempo, contagens), na ordem dos arquivos.
+    Retorna (extratos por banco, avisos por banco como (nível, texto));
+    arquivos inexistentes ou inválidos viram avisos e bancos sem linhas ficam
+    de fora dos extratos.
+    """
+    tarefas = [(banco, LEITORES_EXTRATO[banco], caminho) for banco, lista in caminhos.items() for caminho in lista]
+    if not tarefas:
+        return {}, {}
+    with ThreadPoolExecutor(max_workers=min(threads, len(tarefas)), thread_name_prefix='extratos') as pool:
+        lidos = list(pool.map(lambda tarefa: _ler_arquivo_extrato(*tarefa[1:]), tarefas))
+
+    partes, avisos = {}, {banco: [] for banco in caminhos}
+    for (banco, _, _), (df, avisos_arquivo, registro) in zip(tarefas, lidos):
+        avisos[banco].extend(avisos_arquivo)
+        if registrar_leitura is not None:
+            registrar_leitura(registro)
+        if df is not None and not df.empty:
+            partes.setdefault(banco, []).append(df)
+    extratos = {}
+    for banco, dfs in partes.items():
+        if len(dfs) == 1:
+            extratos[banco] = dfs[0]
+            continue
+        extrato = pd.concat(dfs, ignore_index=True)
+        # Atributos de um arquivo só (ex: totais da CEF) não valem para o conjunto
+        extrato.attrs.clear()
+        extrato.attrs['contagens'] = {chave: sum(df.attrs['contagens'][chave] for df in dfs) for chave in dfs[0].attrs['contagens']}
+        # Colisões entre todos os arquivos do banco, pela mesma coluna de conta de cada arquivo
+        contas = pd.concat([df[df.attrs.get('coluna_conta', 'Conta_Extrato')] for df in dfs], ignore_index=True)
+        extrato.attrs['colisoes_chave'] = colisoes_chave(extrato['Chave Primaria'], contas)
+        extrato.attrs['colunas_centavos'] = list(dict.fromkeys(col for df in dfs for col in df.attrs.get('colunas_centavos', [])))
+        extratos[banco] = extrato
+    return extratos, avisos
@@ -0,0 +1,151 @@
+"""
+Conciliação em lote, sem interface web.
+
+Encontra todos os meses com extratos na pasta de extratos, concilia cada mês
+em paralelo (um processo por mês) e grava os relatórios em CSV/XLSX/PDF.
+
+Exemplo:
+    python conciliar_lote.py --contabil "relatorios_contabeis/contabil_{mes_ano}.csv" --saida saidas
+"""
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from cache_fontes import limpar_cache
+from conciliacao import (
+    CAMINHO_DEPARA, PASTA_EXTRATOS, ConciliacaoIncremental, carregar_depara, carregar_extratos, compilar_depara,
+    descobrir_extratos, processar_relatorio_contabil,
+)
+from historico import CAMINHO_HISTORICO, registrar_conciliacao
+from relatorios import GERADORES
+
+
+def conciliar_mes(mes_ano, caminho_contabil, caminhos_extratos, mapa_depara, pasta_saida, formatos, opcoes_pdf=None,
+                  caminho_historico=None, incluir_orfas=False):
+    """
+    Concilia um mês e grava os relatórios em pasta_saida/mes_ano/.
+    opcoes_pdf são repassadas a create_pdf (somente_divergentes, resumo).
+    Com caminho_historico, o resultado também substitui o do mês no histórico;
+    com incluir_orfas, os relatórios incluem as contas sem correspondência.
+    Retorna (mes_ano, mensagens, concluido) para o resumo da execução;
+    concluido é False se o mês não pôde ser conciliado (sem extratos válidos).
+    """
+    mensagens = []
+    extratos, avisos = carregar_extratos(caminhos_extratos)
+    mensagens.extend(texto for avisos_banco in avisos.values() for _, texto in avisos_banco)
+    if not extratos:
+        mensagens.append("Nenhum arquivo de extrato válido encontrado.")
+        return mes_ano, mensagens, False
+
+    _, df_contabil_processado = processar_relatorio_contabil(caminho_contabil, mapa_depara)
+    # Mesmo resultado de realizar_conciliacao, mas guarda as linhas em centavos
+    # e o banco de cada chave, que vão para o histórico
+    conciliacao = ConciliacaoIncremental()
+    resultado = conciliacao.atualizar(df_contabil_processado, extratos, incluir_orfas=incluir_orfas)
+    if caminho_historico is not None:
+        registrar_conciliacao(mes_ano, conciliacao.linhas, conciliacao.bancos_por_chave(), caminho_historico)
+    if resultado.empty:
+        mensagens.append("Nenhuma conta correspondente entre o relatório contábil e os extratos.")
+        return mes_ano, mensagens, True
+
+    pasta_mes = os.path.join(pasta_saida, mes_ano)
+    os.makedirs(pasta_mes, exist_ok=True)
+    for formato in formatos:
+        caminho_saida = os.path.join(pasta_mes, f"relatorio_consolidado.{formato}")
+        with open(caminho_saida, 'wb') as f:
+            opcoes = (opcoes_pdf or {}) if formato == 'pdf' else {}
+            f.write(GERADORES[formato](resultado, **opcoes))
+
+    divergentes = int(((resultado[('Conta Movimento', 'Diferença')] != 0) | (resultado[('Aplicação Financeira', 'Diferença')] != 0)).sum())
+    contagens = resultado.attrs['contagens']
+    mensagens.append(f"{len(resultado)} contas no relatório, {divergentes} com divergência "
+                     f"({contagens['contabil_sem_correspondencia']} só no contábil, {contagens['extrato_sem_correspondencia']} só nos extratos). "
+                     f"Relatórios em {pasta_mes}")
+    return mes_ano, mensagens, True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Conciliação bancária em lote para todos os meses com extratos.")
+    parser.add_argument('--contabil', required=True,
+                        help="Caminho do relatório contábil de cada mês, com o marcador {mes_ano} (ex: contabil_{mes_ano}.csv).")
+    parser.add_argument('--extratos', default=PASTA_EXTRATOS, help="Pasta com os extratos (padrão: %(default)s).")
+    parser.add_argument('--depara', default=CAMINHO_DEPARA, help="Arquivo DE-PARA (padrão: %(default)s).")
+    parser.add_argument('--saida', default='saidas', help="Pasta de saída dos relatórios (padrão: %(default)s).")
+    parser.add_argument('--meses', nargs='*', help="Processa apenas estes meses (ex: julho_2025 agosto_2025).")
+    parser.add_argument('--historico', default=CAMINHO_HISTORICO, help="Banco SQLite do histórico de conciliações (padrão: %(default)s).")
+    parser.add_argument('--sem-historico', action='store_true', help="Não grava os resultados no histórico.")
+    parser.add_argument('--incluir-orfas', action='store_true',
+                        help="Inclui nos relatórios as contas sem correspondência (join completo), com saldo zero do lado em que faltam.")
+    parser.add_argument('--formatos', default='csv,xlsx,pdf', help="Formatos de saída separados por vírgula (padrão: %(default)s).")
+    parser.add_argument('--processos', type=int, default=None, help="Número máximo de processos em paralelo.")
+    parser.add_argument('--pdf-somente-divergentes', action='store_true', help="O PDF lista apenas as contas com divergência.")
+    parser.add_argument('--pdf-resumo', action='store_true', help="Inclui uma página de resumo no início do PDF.")
+    parser.add_argument('--limpar-cache', action='store_true', help="Invalida o cache de arquivos já processados antes de começar.")
+    args = parser.parse_args(argv)
+
+    if args.limpar_cache:
+        print(f"Cache invalidado: {limpar_cache()} entrada(s) removida(s).")
+
+    formatos = [f.strip() for f in args.formatos.split(',') if f.strip()]
+    invalidos = [f for f in formatos if f not in GERADORES]
+    if invalidos:
+        parser.error(f"Formato(s) inválido(s): {', '.join(invalidos)}")
+
+    extratos_por_mes = descobrir_extratos(args.extratos)
+    if args.meses:
+        extratos_por_mes = {m: c for m, c in extratos_por_mes.items() if m in args.meses}
+    if not extratos_por_mes:
+        print("Nenhum extrato encontrado para conciliar.", file=sys.stderr)
+        return 1
+
+    try:
+        df_depara = carregar_depara(args.depara)
+    except FileNotFoundError:
+        print(f"Aviso: Arquivo DE-PARA '{args.depara}' não encontrado. A tradução de contas não será aplicada.", file=sys.stderr)
+        df_depara = pd.DataFrame()
+    # Compilado uma vez e enviado pronto para todos os processos
+    mapa_depara = compilar_depara(df_depara)
+    for aviso in mapa_depara.avisos():
+        print(f"Aviso: {aviso}", file=sys.stderr)
+
+    opcoes_pdf = {'somente_divergentes': args.pdf_somente_divergentes, 'resumo': args.pdf_resumo}
+    # Meses sem relatório contábil (pulados) e meses que não foram conciliados
+    pulados, falhas = [], []
+    with ProcessPoolExecutor(max_workers=args.processos) as executor:
+        futuros = {}
+        for mes_ano, caminhos in extratos_por_mes.items():
+            caminho_contabil = args.contabil.format(mes_ano=mes_ano)
+            if not os.path.exists(caminho_contabil):
+                print(f"[{mes_ano}] Relatório contábil não encontrado: {caminho_contabil}", file=sys.stderr)
+                pulados.append(mes_ano)
+                continue
+            futuro = executor.submit(conciliar_mes, mes_ano, caminho_contabil, caminhos, mapa_depara, args.saida, formatos, opcoes_pdf,
+                                     None if args.sem_historico else args.historico, args.incluir_orfas)
+            futuros[futuro] = mes_ano
+
+        for futuro in as_completed(futuros):
+            mes_ano = futuros[futuro]
+            try:
+                _, mensagens, concluido = futuro.result()
+            except Exception as e:
+                falhas.append(mes_ano)
+                print(f"[{mes_ano}] Erro durante o processamento: {e}", file=sys.stderr)
+                continue
+            for mensagem in mensagens:
+                print(f"[{mes_ano}] {mensagem}", file=sys.stdout if concluido else sys.stderr)
+            if not concluido:
+                falhas.append(mes_ano)
+
+    if pulados or falhas:
+        print(f"{len(extratos_por_mes) - len(pulados) - len(falhas)} de {len(extratos_por_mes)} mês(es) conciliados. "
+              f"Pulados (sem relatório contábil): {', '.join(pulados) or 'nenhum'}. "
+              f"Com falha: {', '.join(sorted(falhas)) or 'nenhum'}.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,171 @@
+"""
+Contas sem correspondência (órfãs) e sugestões de correspondência entre elas.
+
+Uma conta órfã está só no relatório contábil ou só num extrato: a chave de
+7 dígitos dos dois lados não bateu (dígito trocado, dígito verificador a mais
+ou a menos, conta digitada com outra agência, DE-PARA desatualizado). As
+sugestões nunca comparam todas as órfãs de um lado com todas do outro: cada
+critério é uma junção (hash join) por uma coluna derivada, como numa busca em
+árvore de prefixos/sufixos:
+
+    sufixo          mesmos últimos 6 dígitos da conta (sem o dígito verificador)
+    prefixo         mesmos primeiros 6 dígitos significativos da conta
+    valor           mesmo saldo total, diferente de zero
+    agencia_valor   mesma agência e saldo total a até R$ 1,00 (faixas de valor vizinhas)
+
+Valores derivados muito comuns (ex: dezenas de contas com o mesmo saldo) são
+ignorados no critério, para que a junção não cresça de forma quadrática.
+"""
+import pandas as pd
+
+from conciliacao import (
+    SITUACAO_SOMENTE_CONTABIL, SITUACAO_SOMENTE_EXTRATO, formatar_chave,
+)
+
+LADO_CONTABIL = 'Contábil'
+LADO_EXTRATO = 'Extrato'
+
+# Peso de cada critério na pontuação de uma sugestão
+PESOS_CRITERIOS = {'sufixo': 3, 'prefixo': 3, 'valor': 2, 'agencia_valor': 2}
+DIGITOS_SUFIXO_PREFIXO = 6
+FAIXA_VALOR_CENTAVOS = 100
+# Valores derivados com mais entradas que isto num dos lados não geram candidatas
+LIMITE_POR_VALOR = 20
+
+COLUNAS_ORFAS = ['Lado', 'Banco', 'Chave', 'Conta Bancária', 'Conta', 'Saldo Corrente', 'Saldo Aplicado']
+
+
+def contas_sem_correspondencia(linhas, agregado_contabil, agregado_extrato, bancos):
+    """
+    Contas presentes só num dos lados, a partir das linhas do join completo
+    (ConciliacaoIncremental.linhas). 'Conta' é a identificação original (o
+    domicílio bancário do relatório contábil ou a agência/conta do extrato);
+    saldos em reais.
+    """
+    somente_contabil = linhas[linhas['Situacao'] == SITUACAO_SOMENTE_CONTABIL]
+    somente_extrato = linhas[linhas['Situacao'] == SITUACAO_SOMENTE_EXTRATO]
+    partes = [
+        pd.DataFrame({
+            'Lado': LADO_CONTABIL, 'Banco': '',
+            'Conta': agregado_contabil['Domicílio bancário'].reindex(somente_contabil.index),
+            'Saldo Corrente': somente_contabil['Saldo_Corrente_Contabil'],
+            'Saldo Aplicado': somente_contabil['Saldo_Aplicado_Contabil'],
+        }, index=somente_contabil.index),
+        pd.DataFrame({
+            'Lado': LADO_EXTRATO, 'Banco': bancos.reindex(somente_extrato.index),
+            'Conta': agregado_extrato['Conta_Extrato'].reindex(somente_extrato.index),
+            'Saldo Corrente': somente_extrato['Saldo_Corrente_Extrato'],
+            'Saldo Aplicado': somente_extrato['Saldo_Aplicado_Extrato'],
+        }, index=somente_extrato.index),
+    ]
+    orfas = pd.concat(partes)
+    orfas['Conta Bancária'] = linhas['Conta Bancária'].reindex(orfas.index)
+    orfas['Chave'] = formatar_chave(orfas.index.to_numpy()).to_numpy()
+    orfas[['Saldo Corrente', 'Saldo Aplicado']] = orfas[['Saldo Corrente', 'Saldo Aplicado']].astype('int64') / 100
+    return orfas.reset_index(drop=True)[COLUNAS_ORFAS]
+
+
+def _caracteristicas(orfas, lado):
+    """Colunas derivadas usadas nas junções, uma linha por órfã do lado."""
+    df = orfas[orfas['Lado'] == lado]
+    conta = df['Conta'].astype('string')
+    if lado == LADO_CONTABIL:
+        # '104-4064-0005752252942 - CAIXA': agência na 2ª parte, conta na 3ª
+        partes = conta.str.extract(r'^[^-]*-(?P<agencia>[^-]*)-(?P<conta>[^-]*)')
+        numero = partes['conta'].fillna(conta)
+    else:
+        # '4064/006/00000054-9' (CEF) ou '2234-9/295004-9' (BB): agência antes da 1ª '/', conta após a última
+        partes = conta.str.extract(r'^(?P<agencia>[^/]*)/(?:.*/)?(?P<conta>[^/]*)$')
+        numero = partes['conta'].fillna(conta)
+    digitos = numero.str.replace(r'\D', '', regex=True).str.lstrip('0')
+    # O sufixo ignora o dígito verificador ('00000054-9'), que só um dos lados pode trazer
+    digitos_sem_dv = numero.str.replace(r'-\w\s*$', '', regex=True).str.replace(r'\D', '', regex=True).str.lstrip('0')
+    longos = digitos.str.len() >= DIGITOS_SUFIXO_PREFIXO
+    total = ((df['Saldo Corrente'] + df['Saldo Aplicado']) * 100).round().astype('int64')
+    return pd.DataFrame({
+        'orfa': df.index,
+        'sufixo': digitos_sem_dv.str[-DIGITOS_SUFIXO_PREFIXO:].where(digitos_sem_dv.str.len() >= DIGITOS_SUFIXO_PREFIXO),
+        'prefixo': digitos.str[:DIGITOS_SUFIXO_PREFIXO].where(longos),
+        'agencia': partes['agencia'].str.replace(r'\D', '', regex=True).str[:4].replace('', pd.NA),
+        'valor': total.where(total != 0).astype('Int64'),
+        'faixa': total // FAIXA_VALOR_CENTAVOS,
+        'total': total,
+    }, index=df.index)
+
+
+def _sem_valores_comuns(df, colunas):
+    """Descarta as linhas sem valor em 'colunas' ou com um valor repetido mais de LIMITE_POR_VALOR vezes."""
+    df = df.dropna(subset=colunas)
+    contagem = df.groupby(colunas)['orfa'].transform('size')
+    return df[contagem <= LIMITE_POR_VALOR]
+
+
+def _juntar(contabil, extrato, colunas, criterio):
+    """Pares (órfã contábil, órfã do extrato) com os mesmos valores em 'colunas'."""
+    contabil = _sem_valores_comuns(contabil, colunas)[colunas + ['orfa', 'total']]
+    extrato = _sem_valores_comuns(extrato, colunas)[colunas + ['orfa', 'total']]
+    pares = contabil.merge(extrato, on=colunas, suffixes=('_contabil', '_extrato'))
+    pares['criterio'] = criterio
+    return pares[['orfa_contabil', 'orfa_extrato', 'total_contabil', 'total_extrato', 'criterio']]
+
+
+def sugerir_correspondencias(orfas, max_sugestoes=3):
+    """
+    Para cada conta só no relatório contábil, as 'max_sugestoes' contas só nos
+    extratos mais prováveis de serem a mesma conta, com os critérios atendidos
+    e a pontuação (soma de PESOS_CRITERIOS). 'orfas' é a saída de
+    contas_sem_correspondencia.
+    """
+    colunas_saida = ['Conta Contábil', 'Chave Contábil', 'Conta no Extrato', 'Chave no Extrato', 'Banco',
+                     'Critérios', 'Pontuação', 'Saldo Contábil', 'Saldo Extrato']
+    contabil = _caracteristicas(orfas, LADO_CONTABIL)
+    extrato = _caracteristicas(orfas, LADO_EXTRATO)
+    if contabil.empty or extrato.empty:
+        return pd.DataFrame(columns=colunas_saida)
+
+    # Tolerância de valor: o lado contábil entra também nas faixas vizinhas
+    contabil_faixas = pd.concat([contabil.assign(faixa=contabil['faixa'] + deslocamento) for deslocamento in (-1, 0, 1)])
+    por_agencia_valor = _juntar(contabil_faixas, extrato, ['agencia', 'faixa'], 'agencia_valor')
+    por_agencia_valor = por_agencia_valor[
+        (por_agencia_valor['total_contabil'] - por_agencia_valor['total_extrato']).abs() <= FAIXA_VALOR_CENTAVOS]
+    pares = pd.concat([
+        _juntar(contabil, extrato, ['sufixo'], 'sufixo'),
+        _juntar(contabil, extrato, ['prefixo'], 'prefixo'),
+        _juntar(contabil, extrato, ['valor'], 'valor'),
+        por_agencia_valor,
+    ], ignore_index=True)
+    if pares.empty:
+        return pd.DataFrame(columns=colunas_saida)
+
+    pares['pontos'] = pares['criterio'].map(PESOS_CRITERIOS)
+    sugestoes = pares.groupby(['orfa_contabil', 'orfa_extrato'], sort=False).agg(
+        pontos=('pontos', 'sum'), criterios=('criterio', lambda criterios: ', '.join(sorted(set(criterios)))))
+    sugestoes = (sugestoes.reset_index().sort_values(['orfa_contabil', 'pontos'], ascending=[True, False])
+                 .groupby('orfa_contabil').head(max_sugestoes))
+
+    lado_contabil = orfas.loc[sugestoes['orfa_contabil']]
+    lado_extrato = orfas.loc[sugestoes['orfa_extrato']]
+    return pd.DataFrame({
+        'Conta Contábil': lado_contabil['Conta Bancária'].to_numpy(),
+        'Chave Contábil': lado_contabil['Chave'].to_numpy(),
+        'Conta no Extrato': lado_extrato['Conta Bancária'].to_numpy(),
+        'Chave no Extrato': lado_extrato['Chave'].to_numpy(),
+        'Banco': lado_extrato['Banco'].to_numpy(),
+        'Critérios': sugestoes['criterios'].to_numpy(),
+        'Pontuação': sugestoes['pontos'].to_numpy(),
+        'Saldo Contábil': (lado_contabil['Saldo Corrente'] + lado_contabil['Saldo Aplicado']).to_numpy(),
+        'Saldo Extrato': (lado_extrato['Saldo Corrente'] + lado_extrato['Saldo Aplicado']).to_numpy(),
+    }).sort_values(['Pontuação', 'Conta Contábil'], ascending=[False, True], ignore_index=True)
+
+
+def relatorio_colisoes(fontes):
+    """
+    Chaves de 7 dígitos compartilhadas por contas diferentes em cada fonte,
+    a partir de df.attrs['colisoes_chave'] ({nome da fonte: df}).
+    """
+    linhas = [
+        {'Fonte': nome, 'Chave': f"{colisao['chave']:07d}", 'Contas': ' | '.join(colisao['contas'])}
+        for nome, df in fontes.items() if df is not None
+        for colisao in df.attrs.get('colisoes_chave', [])
+    ]
+    return pd.DataFrame(linhas, columns=['Fonte', 'Chave', 'Contas'])
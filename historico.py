@@ -0,0 +1,195 @@
+"""
+Histórico das conciliações em SQLite, para consultas entre meses sem
+reprocessar os arquivos.
+
+Cada conciliação concluída (interface, monitor de extratos ou lote) substitui
+as linhas do seu mês na tabela 'conciliacao', uma linha por (mês, banco,
+chave), com os saldos e diferenças em centavos:
+
+    conciliacao(mes, banco, chave, conta_bancaria,
+                saldo_corrente_contabil, saldo_corrente_extrato, diferenca_movimento,
+                saldo_aplicado_contabil, saldo_aplicado_extrato, diferenca_aplicacao,
+                divergente)
+    execucoes(mes, gravado_em, contas, divergentes)
+
+'mes' é ano * 100 + mês (ex: 202507), ordenável. Os índices cobrem as
+consultas usadas: por mês (chave primária), por conta ao longo dos meses
+(chave, mes) e só as linhas divergentes (índice parcial), de onde saem as
+sequências de meses consecutivos com divergência.
+
+Configuração por variável de ambiente:
+    CONCILIACAO_HISTORICO   arquivo do banco (padrão: historico_conciliacao.sqlite3)
+"""
+import contextlib
+import datetime
+import os
+import sqlite3
+
+import pandas as pd
+
+from conciliacao import MESES, SITUACAO_CONCILIADA, chave_ordenacao_mes
+
+CAMINHO_HISTORICO = os.environ.get('CONCILIACAO_HISTORICO', 'historico_conciliacao.sqlite3')
+
+_ESQUEMA = """
+CREATE TABLE IF NOT EXISTS conciliacao (
+    mes INTEGER NOT NULL,
+    banco TEXT NOT NULL,
+    chave INTEGER NOT NULL,
+    conta_bancaria TEXT NOT NULL,
+    saldo_corrente_contabil INTEGER NOT NULL,
+    saldo_corrente_extrato INTEGER NOT NULL,
+    diferenca_movimento INTEGER NOT NULL,
+    saldo_aplicado_contabil INTEGER NOT NULL,
+    saldo_aplicado_extrato INTEGER NOT NULL,
+    diferenca_aplicacao INTEGER NOT NULL,
+    divergente INTEGER NOT NULL,
+    PRIMARY KEY (mes, banco, chave)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_conciliacao_chave_mes ON conciliacao (chave, mes);
+CREATE INDEX IF NOT EXISTS idx_conciliacao_divergentes ON conciliacao (banco, chave, mes) WHERE divergente = 1;
+CREATE TABLE IF NOT EXISTS execucoes (
+    mes INTEGER PRIMARY KEY,
+    gravado_em TEXT NOT NULL,
+    contas INTEGER NOT NULL,
+    divergentes INTEGER NOT NULL
+);
+"""
+
+_COLUNAS_VALORES = [
+    ('Saldo_Corrente_Contabil', 'saldo_corrente_contabil'), ('Saldo_Corrente_Extrato', 'saldo_corrente_extrato'),
+    ('Diferenca_Movimento', 'diferenca_movimento'), ('Saldo_Aplicado_Contabil', 'saldo_aplicado_contabil'),
+    ('Saldo_Aplicado_Extrato', 'saldo_aplicado_extrato'), ('Diferenca_Aplicacao', 'diferenca_aplicacao'),
+]
+
+
+def numero_mes(mes_ano):
+    """'julho_2025' -> 202507."""
+    ano, mes = chave_ordenacao_mes(mes_ano)
+    return ano * 100 + mes
+
+
+def rotulo_mes(numero):
+    """202507 -> 'Julho 2025'."""
+    return f"{MESES[numero % 100].capitalize()} {numero // 100}"
+
+
+def conectar(caminho=CAMINHO_HISTORICO):
+    """
+    Abre o histórico (criando as tabelas se preciso). Em modo WAL, a
+    interface consulta enquanto o monitor ou o lote gravam.
+    """
+    conexao = sqlite3.connect(caminho, timeout=30)
+    conexao.execute('PRAGMA journal_mode=WAL')
+    conexao.executescript(_ESQUEMA)
+    return conexao
+
+
+def registrar_conciliacao(mes_ano, linhas, bancos, caminho=CAMINHO_HISTORICO):
+    """
+    Substitui no histórico as linhas do mês (só as contas conciliadas).
+    linhas: linhas da conciliação em centavos indexadas pela chave (ver
+    ConciliacaoIncremental.linhas); bancos: banco de cada chave (Series).
+    Retorna o número de linhas gravadas.
+    """
+    mes = numero_mes(mes_ano)
+    linhas = linhas[linhas['Situacao'] == SITUACAO_CONCILIADA]
+    valores = [linhas[coluna].astype('int64').tolist() for coluna, _ in _COLUNAS_VALORES]
+    divergente = ((linhas['Diferenca_Movimento'] != 0) | (linhas['Diferenca_Aplicacao'] != 0)).astype('int64')
+    registros = list(zip(
+        [mes] * len(linhas), bancos.reindex(linhas.index).fillna('').astype(str).tolist(),
+        linhas.index.astype('int64').tolist(), linhas['Conta Bancária'].astype(str).tolist(),
+        *valores, divergente.tolist(),
+    ))
+    colunas = ', '.join(['mes', 'banco', 'chave', 'conta_bancaria', *(nome for _, nome in _COLUNAS_VALORES), 'divergente'])
+    with contextlib.closing(conectar(caminho)) as conexao, conexao:
+        conexao.execute('DELETE FROM conciliacao WHERE mes = ?', (mes,))
+        conexao.executemany(f'INSERT INTO conciliacao ({colunas}) VALUES ({", ".join("?" * 11)})', registros)
+        conexao.execute('INSERT OR REPLACE INTO execucoes VALUES (?, ?, ?, ?)',
+                        (mes, datetime.datetime.now().isoformat(timespec='seconds'), len(registros), int(divergente.sum())))
+    return len(registros)
+
+
+def _consultar(sql, parametros=(), caminho=CAMINHO_HISTORICO):
+    if not os.path.exists(caminho):
+        return None
+    with contextlib.closing(conectar(caminho)) as conexao:
+        return pd.read_sql_query(sql, conexao, params=parametros)
+
+
+def meses_registrados(caminho=CAMINHO_HISTORICO):
+    """Uma linha por mês gravado: Mês, Contas, Divergentes e Gravado em, em ordem cronológica."""
+    df = _consultar('SELECT mes, contas, divergentes, gravado_em FROM execucoes ORDER BY mes', caminho=caminho)
+    if df is None:
+        return pd.DataFrame(columns=['Mês', 'Contas', 'Divergentes', 'Gravado em'])
+    df['mes'] = df['mes'].map(rotulo_mes)
+    df.columns = ['Mês', 'Contas', 'Divergentes', 'Gravado em']
+    return df
+
+
+# Sequências de meses consecutivos com divergência por conta ("gaps and
+# islands"): numa sequência sem buracos, o índice do mês menos a posição da
+# linha é constante. Só percorre o índice parcial das linhas divergentes.
+_SQL_SEQUENCIAS_DIVERGENTES = """
+WITH divergentes AS (
+    SELECT banco, chave, mes,
+           (mes / 100) * 12 + mes % 100 - ROW_NUMBER() OVER (PARTITION BY banco, chave ORDER BY mes) AS sequencia
+    FROM conciliacao
+    WHERE divergente = 1
+), sequencias AS (
+    SELECT banco, chave, MIN(mes) AS inicio, MAX(mes) AS fim, COUNT(*) AS meses
+    FROM divergentes
+    GROUP BY banco, chave, sequencia
+    HAVING COUNT(*) >= :minimo
+)
+SELECT c.conta_bancaria, s.banco, s.chave, s.inicio, s.fim, s.meses,
+       c.diferenca_movimento, c.diferenca_aplicacao
+FROM sequencias s
+JOIN conciliacao c ON c.mes = s.fim AND c.banco = s.banco AND c.chave = s.chave
+WHERE :fim IS NULL OR s.fim = :fim
+ORDER BY s.meses DESC, s.fim DESC, s.chave
+"""
+
+
+def contas_divergentes_consecutivas(meses_minimos, em_aberto=True, caminho=CAMINHO_HISTORICO):
+    """
+    Contas com divergência em pelo menos 'meses_minimos' meses seguidos.
+    Com em_aberto=True, só as sequências que chegam ao último mês gravado.
+    Um mês sem conciliação gravada interrompe a sequência. As diferenças
+    (em reais) são as do último mês da sequência.
+    """
+    fim = None
+    if em_aberto:
+        ultimo = _consultar('SELECT MAX(mes) AS mes FROM execucoes', caminho=caminho)
+        fim = None if ultimo is None or ultimo['mes'].isna().all() else int(ultimo['mes'].iloc[0])
+        if fim is None:
+            return None
+    df = _consultar(_SQL_SEQUENCIAS_DIVERGENTES, {'minimo': int(meses_minimos), 'fim': fim}, caminho)
+    if df is None:
+        return None
+    df['inicio'] = df['inicio'].map(rotulo_mes)
+    df['fim'] = df['fim'].map(rotulo_mes)
+    df['chave'] = df['chave'].astype('int64').map('{:07d}'.format)
+    df[['diferenca_movimento', 'diferenca_aplicacao']] = df[['diferenca_movimento', 'diferenca_aplicacao']] / 100
+    df.columns = ['Conta Bancária', 'Banco', 'Chave', 'Desde', 'Até', 'Meses',
+                  'Diferença Movimento', 'Diferença Aplicação']
+    return df
+
+
+def evolucao_conta(chave, caminho=CAMINHO_HISTORICO):
+    """
+    Saldos e diferenças (em reais) de uma chave em cada mês gravado, em ordem
+    cronológica; 'Mês' é o primeiro dia do mês.
+    """
+    colunas = ', '.join(nome for _, nome in _COLUNAS_VALORES)
+    df = _consultar(f'SELECT mes, banco, conta_bancaria, {colunas} FROM conciliacao WHERE chave = ? ORDER BY mes, banco',
+                    (int(chave),), caminho)
+    if df is None:
+        return None
+    valores = [nome for _, nome in _COLUNAS_VALORES]
+    df[valores] = df[valores] / 100
+    # Primeiro dia do mês: ordena e serve de eixo em gráficos
+    df['mes'] = pd.to_datetime({'year': df['mes'] // 100, 'month': df['mes'] % 100, 'day': 1})
+    df.columns = ['Mês', 'Banco', 'Conta Bancária', 'Saldo Contábil (Movimento)', 'Saldo Extrato (Movimento)',
+                  'Diferença Movimento', 'Saldo Contábil (Aplicação)', 'Saldo Extrato (Aplicação)', 'Diferença Aplicação']
+    return df
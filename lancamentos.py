@@ -0,0 +1,368 @@
+"""
+Conferência de lançamentos: casa, linha a linha, os lançamentos contábeis com
+os movimentos dos extratos das contas que a conciliação de saldos apontou
+como divergentes.
+
+Arquivos de entrada (';', latin-1; valores com sinal, no formato brasileiro
+ou internacional; datas dd/mm/aaaa ou aaaa-mm-dd; 'Histórico' é opcional):
+
+    lançamentos contábeis   linha de título, depois 'Domicílio bancário;Data;Valor;Histórico'
+    movimentos bancários    'Conta;Data;Valor;Histórico' (um arquivo por banco)
+
+Os dois lados usam a mesma convenção de sinal (entrada na conta positiva).
+As chaves vêm das mesmas regras da conciliação de saldos (DE-PARA incluído
+no lado contábil) e são calculadas só uma vez por conta distinta do bloco
+lido; linhas de contas que não estão divergentes são descartadas antes de
+converter datas e valores, então arquivos com milhões de linhas são lidos em
+blocos sem ocupar memória com as contas que já batem.
+
+O casamento é feito em passadas, cada uma sobre o que sobrou da anterior:
+
+    exato            hash join em (chave, data, valor em centavos); lançamentos
+                     repetidos casam um a um pela ordem de ocorrência
+    data_deslocada   mesma chave e valor com datas a até 'janela_dias' dias,
+                     por intercalação ordenada pela data (merge_asof), o mais
+                     próximo primeiro
+    desdobramento    um movimento igual à soma de 2 a 'max_partes' lançamentos
+                     do outro lado (ou o contrário), na janela de datas; busca
+                     limitada às MAX_CANDIDATAS linhas mais próximas na data
+"""
+import functools
+import io
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from conciliacao import (
+    SITUACAO_CONCILIADA, MapaDepara, compilar_depara, converter_moeda_centavos, formatar_chave,
+    gerar_chave_contabil, gerar_chave_padronizada,
+)
+
+COLUNAS_LANCAMENTOS_CONTABEIS = ['Domicílio bancário', 'Data', 'Valor', 'Histórico']
+COLUNAS_MOVIMENTOS = ['Conta', 'Data', 'Valor', 'Histórico']
+LINHAS_POR_BLOCO_LANCAMENTOS = 500_000
+
+JANELA_DIAS = 3
+PASSADAS_JANELA = 5
+MAX_PARTES = 4
+MAX_CANDIDATAS = 16
+
+TIPO_EXATO = 'exato'
+TIPO_DATA_DESLOCADA = 'data_deslocada'
+TIPO_DESDOBRAMENTO = 'desdobramento'
+
+
+def chaves_divergentes(linhas):
+    """Chaves conciliadas com alguma diferença, a partir das linhas da conciliação (em centavos)."""
+    divergentes = (linhas['Situacao'] == SITUACAO_CONCILIADA) & (
+        (linhas['Diferenca_Movimento'] != 0) | (linhas['Diferenca_Aplicacao'] != 0))
+    return linhas.index[divergentes.to_numpy()]
+
+
+def _converter_datas(textos):
+    """Datas dd/mm/aaaa (ou ISO) em dias desde 1970 (int32); inválidas viram -1."""
+    datas = pd.to_datetime(textos, format='%d/%m/%Y', errors='coerce')
+    faltantes = datas.isna() & textos.notna()
+    if faltantes.any():
+        datas[faltantes] = pd.to_datetime(textos[faltantes], format='ISO8601', errors='coerce')
+    dias = datas.to_numpy(dtype='datetime64[ns]').astype('datetime64[D]').astype('int64')
+    return np.where(datas.isna().to_numpy(), -1, dias).astype('int32')
+
+
+def ler_lancamentos(arquivo, coluna_conta, gerar_chave, chaves, mapa_depara=None, cabecalho=0,
+                    linhas_por_bloco=LINHAS_POR_BLOCO_LANCAMENTOS):
+    """
+    Lê um arquivo de lançamentos em blocos e devolve só as linhas das 'chaves'
+    informadas: 'chave' (int32), 'data' (dias, int32), 'valor' (centavos,
+    int64), 'historico' e 'linha' (número da linha de dados no arquivo).
+    As contagens (lidas, de outras contas, sem data) ficam em attrs['contagens'].
+    """
+    chaves = np.asarray(chaves, dtype='int32')
+    leitor = pd.read_csv(
+        arquivo, sep=';', encoding='latin-1', header=cabecalho,
+        usecols=lambda coluna: coluna in (coluna_conta, 'Data', 'Valor', 'Histórico'),
+        dtype={coluna_conta: 'category', 'Data': str, 'Valor': str, 'Histórico': str},
+        chunksize=linhas_por_bloco,
+    )
+    linhas_lidas = linhas_sem_data = 0
+    blocos = []
+    with leitor:
+        for df in leitor:
+            linhas_lidas += len(df)
+            # A chave é calculada uma vez por conta distinta do bloco, não por linha
+            contas = df[coluna_conta]
+            chaves_categorias = gerar_chave(contas.cat.categories.to_series()).to_numpy()
+            if mapa_depara is not None and not mapa_depara.vazio:
+                chaves_categorias = mapa_depara.aplicar(chaves_categorias).to_numpy()
+            codigos = contas.cat.codes.to_numpy()
+            chave = np.where(codigos >= 0, chaves_categorias[np.maximum(codigos, 0)], -1).astype('int32')
+            manter = np.isin(chave, chaves)
+            if not manter.any():
+                continue
+            df = df[manter]
+            bloco = pd.DataFrame({
+                'chave': chave[manter],
+                'data': _converter_datas(df['Data']),
+                'valor': converter_moeda_centavos(df['Valor']).to_numpy(),
+                'historico': df['Histórico'].to_numpy() if 'Histórico' in df.columns else '',
+                'linha': df.index.to_numpy() + 1,
+            })
+            linhas_sem_data += int((bloco['data'] == -1).sum())
+            blocos.append(bloco[bloco['data'] != -1])
+
+    colunas = {'chave': 'int32', 'data': 'int32', 'valor': 'int64', 'historico': 'object', 'linha': 'int64'}
+    resultado = pd.concat(blocos, ignore_index=True) if blocos else pd.DataFrame(columns=list(colunas)).astype(colunas)
+    resultado.attrs['contagens'] = {
+        'linhas_lidas': linhas_lidas,
+        'linhas_outras_contas': linhas_lidas - len(resultado) - linhas_sem_data,
+        'linhas_sem_data': linhas_sem_data,
+    }
+    return resultado
+
+
+def ler_lancamentos_contabeis(arquivo, chaves, df_depara=None, linhas_por_bloco=LINHAS_POR_BLOCO_LANCAMENTOS):
+    """
+    Lançamentos contábeis das chaves informadas (cabeçalho na 2ª linha).
+    df_depara pode ser a saída de carregar_depara ou um MapaDepara já compilado.
+    """
+    mapa_depara = None
+    if df_depara is not None:
+        mapa_depara = df_depara if isinstance(df_depara, MapaDepara) else compilar_depara(df_depara)
+    return ler_lancamentos(arquivo, 'Domicílio bancário', gerar_chave_contabil, chaves, mapa_depara,
+                           cabecalho=1, linhas_por_bloco=linhas_por_bloco)
+
+
+def ler_movimentos_bancarios(arquivo, chaves, linhas_por_bloco=LINHAS_POR_BLOCO_LANCAMENTOS):
+    """Movimentos de um extrato detalhado das chaves informadas."""
+    return ler_lancamentos(arquivo, 'Conta', gerar_chave_padronizada, chaves, linhas_por_bloco=linhas_por_bloco)
+
+
+def _pares_exatos(contabil, extrato):
+    """Pares com a mesma chave, data e valor; repetições casam pela ordem de ocorrência."""
+    colunas = ['chave', 'data', 'valor']
+    c = contabil[colunas + ['id']].assign(ocorrencia=contabil.groupby(colunas).cumcount())
+    e = extrato[colunas + ['id']].assign(ocorrencia=extrato.groupby(colunas).cumcount())
+    pares = c.merge(e, on=colunas + ['ocorrencia'], suffixes=('_contabil', '_extrato'))
+    return pares[['id_contabil', 'id_extrato']]
+
+
+def _pares_janela(contabil, extrato, janela_dias):
+    """
+    Pares com a mesma chave e valor e datas a até janela_dias dias. Cada
+    passada casa cada lançamento contábil com o movimento mais próximo na data;
+    quando dois disputam o mesmo movimento, fica o mais próximo e o outro tenta
+    de novo na passada seguinte.
+    """
+    pares = []
+    for _ in range(PASSADAS_JANELA):
+        if contabil.empty or extrato.empty:
+            break
+        c = contabil[['data', 'chave', 'valor', 'id']].sort_values('data')
+        e = extrato[['data', 'chave', 'valor', 'id']].assign(data_extrato=extrato['data']).sort_values('data')
+        casados = pd.merge_asof(c, e, on='data', by=['chave', 'valor'], direction='nearest',
+                                tolerance=janela_dias, suffixes=('_contabil', '_extrato'))
+        casados = casados.dropna(subset=['id_extrato'])
+        if casados.empty:
+            break
+        casados['distancia'] = (casados['data'] - casados['data_extrato']).abs()
+        casados = casados.sort_values(['distancia', 'id_contabil']).drop_duplicates('id_extrato')
+        novos = casados[['id_contabil', 'id_extrato']].astype('int64')
+        pares.append(novos)
+        contabil = contabil[~contabil['id'].isin(novos['id_contabil'])]
+        extrato = extrato[~extrato['id'].isin(novos['id_extrato'])]
+    return pd.concat(pares, ignore_index=True) if pares else pd.DataFrame(columns=['id_contabil', 'id_extrato'], dtype='int64')
+
+
+@functools.lru_cache(maxsize=None)
+def _combinacoes(quantidade, max_partes):
+    """Matrizes de índices das combinações de 2 a max_partes entre 'quantidade' candidatas, da menor para a maior."""
+    return [np.array(list(itertools.combinations(range(quantidade), tamanho)), dtype='int64')
+            for tamanho in range(2, min(max_partes, quantidade) + 1)]
+
+
+def _subconjunto_com_soma(valores, alvo, max_partes):
+    """Índices de 2 a max_partes valores cuja soma é exatamente 'alvo' (menos partes primeiro), ou None."""
+    for combinacoes in _combinacoes(len(valores), max_partes):
+        encontradas = np.flatnonzero(valores[combinacoes].sum(axis=1) == alvo)
+        if len(encontradas):
+            return combinacoes[encontradas[0]]
+    return None
+
+
+def _desdobramentos(alvos, partes, janela_dias, max_partes):
+    """
+    Grupos (id do alvo, [ids das partes]) em que um lançamento de 'alvos' é a
+    soma de lançamentos de 'partes' da mesma chave, com o mesmo sinal e na
+    janela de datas. Os maiores valores são resolvidos primeiro e cada linha
+    entra em um grupo só.
+    """
+    grupos = []
+    if alvos.empty or partes.empty:
+        return grupos
+    # Partes ordenadas pela chave: as candidatas de cada alvo são uma fatia contígua
+    partes = partes.sort_values('chave', kind='stable')
+    chaves = partes['chave'].to_numpy()
+    datas = partes['data'].to_numpy()
+    valores = partes['valor'].to_numpy()
+    ids = partes['id'].to_numpy()
+    livres = np.ones(len(partes), dtype=bool)
+    alvos = alvos.iloc[np.argsort(-np.abs(alvos['valor'].to_numpy()), kind='stable')]
+    inicios = np.searchsorted(chaves, alvos['chave'].to_numpy(), side='left')
+    fins = np.searchsorted(chaves, alvos['chave'].to_numpy(), side='right')
+    for id_alvo, data, valor, inicio, fim in zip(alvos['id'].to_numpy(), alvos['data'].to_numpy(),
+                                                 alvos['valor'].to_numpy(), inicios, fins):
+        if fim - inicio < 2 or valor == 0:
+            continue
+        distancia = np.abs(datas[inicio:fim] - data)
+        filtro = ((distancia <= janela_dias) & (np.sign(valores[inicio:fim]) == np.sign(valor))
+                  & (np.abs(valores[inicio:fim]) < abs(valor)) & livres[inicio:fim])
+        posicoes = np.flatnonzero(filtro)
+        if len(posicoes) < 2:
+            continue
+        posicoes = inicio + posicoes[np.argsort(distancia[posicoes], kind='stable')[:MAX_CANDIDATAS]]
+        combinacao = _subconjunto_com_soma(valores[posicoes], valor, max_partes)
+        if combinacao is not None:
+            escolhidas = posicoes[combinacao]
+            livres[escolhidas] = False
+            grupos.append((id_alvo, ids[escolhidas].tolist()))
+    return grupos
+
+
+def conciliar_lancamentos(lancamentos_contabeis, movimentos, janela_dias=JANELA_DIAS, max_partes=MAX_PARTES):
+    """
+    Casa os lançamentos contábeis com os movimentos bancários (saídas de
+    ler_lancamentos_contabeis e ler_movimentos_bancarios). Retorna um dict com:
+
+        vinculos    uma linha por par casado (no desdobramento, uma por parte,
+                    com o mesmo 'Grupo'), com o tipo do casamento
+        pendentes   lançamentos dos dois lados que não casaram
+        resumo      por chave: linhas, casamentos por tipo e soma dos pendentes
+    """
+    contabil = lancamentos_contabeis.reset_index(drop=True).assign(id=lambda df: np.arange(len(df)))
+    extrato = movimentos.reset_index(drop=True).assign(id=lambda df: np.arange(len(df)))
+
+    vinculos = []
+    exatos = _pares_exatos(contabil, extrato)
+    vinculos.append(exatos.assign(tipo=TIPO_EXATO))
+    restante_contabil = contabil[~contabil['id'].isin(exatos['id_contabil'])]
+    restante_extrato = extrato[~extrato['id'].isin(exatos['id_extrato'])]
+
+    deslocados = _pares_janela(restante_contabil, restante_extrato, janela_dias)
+    vinculos.append(deslocados.assign(tipo=TIPO_DATA_DESLOCADA))
+    restante_contabil = restante_contabil[~restante_contabil['id'].isin(deslocados['id_contabil'])]
+    restante_extrato = restante_extrato[~restante_extrato['id'].isin(deslocados['id_extrato'])]
+
+    # Um movimento do extrato que soma vários lançamentos contábeis, e o contrário
+    desdobrados = []
+    for id_extrato, ids_contabil in _desdobramentos(restante_extrato, restante_contabil, janela_dias, max_partes):
+        desdobrados.extend((id_contabil, id_extrato) for id_contabil in ids_contabil)
+    restante_contabil = restante_contabil[~restante_contabil['id'].isin([par[0] for par in desdobrados])]
+    restante_extrato = restante_extrato[~restante_extrato['id'].isin([par[1] for par in desdobrados])]
+    for id_contabil, ids_extrato in _desdobramentos(restante_contabil, restante_extrato, janela_dias, max_partes):
+        desdobrados.extend((id_contabil, id_extrato) for id_extrato in ids_extrato)
+    vinculos.append(pd.DataFrame(desdobrados, columns=['id_contabil', 'id_extrato'], dtype='int64').assign(tipo=TIPO_DESDOBRAMENTO))
+
+    vinculos = pd.concat(vinculos, ignore_index=True)
+    usados_contabil = vinculos['id_contabil'].to_numpy()
+    usados_extrato = vinculos['id_extrato'].to_numpy()
+    pendentes_contabil = contabil[~contabil['id'].isin(usados_contabil)]
+    pendentes_extrato = extrato[~extrato['id'].isin(usados_extrato)]
+    return {
+        'vinculos': _formatar_vinculos(vinculos, contabil, extrato),
+        'pendentes': _formatar_pendentes(pendentes_contabil, pendentes_extrato),
+        'resumo': _resumo(contabil, extrato, vinculos, pendentes_contabil, pendentes_extrato),
+    }
+
+
+def _datas(dias):
+    return pd.to_datetime(np.asarray(dias, dtype='int64'), unit='D')
+
+
+def _grupos(vinculos, contabil):
+    """
+    Grupo de cada vínculo: 0 nos pares simples; no desdobramento, a linha que
+    se repete nas partes identifica o grupo (numerado a partir de 1).
+    """
+    grupo = np.zeros(len(vinculos), dtype='int64')
+    desdobramento = (vinculos['tipo'] == TIPO_DESDOBRAMENTO).to_numpy()
+    if desdobramento.any():
+        partes = vinculos[desdobramento]
+        repetida_extrato = partes['id_extrato'].duplicated(keep=False).to_numpy()
+        ids_grupo = np.where(repetida_extrato, partes['id_extrato'] + len(contabil), partes['id_contabil'])
+        grupo[desdobramento] = pd.factorize(ids_grupo)[0] + 1
+    return grupo
+
+
+def _formatar_vinculos(vinculos, contabil, extrato):
+    c = contabil.set_index('id').loc[vinculos['id_contabil']]
+    e = extrato.set_index('id').loc[vinculos['id_extrato']]
+    df = pd.DataFrame({
+        'Chave': formatar_chave(c['chave'].to_numpy()).to_numpy(),
+        'Tipo': vinculos['tipo'].to_numpy(),
+        'Data Contábil': _datas(c['data']),
+        'Data Extrato': _datas(e['data']),
+        'Valor Contábil': c['valor'].to_numpy() / 100,
+        'Valor Extrato': e['valor'].to_numpy() / 100,
+        'Histórico Contábil': c['historico'].to_numpy(),
+        'Histórico Extrato': e['historico'].to_numpy(),
+        'Linha Contábil': c['linha'].to_numpy(),
+        'Linha Extrato': e['linha'].to_numpy(),
+    })
+    df.insert(2, 'Grupo', _grupos(vinculos, contabil))
+    return df.sort_values(['Chave', 'Tipo', 'Grupo', 'Data Contábil'], ignore_index=True)
+
+
+def _formatar_pendentes(pendentes_contabil, pendentes_extrato):
+    partes = []
+    for lado, df in (('Contábil', pendentes_contabil), ('Extrato', pendentes_extrato)):
+        partes.append(pd.DataFrame({
+            'Lado': lado, 'Chave': formatar_chave(df['chave'].to_numpy()).to_numpy(), 'Data': _datas(df['data']),
+            'Valor': df['valor'].to_numpy() / 100, 'Histórico': df['historico'].to_numpy(), 'Linha': df['linha'].to_numpy(),
+        }))
+    return pd.concat(partes, ignore_index=True).sort_values(['Chave', 'Data', 'Lado'], ignore_index=True)
+
+
+def _resumo(contabil, extrato, vinculos, pendentes_contabil, pendentes_extrato):
+    """
+    Por chave: quantidades, casamentos por tipo e a diferença que os pendentes
+    explicam. Cada desdobramento conta uma vez, não uma por parte.
+    """
+    grupo = _grupos(vinculos, contabil)
+    casamentos = vinculos[(grupo == 0) | ~pd.Series(grupo).duplicated().to_numpy()]
+    chave_vinculo = contabil['chave'].to_numpy()[casamentos['id_contabil'].to_numpy()] if len(casamentos) else []
+    por_tipo = pd.crosstab(pd.Series(chave_vinculo, name='chave'), casamentos['tipo'].to_numpy())
+    resumo = pd.DataFrame({
+        'Lançamentos Contábeis': contabil.groupby('chave').size(),
+        'Movimentos Extrato': extrato.groupby('chave').size(),
+    })
+    for tipo, rotulo in ((TIPO_EXATO, 'Exatos'), (TIPO_DATA_DESLOCADA, 'Data Deslocada'), (TIPO_DESDOBRAMENTO, 'Desdobramentos')):
+        resumo[rotulo] = por_tipo[tipo] if tipo in por_tipo.columns else 0
+    resumo['Pendente Contábil'] = pendentes_contabil.groupby('chave')['valor'].sum() / 100
+    resumo['Pendente Extrato'] = pendentes_extrato.groupby('chave')['valor'].sum() / 100
+    resumo = resumo.fillna(0)
+    resumo['Diferença Pendente'] = resumo['Pendente Contábil'] - resumo['Pendente Extrato']
+    inteiros = ['Lançamentos Contábeis', 'Movimentos Extrato', 'Exatos', 'Data Deslocada', 'Desdobramentos']
+    resumo[inteiros] = resumo[inteiros].astype('int64')
+    resumo.index = pd.Index(formatar_chave(resumo.index.to_numpy()).to_numpy(), name='Chave')
+    return resumo.reset_index()
+
+
+def conferir_lancamentos(arquivo_contabil, arquivos_movimentos, chaves, df_depara=None, janela_dias=JANELA_DIAS,
+                         max_partes=MAX_PARTES):
+    """
+    Lê os lançamentos contábeis e os movimentos de cada extrato (só das
+    'chaves' informadas, em geral chaves_divergentes) e os casa com
+    conciliar_lancamentos. As contagens de leitura ficam em 'contagens'.
+    """
+    lancamentos_contabeis = ler_lancamentos_contabeis(arquivo_contabil, chaves, df_depara)
+    lidos = [ler_movimentos_bancarios(arquivo, chaves) for arquivo in arquivos_movimentos]
+    movimentos = pd.concat(lidos, ignore_index=True) if lidos else ler_movimentos_bancarios(io.StringIO('Conta;Data;Valor\n'), chaves)
+    resultado = conciliar_lancamentos(lancamentos_contabeis, movimentos, janela_dias, max_partes)
+    resultado['contagens'] = {
+        'lancamentos_lidos': lancamentos_contabeis.attrs['contagens']['linhas_lidas'],
+        'movimentos_lidos': sum(df.attrs['contagens']['linhas_lidas'] for df in lidos),
+        'lancamentos_conferidos': len(lancamentos_contabeis),
+        'movimentos_conferidos': len(movimentos),
+    }
+    return resultado
@@ -0,0 +1,204 @@
+"""
+Monitor da pasta de extratos: concilia automaticamente os meses afetados
+quando chegam ou mudam extratos, o DE-PARA ou um relatório contábil guardado.
+
+A pasta é verificada por varredura periódica (data de modificação e tamanho
+de cada arquivo). Rajadas de escrita são agrupadas: um mês só é conciliado
+depois de --espera segundos sem novas mudanças nos seus arquivos. A
+conciliação usa o último relatório contábil guardado do mês (ver
+armazenamento.py) e é incremental entre uma execução e outra; o resultado é
+gravado em disco para a interface apenas carregar e no histórico (historico.py).
+Um mês cujo resultado gravado já usa os arquivos atuais (ex: acabou de ser
+conciliado pela interface) não é conciliado de novo.
+
+Exemplos:
+    python monitor_extratos.py
+    python monitor_extratos.py --intervalo 2 --espera 10
+    python monitor_extratos.py --uma-vez      # concilia o que estiver desatualizado e sai
+"""
+import argparse
+import datetime
+import os
+import sys
+import time
+from collections import OrderedDict
+
+from armazenamento import (
+    PADRAO_ARQUIVO_CONTABIL, PASTA_CONTABEIS, PASTA_RESULTADOS, caminho_contabil_mes, data_resultado,
+    gravar_resultado, impressao_entradas_resultado, ler_relatorio_contabil, meses_com_relatorio_contabil,
+)
+from conciliacao import CAMINHO_DEPARA, PADRAO_ARQUIVO_EXTRATO, PASTA_EXTRATOS, caminhos_extratos_mes
+from historico import CAMINHO_HISTORICO
+from rastreamento import Rastreamento
+from tarefas import EstadoMes, assinaturas_entradas, executar_conciliacao, impressao_entradas
+
+
+def _registrar(mensagem):
+    print(f"[{datetime.datetime.now():%Y-%m-%d %H:%M:%S}] {mensagem}", flush=True)
+
+
+def _arquivos_pasta(pasta, padrao):
+    try:
+        entradas = list(os.scandir(pasta))
+    except FileNotFoundError:
+        return []
+    return [entrada for entrada in entradas if entrada.is_file() and padrao.match(entrada.name)]
+
+
+class MonitorExtratos:
+    """
+    Observa os extratos, o DE-PARA e os relatórios contábeis guardados e
+    mantém a lista de meses pendentes com o instante da última mudança vista.
+    Guarda o EstadoMes dos 'max_meses' meses conciliados por último, para que
+    a próxima conciliação de cada um seja incremental; o estado de um mês
+    descartado é refeito a partir dos arquivos na próxima conciliação dele.
+    """
+
+    def __init__(self, pasta_extratos=PASTA_EXTRATOS, caminho_depara=CAMINHO_DEPARA,
+                 pasta_contabeis=PASTA_CONTABEIS, pasta_resultados=PASTA_RESULTADOS, espera=5.0,
+                 caminho_historico=CAMINHO_HISTORICO, max_meses=6):
+        self.pasta_extratos = pasta_extratos
+        self.caminho_depara = caminho_depara
+        self.pasta_contabeis = pasta_contabeis
+        self.pasta_resultados = pasta_resultados
+        self.espera = espera
+        self.caminho_historico = caminho_historico
+        self.fotografia = {}
+        self.pendentes = {}  # mes_ano -> instante (time.monotonic) da última mudança
+        self.estados = OrderedDict()  # mes_ano -> EstadoMes, do menos para o mais recente
+        self.max_meses = max_meses
+
+    def fotografar(self):
+        """{caminho: (mtime_ns, tamanho, mês ou None para o DE-PARA)} de cada arquivo observado."""
+        fotografia = {}
+        for entrada in _arquivos_pasta(self.pasta_extratos, PADRAO_ARQUIVO_EXTRATO):
+            encontrado = PADRAO_ARQUIVO_EXTRATO.match(entrada.name)
+            info = entrada.stat()
+            fotografia[entrada.path] = (info.st_mtime_ns, info.st_size, f"{encontrado['mes']}_{encontrado['ano']}")
+        for entrada in _arquivos_pasta(self.pasta_contabeis, PADRAO_ARQUIVO_CONTABIL):
+            info = entrada.stat()
+            fotografia[entrada.path] = (info.st_mtime_ns, info.st_size, PADRAO_ARQUIVO_CONTABIL.match(entrada.name)['mes_ano'])
+        try:
+            info = os.stat(self.caminho_depara)
+            fotografia[self.caminho_depara] = (info.st_mtime_ns, info.st_size, None)
+        except FileNotFoundError:
+            pass
+        return fotografia
+
+    def verificar(self, agora=None):
+        """Compara com a varredura anterior e marca como pendentes os meses cujos arquivos mudaram."""
+        agora = time.monotonic() if agora is None else agora
+        fotografia = self.fotografar()
+        alterados = {caminho for caminho in fotografia.keys() | self.fotografia.keys()
+                     if fotografia.get(caminho, (None, None))[:2] != self.fotografia.get(caminho, (None, None))[:2]}
+        for caminho in alterados:
+            _, _, mes_ano = fotografia.get(caminho) or self.fotografia[caminho]
+            # O DE-PARA muda as chaves de todos os meses
+            for mes in ([mes_ano] if mes_ano else meses_com_relatorio_contabil(self.pasta_contabeis)):
+                self.pendentes[mes] = agora
+        self.fotografia = fotografia
+        return alterados
+
+    def marcar_desatualizados(self):
+        """Marca como pendentes os meses cujo resultado gravado é mais antigo que alguma entrada."""
+        if not self.fotografia:
+            self.fotografia = self.fotografar()
+        for mes_ano in meses_com_relatorio_contabil(self.pasta_contabeis):
+            extratos = caminhos_extratos_mes(mes_ano, self.pasta_extratos)
+            entradas = [caminho_contabil_mes(mes_ano, self.pasta_contabeis), self.caminho_depara,
+                        *(caminho for caminhos in extratos.values() for caminho in caminhos)]
+            modificacoes = [os.path.getmtime(caminho) for caminho in entradas if os.path.exists(caminho)]
+            gravado = data_resultado(mes_ano, self.pasta_resultados)
+            if gravado is None or (modificacoes and max(modificacoes) > gravado):
+                self.pendentes[mes_ano] = float('-inf')
+
+    def meses_prontos(self, agora=None):
+        """Meses pendentes cujos arquivos estão há pelo menos 'espera' segundos sem mudar."""
+        agora = time.monotonic() if agora is None else agora
+        return [mes for mes, instante in self.pendentes.items() if agora - instante >= self.espera]
+
+    def _estado_mes(self, mes_ano):
+        """EstadoMes do mês (criado se preciso), renovado no LRU."""
+        estado = self.estados.pop(mes_ano, None) or EstadoMes()
+        self.estados[mes_ano] = estado
+        while len(self.estados) > self.max_meses:
+            self.estados.popitem(last=False)
+        return estado
+
+    def conciliar(self, mes_ano):
+        """
+        Concilia o mês com o último relatório contábil guardado e grava o
+        resultado. Retorna None se não há relatório contábil ou se o resultado
+        gravado já corresponde às entradas atuais.
+        """
+        self.pendentes.pop(mes_ano, None)
+        conteudo_contabil = ler_relatorio_contabil(mes_ano, self.pasta_contabeis)
+        if conteudo_contabil is None:
+            _registrar(f"[{mes_ano}] Sem relatório contábil guardado; conciliação adiada até ele ser enviado pela interface.")
+            return None
+        assinaturas = assinaturas_entradas(mes_ano, conteudo_contabil, pasta_extratos=self.pasta_extratos,
+                                           caminho_depara=self.caminho_depara)
+        if impressao_entradas(assinaturas) == impressao_entradas_resultado(mes_ano, self.pasta_resultados):
+            _registrar(f"[{mes_ano}] O resultado gravado já usa os arquivos atuais; nada a conciliar.")
+            return None
+        rastreamento = Rastreamento()
+        estado = self._estado_mes(mes_ano)
+        saida = executar_conciliacao(mes_ano, conteudo_contabil, rastreamento, pasta_extratos=self.pasta_extratos,
+                                     caminho_depara=self.caminho_depara, estado=estado,
+                                     caminho_historico=self.caminho_historico)
+        gravar_resultado(mes_ano, saida, rastreamento, self.pasta_resultados)
+        return saida
+
+    def executar(self, intervalo=2.0, uma_vez=False):
+        """Laço principal: varre, espera a rajada acabar e concilia os meses prontos."""
+        self.marcar_desatualizados()
+        while True:
+            self.verificar()
+            prontos = self.pendentes if uma_vez else self.meses_prontos()
+            for mes_ano in list(prontos):
+                try:
+                    saida = self.conciliar(mes_ano)
+                except Exception as e:
+                    _registrar(f"[{mes_ano}] Erro durante o processamento: {e}")
+                    continue
+                if saida is None:
+                    continue
+                for _, mensagem in saida['mensagens']:
+                    _registrar(f"[{mes_ano}] {mensagem}")
+                if saida['resultado'] is not None:
+                    alteradas = saida['contas_alteradas']
+                    detalhe = f", {len(alteradas)} conta(s) alterada(s)" if alteradas is not None else ""
+                    _registrar(f"[{mes_ano}] Resultado gravado: {len(saida['resultado'])} contas conciliadas{detalhe}.")
+            if uma_vez:
+                return
+            time.sleep(intervalo)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concilia automaticamente os meses afetados por novos extratos.")
+    parser.add_argument('--extratos', default=PASTA_EXTRATOS, help="Pasta com os extratos (padrão: %(default)s).")
+    parser.add_argument('--depara', default=CAMINHO_DEPARA, help="Arquivo DE-PARA (padrão: %(default)s).")
+    parser.add_argument('--contabeis', default=PASTA_CONTABEIS, help="Pasta dos relatórios contábeis guardados (padrão: %(default)s).")
+    parser.add_argument('--resultados', default=PASTA_RESULTADOS, help="Pasta dos resultados pré-calculados (padrão: %(default)s).")
+    parser.add_argument('--historico', default=CAMINHO_HISTORICO, help="Banco SQLite do histórico de conciliações (padrão: %(default)s).")
+    parser.add_argument('--intervalo', type=float, default=2.0, help="Segundos entre varreduras (padrão: %(default)s).")
+    parser.add_argument('--espera', type=float, default=5.0,
+                        help="Segundos sem mudanças antes de conciliar um mês (padrão: %(default)s).")
+    parser.add_argument('--max-meses', type=int, default=6,
+                        help="Meses mantidos em memória para conciliações incrementais (padrão: %(default)s).")
+    parser.add_argument('--uma-vez', action='store_true', help="Concilia os meses desatualizados e sai.")
+    args = parser.parse_args(argv)
+
+    monitor = MonitorExtratos(args.extratos, args.depara, args.contabeis, args.resultados, args.espera, args.historico,
+                              args.max_meses)
+    if not args.uma_vez:
+        _registrar(f"Monitorando '{args.extratos}', '{args.depara}' e '{args.contabeis}' (Ctrl+C para sair).")
+    try:
+        monitor.executar(args.intervalo, uma_vez=args.uma_vez)
+    except KeyboardInterrupt:
+        _registrar("Monitor encerrado.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
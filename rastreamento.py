@@ -0,0 +1,172 @@
+"""
+Rastreamento por etapa de uma execução da conciliação.
+
+Cada etapa (leitura do DE-PARA, leitores de extrato, relatório contábil,
+conciliação, exportações) registra tempo de parede, tempo de CPU, memória e
+contagens de linhas. As funções de leitura e a conciliação publicam suas
+contagens em df.attrs['contagens'] (linhas lidas, sem chave, sem
+correspondência no join), que registrar_saida copia para o registro da etapa.
+
+Uso:
+    rastreamento = Rastreamento()
+    with rastreamento.etapa('extrato_bb') as registro:
+        df = processar_extrato_bb_bruto_csv(caminho)
+        registrar_saida(registro, df)
+    rastreamento.para_json()
+"""
+import contextlib
+import datetime
+import json
+import sys
+import threading
+import time
+import tracemalloc
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# tracemalloc é global ao processo: as etapas com medição de memória em
+# andamento (de qualquer thread) ficam aqui, para que a primeira o ligue, a
+# última o desligue e as sobrepostas sejam identificadas.
+_trava_memoria = threading.Lock()
+_medicoes_memoria = []
+_iniciou_tracemalloc = False
+
+
+def _iniciar_medicao_memoria():
+    global _iniciou_tracemalloc
+    medicao = {'sobreposta': False}
+    with _trava_memoria:
+        if _medicoes_memoria:
+            # O pico passa a somar as alocações das duas etapas: nenhuma tem medida própria
+            medicao['sobreposta'] = True
+            for outra in _medicoes_memoria:
+                outra['sobreposta'] = True
+        else:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                _iniciou_tracemalloc = True
+            tracemalloc.reset_peak()
+        _medicoes_memoria.append(medicao)
+    return medicao
+
+
+def _encerrar_medicao_memoria(medicao):
+    """Pico de alocações da etapa em MB, ou None se ela se sobrepôs a outra etapa medida."""
+    global _iniciou_tracemalloc
+    with _trava_memoria:
+        _, pico = tracemalloc.get_traced_memory()
+        _medicoes_memoria[:] = [outra for outra in _medicoes_memoria if outra is not medicao]
+        if not _medicoes_memoria and _iniciou_tracemalloc:
+            tracemalloc.stop()
+            _iniciou_tracemalloc = False
+    return None if medicao['sobreposta'] else round(pico / (1024 * 1024), 2)
+
+
+def _rss_maximo_mb():
+    """Pico de memória residente do processo até agora (cresce de forma monotônica)."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB; macOS, em bytes
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return round(pico / divisor, 1)
+
+
+def registrar_saida(registro, resultado):
+    """Anota no registro as linhas de saída e as contagens publicadas em df.attrs."""
+    if isinstance(resultado, (pd.DataFrame, pd.Series)):
+        registro['linhas_saida'] = len(resultado)
+        registro.update(resultado.attrs.get('contagens', {}))
+    elif isinstance(resultado, (bytes, bytearray)):
+        registro['bytes_saida'] = len(resultado)
+
+
+class Rastreamento:
+    """
+    Coleta os registros das etapas de uma execução.
+    O tempo de CPU é o da thread que executa a etapa, então execuções
+    simultâneas (ex: tarefas do servidor) não somam as CPUs umas das outras.
+    Com medir_memoria=True, o pico de alocações de cada etapa é medido com
+    tracemalloc, o que deixa o código Python sensivelmente mais lento; sem
+    ele, registra-se apenas o pico de memória residente do processo. Como o
+    tracemalloc é do processo inteiro, uma etapa que se sobrepõe a outra etapa
+    medida fica com pico_memoria_mb None e memoria_sobreposta True.
+    """
+
+    def __init__(self, medir_memoria=False):
+        self.medir_memoria = medir_memoria
+        self.inicio = datetime.datetime.now()
+        self.etapas = []
+        self.etapa_atual = None
+
+    @contextlib.contextmanager
+    def etapa(self, nome, linhas_entrada=None):
+        registro = {'etapa': nome, 'status': 'ok'}
+        if linhas_entrada is not None:
+            registro['linhas_entrada'] = linhas_entrada
+
+        medicao = _iniciar_medicao_memoria() if self.medir_memoria else None
+        self.etapa_atual = nome
+        inicio, inicio_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield registro
+        except Exception as e:
+            registro['status'] = 'erro'
+            registro['erro'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            registro['segundos'] = round(time.perf_counter() - inicio, 4)
+            registro['cpu_segundos'] = round(time.thread_time() - inicio_cpu, 4)
+            if medicao is not None:
+                registro['pico_memoria_mb'] = _encerrar_medicao_memoria(medicao)
+                if medicao['sobreposta']:
+                    registro['memoria_sobreposta'] = True
+            registro['rss_maximo_mb'] = _rss_maximo_mb()
+            self.etapas.append(registro)
+            self.etapa_atual = None
+
+    def adicionar(self, registro):
+        """
+        Acrescenta o registro de uma etapa medida fora de etapa(), como a
+        leitura de um arquivo numa thread do pool (ver carregar_extratos).
+        O tempo já conta na etapa que a envolve e fica fora de segundos_total.
+        """
+        registro.setdefault('status', 'ok')
+        registro['paralela'] = True
+        registro['rss_maximo_mb'] = _rss_maximo_mb()
+        self.etapas.append(registro)
+
+    @classmethod
+    def de_dict(cls, dados):
+        """Reconstrói um rastreamento gravado com para_dict (ex: pelo monitor de extratos)."""
+        rastreamento = cls()
+        rastreamento.inicio = datetime.datetime.fromisoformat(dados['inicio'])
+        rastreamento.etapas = list(dados['etapas'])
+        return rastreamento
+
+    def etapa_com_erro(self):
+        """Nome da etapa em que a execução parou com erro, ou None se a última etapa terminou bem."""
+        if self.etapas and self.etapas[-1]['status'] == 'erro':
+            return self.etapas[-1]['etapa']
+        return None
+
+    def como_dataframe(self):
+        """Uma linha por etapa, na ordem de execução."""
+        df = pd.DataFrame(self.etapas)
+        return df.set_index('etapa') if not df.empty else df
+
+    def para_dict(self):
+        return {
+            'inicio': self.inicio.isoformat(timespec='seconds'),
+            'segundos_total': round(sum(r['segundos'] for r in self.etapas if not r.get('paralela')), 4),
+            'etapas': self.etapas,
+        }
+
+    def para_json(self):
+        return json.dumps(self.para_dict(), ensure_ascii=False, indent=2, default=str)
@@ -0,0 +1,424 @@
+"""
+Geração dos arquivos do relatório de conciliação (CSV, Excel e PDF).
+Sem dependência do Streamlit, para uso também no processamento em lote.
+"""
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+from fpdf import FPDF
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+from openpyxl.styles import Font, Alignment, Border, Side, PatternFill
+from openpyxl.utils import get_column_letter
+
+def to_csv(df):
+    """CSV no padrão brasileiro (';' e vírgula decimal), com cabeçalho 'Grupo - Item'."""
+    df_csv = df.copy()
+    df_csv.columns = [' - '.join(map(str, col)).strip() for col in df_csv.columns.values]
+    return df_csv.to_csv(index=True, sep=';', decimal=',').encode('utf-8-sig')
+
+def to_excel(df, modo='rapido'):
+    """
+    Planilha Excel do relatório.
+    modo='rapido' (padrão): escrita em fluxo pelo openpyxl (write_only), ver to_excel_rapido.
+    modo='openpyxl': formatação célula a célula pelo openpyxl (mais lento).
+    """
+    if modo == 'rapido':
+        return to_excel_rapido(df)
+    return _to_excel_openpyxl(df)
+
+def _to_excel_openpyxl(df):
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.to_excel(writer, index=True, sheet_name='Conciliacao', startrow=1)
+        workbook = writer.book
+        worksheet = writer.sheets['Conciliacao']
+        font_header = Font(bold=True, color="FFFFFF")
+        align_header = Alignment(horizontal='center', vertical='center')
+        fill_header = PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid")
+        border_thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+        number_format_br = '#,##0.00'
+        worksheet.merge_cells('B1:D1'); cell_movimento = worksheet['B1']; cell_movimento.value = 'Conta Movimento'; cell_movimento.font = font_header; cell_movimento.alignment = align_header; cell_movimento.fill = fill_header
+        worksheet.merge_cells('E1:G1'); cell_aplicacao = worksheet['E1']; cell_aplicacao.value = 'Aplicação Financeira'; cell_aplicacao.font = font_header; cell_aplicacao.alignment = align_header; cell_aplicacao.fill = fill_header
+        for row in worksheet['A2:G2']:
+            for cell in row: cell.font = Font(bold=True); cell.alignment = Alignment(horizontal='center', vertical='center')
+        for col_idx, col in enumerate(worksheet.columns, 1):
+            max_length = 0; column_letter = get_column_letter(col_idx)
+            for cell_idx, cell in enumerate(col, 0):
+                if cell_idx > 0: cell.border = border_thin
+                if cell_idx > 1:
+                    if col_idx == 1: cell.alignment = Alignment(horizontal='left', vertical='center')
+                    else: cell.number_format = number_format_br; cell.alignment = Alignment(horizontal='right', vertical='center')
+                try:
+                    if len(str(cell.value)) > max_length: max_length = len(str(cell.value))
+                except: pass
+            adjusted_width = (max_length + 2); worksheet.column_dimensions[column_letter].width = adjusted_width
+    return output.getvalue()
+
+# --- Exportação Excel em fluxo ---
+# A planilha é escrita pelo openpyxl em modo write_only: as linhas vão para o
+# arquivo à medida que são acrescentadas, sem montar a planilha em memória.
+# Cada coluna tem uma célula (WriteOnlyCell) já estilizada, reaproveitada em
+# todas as linhas: só o valor muda, e o estilo é registrado uma única vez.
+
+_LINHAS_POR_BLOCO = 20000
+
+def _larguras_colunas(df, rotulo_indice, subcabecalhos):
+    """
+    Largura de cada coluna calculada de forma vetorizada: o maior texto do
+    índice e, nas colunas de valor, o tamanho do número já formatado
+    ('-1.234.567,89'), a partir da quantidade de dígitos.
+    """
+    largura_indice = max(len(rotulo_indice), int(df.index.astype('string').str.len().max() or 0))
+    larguras = [largura_indice]
+    valores = np.nan_to_num(np.abs(df.to_numpy(dtype='float64')), nan=0.0)
+    digitos = np.floor(np.log10(np.maximum(valores, 1))).astype('int64') + 1
+    tamanhos = digitos + (digitos - 1) // 3 + 3 + (df.to_numpy(dtype='float64') < 0)
+    for j, subcabecalho in enumerate(subcabecalhos):
+        maior_valor = int(tamanhos[:, j].max()) if len(df) else 0
+        larguras.append(max(len(subcabecalho), maior_valor))
+    return [largura + 2 for largura in larguras]
+
+def to_excel_rapido(df):
+    """
+    Planilha Excel escrita em fluxo (openpyxl write_only), em blocos de
+    linhas, com memória constante. Mantém o cabeçalho mesclado por grupo
+    ('Conta Movimento' / 'Aplicação Financeira') na linha 1 e os subtítulos
+    na linha 2.
+    """
+    colunas = list(df.columns)
+    grupos = [c[0] if isinstance(c, tuple) else '' for c in colunas]
+    subcabecalhos = [str(c[-1]) if isinstance(c, tuple) else str(c) for c in colunas]
+    rotulo_indice = df.index.name or ''
+
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Conciliacao')
+    # Larguras de coluna precisam ser definidas antes da primeira linha
+    for j, largura in enumerate(_larguras_colunas(df, rotulo_indice, subcabecalhos), 1):
+        worksheet.column_dimensions[get_column_letter(j)].width = largura
+
+    def celula(valor=None, **estilo):
+        celula = WriteOnlyCell(worksheet, value=valor)
+        for atributo, valor_estilo in estilo.items():
+            setattr(celula, atributo, valor_estilo)
+        return celula
+
+    border_thin = Border(left=Side(style='thin'), right=Side(style='thin'), top=Side(style='thin'), bottom=Side(style='thin'))
+    centro = Alignment(horizontal='center', vertical='center')
+
+    # Linha 1: um bloco mesclado por sequência de colunas do mesmo grupo
+    linha_grupos, inicio = [None] * (len(colunas) + 1), 0
+    for j in range(1, len(grupos) + 1):
+        if j == len(grupos) or grupos[j] != grupos[inicio]:
+            if grupos[inicio]:
+                linha_grupos[inicio + 1] = celula(
+                    grupos[inicio], font=Font(bold=True, color="FFFFFF"), alignment=centro,
+                    fill=PatternFill(start_color="4F81BD", end_color="4F81BD", fill_type="solid"))
+                if j - 1 > inicio:
+                    worksheet.merged_cells.add(f'{get_column_letter(inicio + 2)}1:{get_column_letter(j + 1)}1')
+            inicio = j
+    worksheet.append(linha_grupos)
+    worksheet.append([celula(texto, font=Font(bold=True), alignment=centro, border=border_thin)
+                      for texto in [rotulo_indice] + subcabecalhos])
+
+    celula_conta = celula(alignment=Alignment(horizontal='left', vertical='center'), border=border_thin)
+    celulas_valor = [celula(number_format='#,##0.00', alignment=Alignment(horizontal='right', vertical='center'), border=border_thin)
+                     for _ in colunas]
+    for inicio_bloco in range(0, len(df), _LINHAS_POR_BLOCO):
+        bloco = df.iloc[inicio_bloco:inicio_bloco + _LINHAS_POR_BLOCO]
+        contas = pd.Series(bloco.index).astype('string').fillna('').str.replace(ILLEGAL_CHARACTERS_RE, '', regex=True).tolist()
+        valores = bloco.to_numpy(dtype='float64')
+        if np.isnan(valores).any():
+            # Valores ausentes viram células vazias
+            valores = np.where(np.isnan(valores), None, valores.astype(object))
+        for conta, linha in zip(contas, valores.tolist()):
+            celula_conta.value = conta
+            for celula_valor, valor in zip(celulas_valor, linha):
+                celula_valor.value = valor
+            worksheet.append([celula_conta, *celulas_valor])
+
+    output = io.BytesIO()
+    workbook.save(output)
+    return output.getvalue()
+
+# --- Bloco 1 de 2 a ser SUBSTITUÍDO (a classe PDF inteira) ---
+
+# 'Arial' nas fontes padrão do PDF é a Helvetica (mesmas larguras de glifos); o
+# nome direto evita o aviso de substituição do fpdf2 a cada set_font.
+FONTE_PDF = 'Helvetica'
+
+class PDF(FPDF):
+    def header(self):
+        self.set_font(FONTE_PDF, 'B', 12)
+        self.cell(0, 8, 'Prefeitura da Cidade do Rio de Janeiro', 0, 1, 'C')
+        self.set_font(FONTE_PDF, '', 11)
+        self.cell(0, 8, 'Controladoria Geral do Município', 0, 1, 'C')
+        self.set_font(FONTE_PDF, 'B', 10)
+        self.cell(0, 8, 'Relatório de Conciliação de Saldos Bancários', 0, 1, 'C')
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font(FONTE_PDF, 'I', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', 0, 0, 'C')
+
+    def _draw_table_header(self, col_widths, line_height, start_x, index_name, sub_headers):
+        self.set_font(FONTE_PDF, 'B', 9)
+        self.set_x(start_x)
+        self.cell(col_widths[0], line_height, index_name, 1, 0, 'C')
+        self.cell(sum(col_widths[1:4]), line_height, 'Conta Movimento', 1, 0, 'C')
+        self.cell(sum(col_widths[4:7]), line_height, 'Aplicação Financeira', 1, 0, 'C')
+        self.ln(line_height)
+        
+        self.set_font(FONTE_PDF, 'B', 8)
+        self.set_x(start_x)
+        self.cell(col_widths[0], line_height, '', 1, 0, 'C')
+        for i, sub_header in enumerate(sub_headers):
+            self.cell(col_widths[i+1], line_height, sub_header, 1, 0, 'C')
+        self.ln(line_height)
+
+    def _larguras_texto(self, textos):
+        """
+        Largura (em mm, na fonte atual) de cada texto da lista, calculada de
+        forma vetorizada pela tabela de larguras dos glifos da fonte.
+        """
+        tabela = _tabela_glifos(self.current_font)
+        textos = [str(t) for t in textos]
+        if not textos:
+            return np.zeros(0)
+        codificado = ''.join(textos).encode('latin-1', 'replace')
+        acumulado = np.concatenate(([0.0], np.cumsum(tabela[np.frombuffer(codificado, dtype=np.uint8)])))
+        tamanhos = np.array([len(t) for t in textos])
+        fins = np.cumsum(tamanhos)
+        inicios = fins - tamanhos
+        return (acumulado[fins] - acumulado[inicios]) * self.font_size / 1000
+
+    def create_table(self, data, formatted_data=None):
+        self.set_auto_page_break(False)
+
+        padding = 5 
+        index_name = data.index.name if data.index.name else 'ID'
+        sub_headers = ['Saldo Contábil', 'Saldo Extrato', 'Diferença'] * 2
+        
+        # Formata todos os valores de uma vez (se não vierem prontos) e mede as larguras pela tabela de glifos
+        if formatted_data is None:
+            formatted_data = formatar_moeda_br(data)
+        contas = data.index.astype('string').fillna('').tolist()
+
+        self.set_font(FONTE_PDF, 'B', 9)
+        max_index_width = self.get_string_width(index_name)
+        self.set_font(FONTE_PDF, 'B', 8)
+        larguras_cabecalho = self._larguras_texto(sub_headers)
+        self.set_font(FONTE_PDF, '', 7)
+        if contas:
+            max_index_width = max(max_index_width, float(self._larguras_texto(contas).max()))
+
+        col_widths = []
+        for i, col_tuple in enumerate(data.columns):
+            max_w = larguras_cabecalho[i]
+            if len(formatted_data):
+                max_w = max(max_w, float(self._larguras_texto(formatted_data[col_tuple].tolist()).max()))
+            col_widths.append(max_w)
+            
+        col_widths = [max_index_width + padding] + [w + padding for w in col_widths]
+        total_table_width = sum(col_widths)
+        start_x = (self.w - total_table_width) / 2
+        
+        self.set_font(FONTE_PDF, '', 7)
+        line_height = self.font_size * 2.5
+        
+        self._draw_table_header(col_widths, line_height, start_x, index_name, sub_headers)
+        
+        # --- Paginação em blocos ---
+        # Documentação: Em vez de usar (self.h - self.b_margin), usamos um
+        # limite vertical absoluto de 180mm. Para uma página A4 paisagem (210mm),
+        # isso deixa 30mm de espaço no fundo, protegendo o rodapé.
+        # Cada página recebe um bloco de linhas: a grade é desenhada com uma linha
+        # por borda e os textos com text(), já alinhados pelas larguras medidas.
+        bordas_x = start_x + np.concatenate(([0.0], np.cumsum(col_widths)))
+        linhas = formatted_data.to_numpy().tolist()
+        larguras_valores = np.column_stack([
+            self._larguras_texto(formatted_data[col].tolist()) for col in data.columns
+        ]) if len(formatted_data) else np.zeros((0, len(data.columns)))
+        x_valores = (bordas_x[2:] - self.c_margin - larguras_valores).tolist()
+        x_conta = bordas_x[0] + self.c_margin
+        ajuste_base = 0.5 * line_height + 0.3 * self.font_size
+
+        inicio = 0
+        while inicio < len(linhas):
+            if inicio > 0:
+                self.add_page(self.cur_orientation)
+                self._draw_table_header(col_widths, line_height, start_x, index_name, sub_headers)
+            self.set_font(FONTE_PDF, '', 7)
+            topo = self.get_y()
+            capacidade = max(1, int((180 - topo) / line_height + 1e-9))
+            fim = min(inicio + capacidade, len(linhas))
+
+            base = topo + (fim - inicio) * line_height
+            for k in range(fim - inicio + 1):
+                y = topo + k * line_height
+                self.line(bordas_x[0], y, bordas_x[-1], y)
+            for x in bordas_x:
+                self.line(x, topo, x, base)
+
+            for k, n in enumerate(range(inicio, fim)):
+                y_texto = topo + k * line_height + ajuste_base
+                self.text(x_conta, y_texto, contas[n])
+                for x, valor in zip(x_valores[n], linhas[n]):
+                    self.text(x, y_texto, valor)
+            self.set_y(base)
+            inicio = fim
+
+    def create_summary(self, data):
+        """
+        Página de resumo: quantidade de contas, divergências e totais por
+        coluna. No join completo, as contas sem correspondência (contadas em
+        data.attrs['contas_orfas']) aparecem separadas das conciliadas.
+        """
+        self.set_auto_page_break(False)
+        self.set_font(FONTE_PDF, 'B', 10)
+        self.cell(0, 8, 'Resumo da Conciliação', 0, 1, 'C')
+        self.ln(2)
+
+        divergentes = filtrar_divergentes(data)
+        orfas = data.attrs.get('contas_orfas', {})
+        so_contabil, so_extrato = orfas.get('contabil', 0), orfas.get('extrato', 0)
+        linhas = [('Contas conciliadas', f'{len(data) - so_contabil - so_extrato:,}'.replace(',', '.'))]
+        if so_contabil or so_extrato:
+            linhas += [('Contas só no relatório contábil', f'{so_contabil:,}'.replace(',', '.')),
+                       ('Contas só nos extratos', f'{so_extrato:,}'.replace(',', '.'))]
+        linhas.append(('Contas com divergência', f'{len(divergentes):,}'.replace(',', '.')))
+        for grupo in data.columns.get_level_values(0).unique():
+            diferenca = data[(grupo, 'Diferença')]
+            linhas.append((f'{grupo}: contas com diferença', f'{int((diferenca != 0).sum()):,}'.replace(',', '.')))
+        totais = formatar_moeda_br(data.sum().to_frame().T)
+        for col in data.columns:
+            linhas.append((f'{col[0]} - {col[1]} (total)', totais[col].iloc[0]))
+
+        self.set_font(FONTE_PDF, '', 9)
+        largura_rotulo, largura_valor = 90, 50
+        start_x = (self.w - largura_rotulo - largura_valor) / 2
+        for rotulo, valor in linhas:
+            self.set_x(start_x)
+            self.cell(largura_rotulo, 7, rotulo, 1, 0, 'L')
+            self.cell(largura_valor, 7, valor, 1, 1, 'R')
+
+
+def _tabela_glifos(fonte):
+    """Larguras dos 256 glifos de uma fonte padrão do PDF (em milésimos do tamanho)."""
+    if fonte.fontkey not in _TABELAS_GLIFOS:
+        _TABELAS_GLIFOS[fonte.fontkey] = np.array([fonte.cw.get(chr(i), 0) for i in range(256)], dtype='float64')
+    return _TABELAS_GLIFOS[fonte.fontkey]
+
+_TABELAS_GLIFOS = {}
+
+# Textos dos grupos de 3 dígitos (com e sem zeros à esquerda) e dos centavos,
+# indexados pelo próprio número: a formatação vira indexação de arrays.
+_GRUPOS = np.array([str(i) for i in range(1000)], dtype=object)
+_GRUPOS_COMPLETOS = np.array([f'{i:03d}' for i in range(1000)], dtype=object)
+_CENTAVOS = np.array([f',{i:02d}' for i in range(100)], dtype=object)
+
+def _texto_grupo(numeros):
+    """Grupo de 3 dígitos menos significativo; completado com zeros se houver grupos à esquerda."""
+    return np.where(numeros >= 1000, _GRUPOS_COMPLETOS[numeros % 1000], _GRUPOS[numeros % 1000])
+
+def _formatar_reais(numeros):
+    """Array de valores em reais (float) -> array de textos '-1.234,56' (ausentes viram '-')."""
+    ausente = np.isnan(numeros)
+    centavos = np.round(np.nan_to_num(numeros) * 100).astype('int64')
+    absolutos = np.abs(centavos)
+    resto = absolutos // 100
+    texto = _texto_grupo(resto)
+    # Um grupo de milhar por volta, só nos valores que ainda têm dígitos à esquerda
+    resto = resto // 1000
+    pendentes = np.flatnonzero(resto)
+    while len(pendentes):
+        grupo = resto[pendentes]
+        texto[pendentes] = _texto_grupo(grupo) + '.' + texto[pendentes]
+        resto[pendentes] = grupo // 1000
+        pendentes = pendentes[resto[pendentes] > 0]
+    texto = texto + _CENTAVOS[absolutos % 100]
+    negativos = centavos < 0
+    texto[negativos] = '-' + texto[negativos]
+    texto[ausente] = '-'
+    return texto
+
+def formatar_moeda_br(valores):
+    """
+    Formata valores em reais no padrão brasileiro ('-1.234,56') de uma só vez,
+    para uma Series ou um DataFrame inteiro (todas as colunas numa passada).
+    Valores ausentes viram '-'.
+    """
+    if isinstance(valores, pd.DataFrame):
+        numeros = valores.apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64')
+        texto = _formatar_reais(numeros.ravel()).reshape(numeros.shape)
+        return pd.DataFrame(texto, index=valores.index, columns=valores.columns)
+    numeros = pd.to_numeric(valores, errors='coerce').to_numpy(dtype='float64')
+    return pd.Series(_formatar_reais(numeros), index=valores.index, name=getattr(valores, 'name', None))
+
+def estilo_moeda_br(df, colunas=None, formatado=None):
+    """
+    Styler de df para exibição, com as colunas em reais (todas, se colunas
+    for None) mostradas no padrão brasileiro. Os valores continuam numéricos,
+    então a tabela ordena por valor e não por texto. formatado:
+    formatar_moeda_br(df[colunas]) já calculado (ex: o mesmo do PDF).
+    """
+    colunas = list(df.columns) if colunas is None else list(colunas)
+    if formatado is None:
+        formatado = formatar_moeda_br(df[colunas])
+    formatadores = {}
+    for coluna in colunas:
+        # Valores iguais têm o mesmo texto: um dicionário valor -> texto por coluna
+        textos = dict(zip(df[coluna].tolist(), formatado[coluna].tolist()))
+        formatadores[coluna] = textos.__getitem__
+    return df.style.format(formatadores, na_rep='-')
+
+def mascara_divergentes(df):
+    """Máscara das linhas com diferença em qualquer grupo (Conta Movimento ou Aplicação Financeira)."""
+    diferencas = df.loc[:, df.columns.get_level_values(-1) == 'Diferença']
+    return (diferencas != 0).any(axis=1).to_numpy()
+
+def filtrar_divergentes(df):
+    """Linhas com diferença em qualquer grupo (Conta Movimento ou Aplicação Financeira)."""
+    return df[mascara_divergentes(df)]
+
+# --- Bloco 2 de 2 a ser SUBSTITUÍDO (a função create_pdf) ---
+
+def create_pdf(df, somente_divergentes=False, resumo=False, formatado=None):
+    """
+    PDF do relatório. somente_divergentes=True lista só as contas com
+    diferença; resumo=True inclui uma página inicial com os totais.
+    formatado: formatar_moeda_br(df) já calculado (ex: o mesmo da tabela na
+    tela), para não formatar os valores de novo.
+    """
+    pdf = PDF('L', 'mm', 'A4')
+    # A linha "pdf.b_margin = 40" foi removida pois não é mais necessária.
+    if resumo:
+        pdf.add_page()
+        pdf.create_summary(df)
+    pdf.add_page()
+    if somente_divergentes:
+        divergentes = mascara_divergentes(df)
+        df = df[divergentes]
+        formatado = formatado[divergentes] if formatado is not None else None
+    pdf.create_table(df, formatado)
+    return bytes(pdf.output())
+
+
+# Formato do arquivo -> função que gera o conteúdo (bytes) a partir do resultado
+GERADORES = {'csv': to_csv, 'xlsx': to_excel, 'pdf': create_pdf}
+
+def impressao_resultado(df):
+    """
+    Impressão digital curta do resultado da conciliação, para identificar os
+    relatórios gerados a partir dele sem precisar comparar o DataFrame inteiro.
+    Calculada uma vez, logo após realizar_conciliacao.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(repr((df.shape, list(df.columns), df.index.name)).encode('utf-8'))
+    h.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return h.hexdigest()
+
@@ -0,0 +1,376 @@
+"""
+Execução das conciliações em segundo plano.
+
+A conciliação é enviada como uma tarefa para um pool de threads com limite
+de execuções simultâneas; a sessão do Streamlit não fica bloqueada e o
+resultado pode ser recuperado depois pelo id da tarefa. Tarefas idênticas
+(mesmo mês e mesmo conteúdo de relatório contábil, extratos e DE-PARA) são
+deduplicadas: quem enviar a mesma conciliação recebe a tarefa já existente.
+
+O progresso por etapa vem do Rastreamento da tarefa (etapas concluídas e
+etapa em andamento).
+
+Configuração por variável de ambiente:
+    CONCILIACAO_TAREFAS_SIMULTANEAS   conciliações executadas ao mesmo tempo (padrão: 2)
+"""
+import datetime
+import hashlib
+import io
+import os
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from armazenamento import gravar_resultado, guardar_relatorio_contabil
+from cache_fontes import hash_arquivo
+from conciliacao import (
+    CAMINHO_DEPARA, LEITORES_EXTRATO, PASTA_EXTRATOS, ConciliacaoIncremental, caminhos_extratos_mes, carregar_depara,
+    carregar_extratos, compilar_depara, processar_relatorio_contabil,
+)
+from correspondencias import contas_sem_correspondencia, relatorio_colisoes
+from historico import CAMINHO_HISTORICO, registrar_conciliacao
+from lancamentos import chaves_divergentes
+from rastreamento import Rastreamento, registrar_saida
+from relatorios import impressao_resultado
+
+TAREFAS_SIMULTANEAS = int(os.environ.get('CONCILIACAO_TAREFAS_SIMULTANEAS', '2'))
+
+# Etapas de executar_conciliacao, na ordem, para o cálculo do progresso
+ETAPAS_CONCILIACAO = ['carregar_depara', 'compilar_depara', 'carregar_extratos',
+                      'processar_relatorio_contabil', 'realizar_conciliacao', 'gravar_historico']
+
+
+def _assinatura_arquivo(caminho):
+    # Arquivo ausente também faz parte da identidade (a conciliação muda quando ele chega)
+    return hash_arquivo(caminho) if os.path.exists(caminho) else 'ausente'
+
+
+def assinaturas_entradas(mes_ano, conteudo_contabil, manter_auditoria=False,
+                         pasta_extratos=PASTA_EXTRATOS, caminho_depara=CAMINHO_DEPARA, caminhos_extratos=None):
+    """
+    Assinatura (hash do conteúdo) de cada fonte da conciliação de um mês.
+    A do relatório contábil inclui a do DE-PARA, que muda as suas chaves; a de
+    cada banco cobre todos os seus arquivos do mês (caminhos_extratos, se já
+    descobertos com caminhos_extratos_mes).
+    """
+    if caminhos_extratos is None:
+        caminhos_extratos = caminhos_extratos_mes(mes_ano, pasta_extratos)
+    assinaturas = {'depara': _assinatura_arquivo(caminho_depara)}
+    for banco, caminhos in caminhos_extratos.items():
+        assinaturas[banco] = '|'.join(f"{os.path.basename(caminho)}={_assinatura_arquivo(caminho)}" for caminho in caminhos)
+    hash_contabil = hashlib.blake2b(conteudo_contabil, digest_size=20).hexdigest()
+    assinaturas['contabil'] = f"{hash_contabil}|{assinaturas['depara']}|{manter_auditoria}"
+    return assinaturas
+
+
+def impressao_entradas(assinaturas):
+    """
+    Impressão digital das entradas que determinam o resultado (ver
+    assinaturas_entradas), sem a opção de guardar as linhas para auditoria,
+    que não muda o resultado. Gravada com o resultado, permite saber se ele
+    já corresponde aos arquivos atuais.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for nome in sorted(assinaturas):
+        assinatura = assinaturas[nome].rsplit('|', 1)[0] if nome == 'contabil' else assinaturas[nome]
+        h.update(f"|{nome}={assinatura}".encode('utf-8'))
+    return h.hexdigest()
+
+
+class EstadoMes:
+    """
+    O que a última conciliação de um mês deixa para a próxima: a saída de cada
+    fonte lida (com a assinatura e as mensagens) e a conciliação incremental.
+    """
+
+    def __init__(self):
+        self.fontes = {}  # nome -> (assinatura, valor, mensagens)
+        self.conciliacao = ConciliacaoIncremental()
+        self.trava = threading.Lock()
+
+
+def executar_conciliacao(mes_ano, conteudo_contabil, rastreamento, manter_auditoria=False,
+                         pasta_extratos=PASTA_EXTRATOS, caminho_depara=CAMINHO_DEPARA, estado=None,
+                         caminho_historico=CAMINHO_HISTORICO):
+    """
+    Executa a conciliação completa de um mês a partir do conteúdo (bytes) do
+    relatório contábil. Avisos e erros não fatais são devolvidos em
+    'mensagens' como (nível, texto), com nível 'warning' ou 'error'.
+
+    Com o 'estado' da execução anterior do mesmo mês, fontes cujo conteúdo não
+    mudou não são lidas de novo e só as contas afetadas pelas fontes alteradas
+    são reconciliadas; 'contas_alteradas' lista as contas que mudaram.
+
+    'resultado' traz só as contas conciliadas; 'resultado_completo' inclui as
+    contas sem correspondência (join completo), listadas também em 'orfas'.
+    'colisoes' lista as chaves de 7 dígitos compartilhadas por contas diferentes.
+    'chaves_divergentes' são as chaves conciliadas com diferença, usadas na
+    conferência de lançamentos (lancamentos.py).
+
+    Os extratos do mês são os arquivos de todos os bancos registrados em
+    LEITORES_EXTRATO (ver caminhos_extratos_mes), lidos ao mesmo tempo; as
+    linhas lidas de cada banco ficam em 'audit_extratos'.
+
+    O resultado substitui o do mês no histórico (caminho_historico=None não grava).
+    'impressao_entradas' identifica as entradas usadas (ver impressao_entradas).
+    """
+    estado = estado if estado is not None else EstadoMes()
+    nome_mes = mes_ano.replace('_', ' ').capitalize()
+    caminhos = caminhos_extratos_mes(mes_ano, pasta_extratos)
+    assinaturas = assinaturas_entradas(mes_ano, conteudo_contabil, manter_auditoria, pasta_extratos, caminho_depara, caminhos)
+    mensagens = []
+    saida = {'resultado': None, 'impressao': None, 'impressao_entradas': impressao_entradas(assinaturas),
+             'mensagens': mensagens, 'contas_alteradas': None,
+             'resultado_completo': None, 'orfas': None, 'colisoes': None, 'chaves_divergentes': None, 'audit_depara': None, 'audit_extratos': {}, 'audit_contabil': None}
+
+    def fonte(nome, etapas, ler):
+        """Lê a fonte com ler(mensagens_da_fonte), ou reaproveita a leitura anterior se a assinatura não mudou."""
+        anterior = estado.fontes.get(nome)
+        if anterior is not None and anterior[0] == assinaturas[nome]:
+            for etapa in etapas:
+                with rastreamento.etapa(etapa) as registro:
+                    registro['reaproveitada'] = True
+            mensagens.extend(anterior[2])
+            return anterior[1]
+        mensagens_fonte = []
+        valor = ler(mensagens_fonte)
+        estado.fontes[nome] = (assinaturas[nome], valor, mensagens_fonte)
+        mensagens.extend(mensagens_fonte)
+        return valor
+
+    def ler_depara(mensagens_fonte):
+        try:
+            with rastreamento.etapa('carregar_depara') as registro:
+                df_depara = carregar_depara(caminho_depara)
+                registrar_saida(registro, df_depara)
+        except FileNotFoundError:
+            mensagens_fonte.append(('warning', f"Aviso: Arquivo DE-PARA '{caminho_depara}' não encontrado. A tradução de contas não será aplicada."))
+            df_depara = pd.DataFrame()
+        with rastreamento.etapa('compilar_depara', linhas_entrada=len(df_depara)) as registro:
+            mapa_depara = compilar_depara(df_depara)
+            registro['linhas_saida'] = len(mapa_depara)
+        mensagens_fonte.extend(('warning', f"Aviso: {aviso}") for aviso in mapa_depara.avisos())
+        return df_depara, mapa_depara
+
+    def ler_contabil(mensagens_fonte):
+        with rastreamento.etapa('processar_relatorio_contabil') as registro:
+            df_contabil_raw_audit, df_contabil_processado = processar_relatorio_contabil(
+                io.BytesIO(conteudo_contabil), mapa_depara, manter_auditoria=manter_auditoria)
+            registrar_saida(registro, df_contabil_processado)
+        return df_contabil_raw_audit, df_contabil_processado
+
+    df_depara, mapa_depara = fonte('depara', ['carregar_depara', 'compilar_depara'], ler_depara)
+    saida['audit_depara'] = df_depara
+
+    # Bancos com os mesmos arquivos da execução anterior são reaproveitados;
+    # os arquivos dos demais são lidos todos ao mesmo tempo
+    extratos = {}
+    a_ler = {}
+    for banco, caminhos_banco in caminhos.items():
+        anterior = estado.fontes.get(banco)
+        if anterior is not None and anterior[0] == assinaturas[banco]:
+            with rastreamento.etapa(f'extrato_{banco}') as registro:
+                registro['reaproveitada'] = True
+            extratos[banco] = anterior[1]
+        else:
+            a_ler[banco] = caminhos_banco
+    with rastreamento.etapa('carregar_extratos') as registro:
+        lidos, avisos = carregar_extratos(a_ler, registrar_leitura=rastreamento.adicionar)
+        registro['arquivos'] = sum(len(lista) for lista in a_ler.values())
+        registro['linhas_saida'] = sum(len(df) for df in lidos.values())
+    for banco in a_ler:
+        estado.fontes[banco] = (assinaturas[banco], lidos.get(banco), avisos[banco])
+        extratos[banco] = lidos.get(banco)
+    for banco, leitor in LEITORES_EXTRATO.items():
+        if banco in caminhos:
+            mensagens.extend(estado.fontes[banco][2])
+        else:
+            mensagens.append(('warning', f"Aviso: Extrato {leitor.descricao_arquivos()} para {nome_mes} não encontrado."))
+    saida['audit_extratos'] = {banco: df for banco, df in extratos.items() if df is not None}
+
+    extratos = {banco: df for banco, df in extratos.items() if df is not None and not df.empty}
+    if not extratos:
+        mensagens.append(('error', "Nenhum arquivo de extrato válido foi encontrado no repositório para o mês selecionado."))
+        return saida
+
+    df_contabil_raw_audit, df_contabil_processado = fonte('contabil', ['processar_relatorio_contabil'], ler_contabil)
+    saida['audit_contabil'] = df_contabil_raw_audit
+    linhas_extratos = sum(len(df) for df in extratos.values())
+    with rastreamento.etapa('realizar_conciliacao', linhas_entrada=len(df_contabil_processado) + linhas_extratos) as registro:
+        df_resultado_final = estado.conciliacao.atualizar(df_contabil_processado, extratos, assinaturas)
+        registrar_saida(registro, df_resultado_final)
+        if estado.conciliacao.contas_alteradas is not None:
+            registro['contas_alteradas'] = len(estado.conciliacao.contas_alteradas)
+    saida['resultado'] = df_resultado_final
+    saida['impressao'] = impressao_resultado(df_resultado_final)
+    saida['contas_alteradas'] = estado.conciliacao.contas_alteradas
+
+    linhas, bancos = estado.conciliacao.linhas, estado.conciliacao.bancos_por_chave()
+    saida['resultado_completo'] = estado.conciliacao.resultado(incluir_orfas=True)
+    saida['orfas'] = contas_sem_correspondencia(linhas, *estado.conciliacao.agregados(), bancos)
+    saida['chaves_divergentes'] = chaves_divergentes(linhas).tolist()
+    saida['colisoes'] = relatorio_colisoes({'Relatório contábil': df_contabil_processado,
+                                            **{f"Extrato {banco.upper()}": df for banco, df in extratos.items()}})
+    if not saida['colisoes'].empty:
+        mensagens.append(('warning', f"Aviso: {len(saida['colisoes'])} chave(s) de 7 dígitos são compartilhadas por contas "
+                                     "diferentes e têm os saldos somados. Veja 'Contas sem correspondência e colisões de chave'."))
+
+    if caminho_historico is not None:
+        try:
+            with rastreamento.etapa('gravar_historico', linhas_entrada=len(linhas)) as registro:
+                registro['linhas_saida'] = registrar_conciliacao(mes_ano, linhas, bancos, caminho_historico)
+        except sqlite3.Error as e:
+            mensagens.append(('warning', f"Aviso: não foi possível gravar a conciliação no histórico: {e}"))
+    return saida
+
+
+def chave_tarefa(mes_ano, conteudo_contabil, manter_auditoria=False,
+                 pasta_extratos=PASTA_EXTRATOS, caminho_depara=CAMINHO_DEPARA):
+    """Identifica uma conciliação pelo mês e pelo conteúdo de todas as entradas."""
+    assinaturas = assinaturas_entradas(mes_ano, conteudo_contabil, manter_auditoria, pasta_extratos, caminho_depara)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(mes_ano.encode('utf-8'))
+    for nome in sorted(assinaturas):
+        h.update(f"|{nome}={assinaturas[nome]}".encode('utf-8'))
+    return h.hexdigest()
+
+
+class Tarefa:
+    """Uma conciliação enviada ao executor. O estado é atualizado pela thread que a executa."""
+
+    NA_FILA, EXECUTANDO, CONCLUIDA, ERRO = 'na_fila', 'executando', 'concluida', 'erro'
+
+    def __init__(self, id_tarefa, chave, mes_ano, rastreamento):
+        self.id = id_tarefa
+        self.chave = chave
+        self.mes_ano = mes_ano
+        self.rastreamento = rastreamento
+        self.estado = Tarefa.NA_FILA
+        self.saida = None
+        self.erro = None
+        self.criada_em = datetime.datetime.now()
+        self.concluida_em = None
+
+    @property
+    def em_andamento(self):
+        return self.estado in (Tarefa.NA_FILA, Tarefa.EXECUTANDO)
+
+    def progresso(self):
+        """Fração das etapas concluídas (0 a 1)."""
+        if not self.em_andamento:
+            return 1.0
+        concluidas = {registro['etapa'] for registro in self.rastreamento.etapas}
+        return len(concluidas & set(ETAPAS_CONCILIACAO)) / len(ETAPAS_CONCILIACAO)
+
+    def descricao_estado(self):
+        if self.estado == Tarefa.NA_FILA:
+            return "Na fila"
+        if self.estado == Tarefa.EXECUTANDO:
+            return f"Executando: {self.rastreamento.etapa_atual or '...'}"
+        if self.estado == Tarefa.ERRO:
+            return f"Erro {self.erro}"
+        return "Concluída"
+
+
+class ExecutorTarefas:
+    """
+    Pool de threads com limite de conciliações simultâneas, deduplicação por
+    chave e retenção das últimas 'max_retidas' tarefas terminadas.
+    Guarda também o EstadoMes dos 'max_meses' meses conciliados por último,
+    para que a próxima conciliação de cada um seja incremental; tarefas do
+    mesmo mês são executadas uma de cada vez.
+
+    Com pasta_resultados e pasta_contabeis, cada conciliação concluída grava o
+    resultado e guarda o relatório contábil (ver armazenamento.py), nesta
+    ordem: o monitor de extratos vê o relatório novo, encontra um resultado
+    gravado com as mesmas entradas e não concilia o mês de novo.
+    """
+
+    def __init__(self, max_simultaneas=TAREFAS_SIMULTANEAS, max_retidas=30, max_meses=6,
+                 pasta_resultados=None, pasta_contabeis=None):
+        self._pool = ThreadPoolExecutor(max_workers=max_simultaneas, thread_name_prefix='conciliacao')
+        self._tarefas = OrderedDict()
+        self._por_chave = {}
+        self._estados = OrderedDict()
+        self._trava = threading.Lock()
+        self.max_retidas = max_retidas
+        self.max_meses = max_meses
+        self.pasta_resultados = pasta_resultados
+        self.pasta_contabeis = pasta_contabeis
+
+    def submeter(self, mes_ano, conteudo_contabil, manter_auditoria=False, medir_memoria=False,
+                 pasta_extratos=PASTA_EXTRATOS, caminho_depara=CAMINHO_DEPARA):
+        """
+        Envia uma conciliação e retorna a Tarefa. Se uma tarefa idêntica estiver
+        na fila, em execução ou concluída, ela é retornada no lugar de uma nova.
+        """
+        chave = chave_tarefa(mes_ano, conteudo_contabil, manter_auditoria, pasta_extratos, caminho_depara)
+        with self._trava:
+            existente = self._tarefas.get(self._por_chave.get(chave))
+            if existente is not None and existente.estado != Tarefa.ERRO:
+                return existente
+            tarefa = Tarefa(uuid.uuid4().hex[:10], chave, mes_ano, Rastreamento(medir_memoria=medir_memoria))
+            self._tarefas[tarefa.id] = tarefa
+            self._por_chave[chave] = tarefa.id
+            self._descartar_antigas()
+        self._pool.submit(self._executar, tarefa, conteudo_contabil, manter_auditoria, pasta_extratos, caminho_depara)
+        return tarefa
+
+    def _estado_mes(self, mes_ano, pasta_extratos, caminho_depara):
+        """EstadoMes do mês (criado se preciso), renovado no LRU."""
+        chave = (mes_ano, pasta_extratos, caminho_depara)
+        with self._trava:
+            estado = self._estados.pop(chave, None) or EstadoMes()
+            self._estados[chave] = estado
+            while len(self._estados) > self.max_meses:
+                self._estados.popitem(last=False)
+        return estado
+
+    def _executar(self, tarefa, conteudo_contabil, manter_auditoria, pasta_extratos, caminho_depara):
+        estado = self._estado_mes(tarefa.mes_ano, pasta_extratos, caminho_depara)
+        try:
+            with estado.trava:
+                tarefa.estado = Tarefa.EXECUTANDO
+                tarefa.saida = executar_conciliacao(tarefa.mes_ano, conteudo_contabil, tarefa.rastreamento,
+                                                    manter_auditoria, pasta_extratos, caminho_depara, estado)
+            self._guardar(tarefa, conteudo_contabil)
+            tarefa.estado = Tarefa.CONCLUIDA
+        except Exception as e:
+            etapa_com_erro = tarefa.rastreamento.etapa_com_erro()
+            tarefa.erro = f"na etapa '{etapa_com_erro}': {e}" if etapa_com_erro else f"durante o processamento: {e}"
+            tarefa.estado = Tarefa.ERRO
+        finally:
+            tarefa.concluida_em = datetime.datetime.now()
+
+    def _guardar(self, tarefa, conteudo_contabil):
+        """Grava o resultado da tarefa e guarda o relatório contábil para o monitor de extratos."""
+        if self.pasta_resultados is None or self.pasta_contabeis is None:
+            return
+        try:
+            gravar_resultado(tarefa.mes_ano, tarefa.saida, tarefa.rastreamento, self.pasta_resultados)
+            guardar_relatorio_contabil(tarefa.mes_ano, conteudo_contabil, self.pasta_contabeis)
+        except OSError as e:
+            tarefa.saida['mensagens'].append(
+                ('warning', f"Aviso: não foi possível guardar o resultado e o relatório contábil para o monitor de extratos: {e}"))
+
+    def _descartar_antigas(self):
+        """Remove as tarefas terminadas mais antigas além do limite de retenção (chamado com a trava)."""
+        terminadas = [t for t in self._tarefas.values() if not t.em_andamento]
+        for tarefa in terminadas[:max(0, len(terminadas) - self.max_retidas)]:
+            del self._tarefas[tarefa.id]
+            if self._por_chave.get(tarefa.chave) == tarefa.id:
+                del self._por_chave[tarefa.chave]
+
+    def obter(self, id_tarefa):
+        """A tarefa com este id, ou None se não existir (ou já tiver sido descartada)."""
+        with self._trava:
+            return self._tarefas.get((id_tarefa or '').strip())
+
+    def listar(self):
+        """Tarefas retidas, da mais recente para a mais antiga."""
+        with self._trava:
+            return list(reversed(self._tarefas.values()))
@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from auditoria import RepositorioAuditoria, montar_fontes
+from conciliacao import gerar_chave_contabil, processar_extrato_bb_bruto_csv
+
+PASTA_EXTRATOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'extratos_consolidados')
+
+
+def test_pagina_mostra_saldos_em_reais():
+    extrato = processar_extrato_bb_bruto_csv.sem_cache(os.path.join(PASTA_EXTRATOS, 'extrato_bb_julho_2025.csv'))
+    fonte = montar_fontes(audit_extratos={'bb': extrato})['bb']
+    assert set(fonte.colunas_moeda) >= {'Saldo_Corrente_Extrato', 'Saldo_Aplicado_Extrato', 'Saldo total'}
+
+    pagina = fonte.pagina(fonte.filtrar(), 1)
+    # Primeira linha do arquivo: 'Saldo em conta' 9870707 (sem separador decimal), em centavos no extrato
+    assert extrato['Saldo_Corrente_Extrato'].iloc[0] == 987070700
+    assert pagina['Saldo_Corrente_Extrato'].iloc[0] == 9870707.0
+    assert pagina['Chave Primaria'].iloc[0] == '2950049'
+
+
+def _contabil(quantidade):
+    """Cópia de auditoria do relatório contábil: duas linhas por conta, metade na agência 2234."""
+    domicilios = [f"001-{'2234' if i % 2 else '4064'}-{i:07d}-BB" for i in range(quantidade)] * 2
+    return pd.DataFrame({
+        'Domicílio bancário': domicilios,
+        'Conta contábil': ['111111901'] * quantidade + ['111115001'] * quantidade,
+        'Saldo Final': np.arange(2 * quantidade, dtype='int64') * 100,
+        'Chave Primaria': gerar_chave_contabil(domicilios),
+    })
+
+
+def test_filtros_pelo_indice_de_chaves_conta_e_agencia():
+    fonte = montar_fontes(audit_contabil=_contabil(500))['contabil']
+    # Domicílio e conta contábil repetidos viram categorias
+    assert isinstance(fonte.df['Domicílio bancário'].dtype, pd.CategoricalDtype)
+
+    assert fonte.filtrar(chave=7).tolist() == [7, 507]
+    assert fonte.filtrar(chave=9999999).tolist() == []
+    assert fonte.filtrar(chaves_divergentes=[3, 1, 3, 600]).tolist() == [1, 3, 501, 503]
+    assert fonte.filtrar(conta='0000049-bb').tolist() == [49, 549]
+    assert fonte.filtrar(agencia='22-3').tolist() == [i for i in range(1000) if i % 2]
+    assert fonte.filtrar(conta='00001', agencia='4064', chaves_divergentes=[10, 11, 12]).tolist() == [10, 12, 510, 512]
+
+
+def test_paginas_das_linhas_filtradas():
+    fonte = montar_fontes(audit_contabil=_contabil(500))['contabil']
+    linhas = fonte.filtrar(agencia='2234')
+
+    primeira = fonte.pagina(linhas, 1, linhas_por_pagina=100)
+    ultima = fonte.pagina(linhas, 5, linhas_por_pagina=100)
+    assert len(primeira) == len(ultima) == 100
+    assert primeira['Chave Primaria'].iloc[:2].tolist() == ['0000001', '0000003']
+    assert ultima['Saldo Final'].iloc[-1] == 999.0
+    assert fonte.pagina(linhas, 6, linhas_por_pagina=100).empty
+
+
+def test_repositorio_guarda_as_ultimas_conciliacoes():
+    repositorio = RepositorioAuditoria(max_conciliacoes=2)
+    for chave in ('a', 'b'):
+        repositorio.registrar(chave, audit_contabil=_contabil(3))
+    assert repositorio.obter('a') is not None  # 'a' volta a ser a mais recente
+    repositorio.registrar('c', audit_contabil=_contabil(3))
+
+    assert repositorio.obter('b') is None
+    assert list(repositorio.obter('a')) == list(repositorio.obter('c')) == ['contabil']
@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+import pytest
+
+import cache_fontes
+from cache_fontes import aplicar_limite_cache, em_cache, limpar_cache
+
+
+@pytest.fixture(autouse=True)
+def pasta_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_fontes, 'PASTA_CACHE', str(tmp_path / 'cache'))
+    monkeypatch.setattr(cache_fontes, 'CACHE_HABILITADO', True)
+    return tmp_path / 'cache'
+
+
+def _leitor(versao, chamadas):
+    @em_cache('teste', versao)
+    def ler(caminho, fator=1):
+        chamadas.append(caminho)
+        return pd.read_csv(caminho, header=None, names=['valor']) * fator
+    return ler
+
+
+def test_entrada_invalidada_pelo_conteudo_pela_versao_e_pelos_argumentos(tmp_path, pasta_cache):
+    arquivo = tmp_path / 'fonte.txt'
+    arquivo.write_text('1\n2\n', encoding='utf-8')
+    chamadas = []
+    ler = _leitor(1, chamadas)
+
+    assert ler(str(arquivo))['valor'].tolist() == [1, 2]
+    assert ler(str(arquivo))['valor'].tolist() == [1, 2]
+    assert len(chamadas) == 1
+
+    arquivo.write_text('1\n3\n', encoding='utf-8')
+    assert ler(str(arquivo))['valor'].tolist() == [1, 3]
+    assert ler(str(arquivo), fator=10)['valor'].tolist() == [10, 30]
+    assert _leitor(2, chamadas)(str(arquivo))['valor'].tolist() == [1, 3]
+    assert len(chamadas) == 4
+    # Arquivos abertos (ex: enviados pelo navegador) não passam pelo cache
+    with open(arquivo, encoding='utf-8') as f:
+        assert ler.sem_cache(str(arquivo)).equals(ler(str(arquivo)))
+        ler(f)
+    assert len(chamadas) == 6
+
+    assert len(os.listdir(pasta_cache)) == 4
+    assert limpar_cache('outro') == 0
+    assert limpar_cache('teste') == 4
+    assert os.listdir(pasta_cache) == []
+
+
+def test_limite_remove_as_entradas_usadas_ha_mais_tempo(pasta_cache):
+    pasta_cache.mkdir()
+    for i, nome in enumerate(['antiga', 'media', 'recente']):
+        caminho = pasta_cache / f'{nome}-v1-0.parquet'
+        pd.DataFrame({'valor': range(100)}).to_parquet(caminho)
+        os.utime(caminho, (1000 + i, 1000 + i))
+    abandonado = pasta_cache / 'antiga-v1-0.parquet.abc.tmp'
+    abandonado.write_bytes(b'x')
+    os.utime(abandonado, (0, 0))
+    # Um acerto renova a entrada antiga no LRU
+    assert len(cache_fontes.ler_cache(str(pasta_cache / 'antiga-v1-0.parquet'))) == 100
+
+    aplicar_limite_cache(tamanho_maximo=2 * os.path.getsize(pasta_cache / 'media-v1-0.parquet'))
+    assert sorted(os.listdir(pasta_cache)) == ['antiga-v1-0.parquet', 'recente-v1-0.parquet']
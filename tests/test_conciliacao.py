@@ -0,0 +1,142 @@
+import os
+
+import pandas as pd
+
+from conciliacao import (
+    CHAVE_AUSENTE, COLUNAS_RESULTADO, ConciliacaoIncremental, colisoes_chave, converter_moeda_centavos, formatar_chave, gerar_chave_contabil,
+    gerar_chave_padronizada, processar_extrato_bb_bruto_csv, realizar_conciliacao,
+)
+from correspondencias import LADO_EXTRATO, _caracteristicas
+
+PASTA_EXTRATOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'extratos_consolidados')
+
+
+def test_moeda_formatos_brasileiro_e_internacional_na_mesma_coluna():
+    assert converter_moeda_centavos(['1.234,56', '1,234.56', '10', '0.5']).tolist() == [123456, 123456, 1000, 50]
+
+
+def test_moeda_sufixos_da_caixa_e_negativos():
+    valores = ['-23.574.912,34 D', '592.973.645,61C', '100,00 D', '(5,00)', '-0,01']
+    assert converter_moeda_centavos(valores, formato='br').tolist() == [-2357491234, 59297364561, -10000, -500, -1]
+
+
+def test_moeda_ambigua_segue_o_formato_predominante():
+    # '1.442' sozinho é milhar; numa coluna internacional, é decimal
+    assert converter_moeda_centavos(['1.442']).tolist() == [144200]
+    assert converter_moeda_centavos(['1.442', '1.234,56', '2,50']).tolist() == [144200, 123456, 250]
+    assert converter_moeda_centavos(['1.442', '1,234.56', '2.50']).tolist() == [144, 123456, 250]
+    assert converter_moeda_centavos(['1.442'], formato='br').tolist() == [144200]
+
+
+def test_moeda_vazios_e_invalidos_viram_zero():
+    serie = pd.Series(['', None, '   ', 'abc', 'R$ 1.000,00'], index=[10, 11, 12, 13, 14])
+    convertido = converter_moeda_centavos(serie)
+    assert convertido.tolist() == [0, 0, 0, 0, 100000]
+    assert convertido.dtype == 'int64'
+    assert convertido.index.tolist() == [10, 11, 12, 13, 14]
+
+
+def test_chaves_inteiras_iguais_para_contabil_e_extratos():
+    contabil = gerar_chave_contabil(['001-2234-0000549-BB', '104-4064-2950049-CEF', 'sem conta', None])
+    extrato = gerar_chave_padronizada(['4064 - 0000549', '295004-9', None])
+    assert contabil.dtype == 'int32' and extrato.dtype == 'int32'
+    assert contabil.tolist() == [549, 2950049, CHAVE_AUSENTE, CHAVE_AUSENTE]
+    assert extrato.tolist() == [549, 2950049, CHAVE_AUSENTE]
+    assert formatar_chave(extrato[:2]).tolist() == ['0000549', '2950049']
+
+
+def test_colisoes_de_chave_ignoram_zeros_a_esquerda():
+    contas = ['1234567', '001234567', '99-1234567', '7654321']
+    assert colisoes_chave(gerar_chave_padronizada(contas), contas) == [{'chave': 1234567, 'contas': ['1234567', '99-1234567']}]
+
+
+def test_extrato_bb_utf8_identifica_conta_com_agencia():
+    caminho = os.path.join(PASTA_EXTRATOS, 'extrato_bb_julho_2025.csv')
+    df = processar_extrato_bb_bruto_csv.sem_cache(caminho)
+    assert df['Conta_Extrato'].str.startswith('2234-9/').all()
+
+    # A agência da conta alimenta a sugestão por agência e valor
+    orfas = pd.DataFrame({'Lado': LADO_EXTRATO, 'Conta': df['Conta_Extrato'].head(), 'Saldo Corrente': 1.0, 'Saldo Aplicado': 0.0})
+    assert (_caracteristicas(orfas, LADO_EXTRATO)['agencia'] == '2234').all()
+
+
+def test_extrato_bb_latin1_continua_aceito(tmp_path):
+    caminho = tmp_path / 'extrato_bb.csv'
+    caminho.write_bytes('Agência,Conta,Saldo em conta,Saldo investido,Saldo total\n1234-5,99-1,"1.442,26",0,"1.442,26"\n'.encode('latin-1'))
+    df = processar_extrato_bb_bruto_csv.sem_cache(str(caminho))
+    assert df['Conta_Extrato'].tolist() == ['1234-5/99-1']
+
+
+def _contabil(domicilios, correntes, aplicados=None):
+    """Relatório contábil já processado (saldos em centavos)."""
+    return pd.DataFrame({
+        'Chave Primaria': gerar_chave_contabil(domicilios),
+        'Domicílio bancário': domicilios,
+        'Saldo_Corrente_Contabil': correntes,
+        'Saldo_Aplicado_Contabil': aplicados or [0] * len(domicilios),
+    })
+
+
+def _extrato(contas, correntes, aplicados=None, agencias=None):
+    """Extrato já normalizado (saldos em centavos); com agencias, como o da CEF."""
+    return pd.DataFrame({
+        'Chave Primaria': gerar_chave_padronizada(contas),
+        'Saldo_Corrente_Extrato': correntes,
+        'Saldo_Aplicado_Extrato': aplicados or [0] * len(contas),
+        'Agencia_Extrato': agencias,
+        'Conta_Extrato': contas,
+    })
+
+
+def test_conciliacao_com_extrato_cef_todo_sem_correspondencia():
+    # Domicílio das contas só no extrato vem da conta do extrato, sem a 3ª parte '-'
+    contabil = _contabil(['001-2234-0000111-BB'], [1000])
+    extrato = _extrato(['4064/006/00000054-9', '4064/006/00000077-1'], [500, 700], agencias=['4064', '4064'])
+    resultado = realizar_conciliacao(contabil, extrato, incluir_orfas=True)
+
+    assert list(resultado.columns) == list(COLUNAS_RESULTADO)
+    assert resultado.attrs['contas_orfas'] == {'contabil': 1, 'extrato': 2}
+    # Sem a conta no domicílio, a descrição usa a chave
+    assert sorted(resultado.index) == ['001-2234-0000111-BB', '4064 - 0000549', '4064 - 0000771']
+    assert resultado.loc['4064 - 0000549', ('Conta Movimento', 'Diferença')] == -5.0
+
+
+def test_conciliacao_casa_contas_pela_chave_inteira():
+    contabil = _contabil(['001-2234-0000549-BB', '104-4064-2950049-CEF'], [1000, 2500], [0, 100])
+    extrato = _extrato(['4064 - 0000549', '295004-9', 'sem número'], [1000, 2000, 300])
+    resultado = realizar_conciliacao(contabil, extrato)
+
+    assert sorted(resultado.index) == ['001-2234-0000549-BB', '104-4064-2950049-CEF']
+    assert resultado.loc['104-4064-2950049-CEF', ('Conta Movimento', 'Diferença')] == 5.0
+    assert resultado.loc['104-4064-2950049-CEF', ('Aplicação Financeira', 'Diferença')] == 1.0
+    assert resultado.loc['001-2234-0000549-BB', ('Conta Movimento', 'Diferença')] == 0.0
+
+
+def test_conciliacao_incremental_igual_a_completa_depois_de_mudar_um_extrato():
+    contabil = _contabil(['001-2234-0000111-BB', '104-4064-0000549-CEF', '104-4064-0000771-CEF'],
+                         [1000, 2000, 3000], [10, 20, 30])
+    bb = _extrato(['2234-9/111-1'], [1000], [10])
+    cef = _extrato(['4064/006/00000054-9', '4064/006/00000077-1'], [2000, 3000], [20, 30], agencias=['4064', '4064'])
+    incremental = ConciliacaoIncremental()
+    incremental.atualizar(contabil, {'bb': bb, 'cef': cef}, {'contabil': 'c1', 'bb': 'b1', 'cef': 'e1'})
+    assert incremental.contas_alteradas is None
+
+    # CEF corrigido: uma conta com outro saldo e uma conta nova só no extrato
+    cef = _extrato(['4064/006/00000054-9', '4064/006/00000077-1', '4064/006/00000099-0'], [2000, 2900, 50], [20, 30, 0],
+                   agencias=['4064'] * 3)
+    for incluir_orfas in (False, True):
+        resultado = incremental.atualizar(contabil, {'bb': bb, 'cef': cef}, {'contabil': 'c1', 'bb': 'b1', 'cef': 'e2'},
+                                          incluir_orfas=incluir_orfas)
+        completo = realizar_conciliacao(contabil, pd.concat([bb, cef], ignore_index=True), incluir_orfas=incluir_orfas)
+        pd.testing.assert_frame_equal(resultado.sort_index(), completo.sort_index())
+        assert resultado.attrs == completo.attrs
+        if not incluir_orfas:
+            assert sorted(incremental.contas_alteradas) == ['4064 - 0000771', '4064 - 0000990']
+    assert sorted(incremental.resultado(incluir_orfas=True).index) == sorted(completo.index)
+
+    # Sem mudanças, nenhuma conta alterada; ao remover o extrato, as contas dele mudam
+    incremental.atualizar(contabil, {'bb': bb, 'cef': cef}, {'contabil': 'c1', 'bb': 'b1', 'cef': 'e2'})
+    assert incremental.contas_alteradas.empty
+    resultado = incremental.atualizar(contabil, {'bb': bb}, {'contabil': 'c1', 'bb': 'b1'})
+    pd.testing.assert_frame_equal(resultado.sort_index(), realizar_conciliacao(contabil, bb).sort_index())
+    assert sorted(incremental.contas_alteradas) == ['104-4064-0000549-CEF', '104-4064-0000771-CEF']
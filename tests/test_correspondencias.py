@@ -0,0 +1,44 @@
+import pandas as pd
+
+from conciliacao import ConciliacaoIncremental, gerar_chave_contabil, gerar_chave_padronizada
+from correspondencias import LADO_CONTABIL, LADO_EXTRATO, contas_sem_correspondencia, sugerir_correspondencias
+
+
+def _orfas(domicilios, saldos_contabil, contas, saldos_extrato):
+    contabil = pd.DataFrame({
+        'Chave Primaria': gerar_chave_contabil(domicilios), 'Domicílio bancário': domicilios,
+        'Saldo_Corrente_Contabil': saldos_contabil, 'Saldo_Aplicado_Contabil': 0,
+    })
+    cef = pd.DataFrame({
+        'Chave Primaria': gerar_chave_padronizada(contas), 'Saldo_Corrente_Extrato': saldos_extrato,
+        'Saldo_Aplicado_Extrato': 0, 'Agencia_Extrato': '4064', 'Conta_Extrato': contas,
+    })
+    incremental = ConciliacaoIncremental()
+    incremental.atualizar(contabil, {'cef': cef})
+    agregado_contabil, agregado_extrato = incremental.agregados()
+    return contas_sem_correspondencia(incremental.linhas, agregado_contabil, agregado_extrato, incremental.bancos_por_chave())
+
+
+def test_sugestoes_por_sufixo_valor_e_agencia():
+    orfas = _orfas(
+        ['104-4064-7654321-CEF', '104-4064-1111111-CEF', '104-4064-0000549-CEF'], [50000, 100000, 700],
+        ['4064/006/87654321-0', '4064/006/00002222-2', '4064/006/00000054-9', '9999/001/00000333-3'],
+        [50000, 100050, 700, 123])
+
+    assert orfas['Lado'].tolist().count(LADO_CONTABIL) == 2
+    assert orfas['Lado'].tolist().count(LADO_EXTRATO) == 3
+    assert (orfas.loc[orfas['Lado'] == LADO_EXTRATO, 'Banco'] == 'cef').all()
+    assert orfas.set_index('Chave').loc['6543210', 'Saldo Corrente'] == 500.0
+
+    sugestoes = sugerir_correspondencias(orfas)
+    assert sugestoes[['Chave Contábil', 'Chave no Extrato', 'Critérios', 'Pontuação']].values.tolist() == [
+        ['7654321', '6543210', 'agencia_valor, sufixo, valor', 7],
+        ['1111111', '0022222', 'agencia_valor', 2],
+    ]
+    assert sugestoes['Saldo Extrato'].tolist() == [500.0, 1000.5]
+
+
+def test_sem_orfas_de_um_dos_lados_nao_ha_sugestoes():
+    orfas = _orfas(['104-4064-0000549-CEF'], [700], ['4064/006/00000054-9', '4064/006/00000077-1'], [700, 100])
+    assert orfas['Lado'].tolist() == [LADO_EXTRATO]
+    assert sugerir_correspondencias(orfas).empty
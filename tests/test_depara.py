@@ -0,0 +1,54 @@
+import pandas as pd
+
+from conciliacao import carregar_depara, compilar_depara
+
+
+def _depara(linhas):
+    """DE-PARA como o de carregar_depara, a partir de (aba, conta antiga, conta nova)."""
+    df = pd.DataFrame(linhas, columns=['Aba', 'Conta Antiga', 'Conta Nova'])
+    df['Chave Antiga'] = df['Conta Antiga'].str[-7:].astype('int32')
+    df['Chave Nova'] = df['Conta Nova'].str[-7:].astype('int32')
+    return df
+
+
+def test_cadeia_entre_abas_em_ordem_cronologica(tmp_path):
+    caminho = tmp_path / 'depara.xlsx'
+    # Abas fora de ordem no arquivo: a leitura as ordena por data
+    with pd.ExcelWriter(caminho) as writer:
+        pd.DataFrame({'Antiga': ['0000002'], 'Nova': ['0000003']}).to_excel(writer, sheet_name='2025_JULHO', index=False)
+        pd.DataFrame({'Antiga': ['0000001'], 'Nova': ['0000002']}).to_excel(writer, sheet_name='2025_JUNHO', index=False)
+        pd.DataFrame({'Antiga': ['0000003'], 'Nova': ['0000004']}).to_excel(writer, sheet_name='2025_JULHO (2)', index=False)
+    df_depara = carregar_depara.sem_cache(str(caminho))
+    assert df_depara['Aba'].tolist() == ['2025_JUNHO', '2025_JULHO', '2025_JULHO (2)']
+
+    mapa = compilar_depara(df_depara)
+    assert mapa.aplicar([1, 2, 3, 4, 9]).tolist() == [4, 4, 4, 4, 9]
+    assert mapa.avisos() == []
+
+
+def test_conflito_vale_a_aba_mais_recente():
+    mapa = compilar_depara(_depara([
+        ('2025_JUNHO', '0000001', '0000010'),
+        ('2025_JULHO', '0000001', '0000020'),
+    ]))
+    assert mapa.aplicar([1]).tolist() == [20]
+    assert mapa.conflitos['Chave Antiga'].tolist() == [1]
+    assert mapa.conflitos['Chaves Novas'].iloc[0] == '0000010, 0000020'
+    assert len(mapa.avisos()) == 1
+
+
+def test_ciclo_nao_traduz_e_gera_aviso():
+    mapa = compilar_depara(_depara([
+        ('2025_JUNHO', '0000001', '0000002'),
+        ('2025_JUNHO', '0000002', '0000001'),
+        # Cadeia que entra no ciclo e cadeia independente
+        ('2025_JUNHO', '0000005', '0000001'),
+        ('2025_JUNHO', '0000007', '0000008'),
+    ]))
+    assert mapa.aplicar([1, 2, 5, 7]).tolist() == [1, 2, 5, 8]
+    assert mapa.ciclos == [[1, 2, 1]]
+    assert mapa.levam_a_ciclo == [5]
+    avisos = mapa.avisos()
+    assert len(avisos) == 2
+    assert '0000001 -> 0000002 -> 0000001' in avisos[0]
+    assert '0000005' in avisos[1]
@@ -0,0 +1,67 @@
+import os
+import shutil
+
+import pytest
+
+import cache_fontes
+from conciliacao import LEITORES_EXTRATO, carregar_extratos, descobrir_extratos, identificar_leitor
+
+PASTA_EXTRATOS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'extratos_consolidados')
+
+
+@pytest.fixture(autouse=True)
+def cache_temporario(tmp_path, monkeypatch):
+    monkeypatch.setattr(cache_fontes, 'PASTA_CACHE', str(tmp_path / 'cache'))
+
+
+def _copiar(pasta, origem, destino):
+    shutil.copy(os.path.join(PASTA_EXTRATOS, origem), pasta / destino)
+    return str(pasta / destino)
+
+
+def test_banco_reconhecido_pelo_conteudo_quando_o_nome_nao_diz(tmp_path):
+    cef = _copiar(tmp_path, 'extrato_cef_julho_2025.cef', 'caixa.txt')
+    bb = tmp_path / 'bb.txt'
+    bb.write_text('"Agência","Conta","Saldo em conta","Saldo investido","Saldo total"\n"1234-5","99-1","1,00","0","1,00"\n',
+                  encoding='utf-8-sig')
+    outro = tmp_path / 'outro.csv'
+    outro.write_text('Conta;Data;Valor\n1;01/07/2025;1,00\n', encoding='utf-8')
+
+    assert identificar_leitor(cef, 'itau', 'txt') is LEITORES_EXTRATO['cef']
+    assert identificar_leitor(str(bb)) is LEITORES_EXTRATO['bb']
+    assert identificar_leitor(str(outro), 'bb', 'txt') is None
+    # Banco e extensão do nome bastam, sem abrir o arquivo
+    assert identificar_leitor(str(tmp_path / 'inexistente.cef'), 'cef', 'cef') is LEITORES_EXTRATO['cef']
+    assert identificar_leitor(str(tmp_path / 'inexistente.txt')) is None
+
+
+def test_descoberta_agrupa_por_mes_e_banco_em_ordem_cronologica(tmp_path):
+    _copiar(tmp_path, 'extrato_bb_agosto_2025.csv', 'extrato_bb_agosto_2025.csv')
+    _copiar(tmp_path, 'extrato_bb_julho_2025.csv', 'extrato_bb_julho_2025.csv')
+    _copiar(tmp_path, 'extrato_bb_julho_2025.csv', 'extrato_bb_julho_2025_2.csv')
+    _copiar(tmp_path, 'extrato_cef_julho_2025.cef', 'extrato_caixa_julho_2025.txt')
+    (tmp_path / 'extrato_bb_julho_2025.pdf').write_bytes(b'%PDF-1.4')
+    (tmp_path / 'leia-me.txt').write_text('nada', encoding='utf-8')
+
+    extratos = descobrir_extratos(str(tmp_path))
+    assert list(extratos) == ['julho_2025', 'agosto_2025']
+    assert {banco: [os.path.basename(c) for c in caminhos] for banco, caminhos in extratos['julho_2025'].items()} == {
+        'bb': ['extrato_bb_julho_2025.csv', 'extrato_bb_julho_2025_2.csv'], 'cef': ['extrato_caixa_julho_2025.txt']}
+
+
+def test_carga_concatena_os_arquivos_de_cada_banco(tmp_path):
+    bb = _copiar(tmp_path, 'extrato_bb_julho_2025.csv', 'extrato_bb_julho_2025.csv')
+    bb_2 = _copiar(tmp_path, 'extrato_bb_agosto_2025.csv', 'extrato_bb_julho_2025_2.csv')
+    cef = _copiar(tmp_path, 'extrato_cef_julho_2025.cef', 'extrato_cef_julho_2025.cef')
+    registros = []
+
+    extratos, avisos = carregar_extratos({'bb': [bb, bb_2, str(tmp_path / 'faltando.csv')], 'cef': [cef]},
+                                         registrar_leitura=registros.append)
+
+    separados = [LEITORES_EXTRATO['bb'].ler(bb), LEITORES_EXTRATO['bb'].ler(bb_2)]
+    assert len(extratos['bb']) == sum(len(df) for df in separados)
+    assert extratos['bb'].attrs['contagens']['linhas_lidas'] == sum(df.attrs['contagens']['linhas_lidas'] for df in separados)
+    assert len(extratos['cef']) == len(LEITORES_EXTRATO['cef'].ler(cef))
+    assert [registro['arquivo'] for registro in registros] == [
+        'extrato_bb_julho_2025.csv', 'extrato_bb_julho_2025_2.csv', 'faltando.csv', 'extrato_cef_julho_2025.cef']
+    assert [nivel for nivel, _ in avisos['bb']] == ['warning']
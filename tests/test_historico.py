@@ -0,0 +1,67 @@
+import pandas as pd
+
+from conciliacao import SITUACAO_CONCILIADA, SITUACAO_SOMENTE_EXTRATO
+from historico import contas_divergentes_consecutivas, evolucao_conta, meses_registrados, registrar_conciliacao
+
+
+def _linhas(diferencas):
+    """Linhas da conciliação (centavos) com a diferença de movimento de cada chave."""
+    chaves = list(diferencas)
+    return pd.DataFrame({
+        'Conta Bancária': [f'001-2234-{chave:07d}-BB' for chave in chaves],
+        'Saldo_Corrente_Contabil': 1000,
+        'Saldo_Corrente_Extrato': [1000 - diferencas[chave] for chave in chaves],
+        'Diferenca_Movimento': [diferencas[chave] for chave in chaves],
+        'Saldo_Aplicado_Contabil': 0,
+        'Saldo_Aplicado_Extrato': 0,
+        'Diferenca_Aplicacao': 0,
+        'Situacao': SITUACAO_CONCILIADA,
+    }, index=pd.Index(chaves, name='Chave Primaria'))
+
+
+def _registrar(caminho, mes_ano, diferencas):
+    linhas = _linhas(diferencas)
+    registrar_conciliacao(mes_ano, linhas, pd.Series('bb', index=linhas.index), caminho)
+
+
+def test_sequencias_de_meses_divergentes_param_no_mes_sem_conciliacao(tmp_path):
+    caminho = str(tmp_path / 'historico.sqlite3')
+    # Sem fevereiro gravado; chave 3 bate em janeiro
+    _registrar(caminho, 'outubro_2024', {1: 100, 2: 0, 3: 0})
+    _registrar(caminho, 'novembro_2024', {1: 100, 2: 50, 3: 0})
+    _registrar(caminho, 'dezembro_2024', {1: 100, 2: 50, 3: 0})
+    _registrar(caminho, 'janeiro_2025', {1: 100, 2: 50, 3: 0})
+    _registrar(caminho, 'março_2025', {1: 100, 2: 50, 3: 70})
+    _registrar(caminho, 'abril_2025', {1: 250, 2: 50, 3: 70})
+
+    todas = contas_divergentes_consecutivas(3, em_aberto=False, caminho=caminho)
+    assert list(zip(todas['Chave'], todas['Desde'], todas['Até'], todas['Meses'])) == [
+        ('0000001', 'Outubro 2024', 'Janeiro 2025', 4), ('0000002', 'Novembro 2024', 'Janeiro 2025', 3)]
+
+    abertas = contas_divergentes_consecutivas(2, caminho=caminho)
+    assert list(abertas['Chave']) == ['0000001', '0000002', '0000003']
+    assert (abertas['Desde'] == 'Março 2025').all() and (abertas['Meses'] == 2).all()
+    assert abertas.set_index('Chave').loc['0000001', 'Diferença Movimento'] == 2.5
+    assert contas_divergentes_consecutivas(3, caminho=caminho).empty
+
+
+def test_regravar_mes_substitui_linhas_e_ignora_contas_orfas(tmp_path):
+    caminho = str(tmp_path / 'historico.sqlite3')
+    _registrar(caminho, 'julho_2025', {1: 100, 2: 0})
+    linhas = _linhas({1: 0, 5: 30})
+    linhas.loc[5, 'Situacao'] = SITUACAO_SOMENTE_EXTRATO
+    assert registrar_conciliacao('julho_2025', linhas, pd.Series('bb', index=linhas.index), caminho) == 1
+
+    meses = meses_registrados(caminho)
+    assert meses[['Mês', 'Contas', 'Divergentes']].values.tolist() == [['Julho 2025', 1, 0]]
+    evolucao = evolucao_conta(1, caminho)
+    assert evolucao['Mês'].tolist() == [pd.Timestamp('2025-07-01')]
+    assert evolucao['Diferença Movimento'].tolist() == [0.0]
+    assert evolucao_conta(2, caminho).empty
+
+
+def test_consultas_sem_historico(tmp_path):
+    caminho = str(tmp_path / 'inexistente.sqlite3')
+    assert contas_divergentes_consecutivas(2, caminho=caminho) is None
+    assert evolucao_conta(1, caminho) is None
+    assert meses_registrados(caminho).empty
@@ -0,0 +1,79 @@
+import pandas as pd
+
+from lancamentos import TIPO_DATA_DESLOCADA, TIPO_DESDOBRAMENTO, TIPO_EXATO, conciliar_lancamentos
+
+COLUNAS = {'chave': 'int32', 'data': 'int32', 'valor': 'int64', 'historico': 'object', 'linha': 'int64'}
+
+
+def _lancamentos(linhas):
+    """Lançamentos no formato de ler_lancamentos a partir de tuplas (chave, dia, centavos)."""
+    df = pd.DataFrame(linhas, columns=['chave', 'data', 'valor'])
+    df['historico'] = ''
+    df['linha'] = range(1, len(df) + 1)
+    return df.astype(COLUNAS)
+
+
+def _resumo_da_chave(resultado, chave):
+    return resultado['resumo'].set_index('Chave').loc[chave]
+
+
+def test_casamento_exato_e_com_data_deslocada():
+    contabil = _lancamentos([(1, 100, 500), (1, 100, 700), (1, 100, 900)])
+    extrato = _lancamentos([(1, 100, 500), (1, 102, 700), (1, 110, 900)])
+
+    resultado = conciliar_lancamentos(contabil, extrato, janela_dias=3)
+
+    vinculos = resultado['vinculos']
+    assert sorted(zip(vinculos['Tipo'], vinculos['Valor Contábil'])) == [(TIPO_DATA_DESLOCADA, 7.0), (TIPO_EXATO, 5.0)]
+    # 900 fora da janela de 3 dias fica pendente dos dois lados
+    assert sorted(resultado['pendentes']['Lado']) == ['Contábil', 'Extrato']
+    assert (resultado['pendentes']['Valor'] == 9.0).all()
+    resumo = _resumo_da_chave(resultado, '0000001')
+    assert (resumo['Exatos'], resumo['Data Deslocada'], resumo['Desdobramentos']) == (1, 1, 0)
+    assert resumo['Diferença Pendente'] == 0
+
+
+def test_desdobramento_nos_dois_sentidos_conta_um_por_grupo():
+    # chave 1: um movimento do extrato soma três lançamentos contábeis
+    # chave 2: um lançamento contábil soma dois movimentos do extrato
+    contabil = _lancamentos([(1, 100, 300), (1, 101, 200), (1, 99, 500), (2, 100, 900)])
+    extrato = _lancamentos([(1, 100, 1000), (2, 100, 400), (2, 102, 500)])
+
+    resultado = conciliar_lancamentos(contabil, extrato, janela_dias=3)
+
+    vinculos = resultado['vinculos']
+    assert (vinculos['Tipo'] == TIPO_DESDOBRAMENTO).all()
+    assert vinculos.groupby('Chave')['Grupo'].nunique().to_dict() == {'0000001': 1, '0000002': 1}
+    assert vinculos['Grupo'].nunique() == 2
+    assert sorted(vinculos.loc[vinculos['Chave'] == '0000001', 'Valor Contábil']) == [2.0, 3.0, 5.0]
+    assert sorted(vinculos.loc[vinculos['Chave'] == '0000002', 'Valor Extrato']) == [4.0, 5.0]
+    assert resultado['pendentes'].empty
+    resumo = resultado['resumo'].set_index('Chave')
+    assert resumo['Desdobramentos'].to_dict() == {'0000001': 1, '0000002': 1}
+
+
+def test_lancamentos_repetidos_casam_um_a_um():
+    contabil = _lancamentos([(1, 100, 250)] * 3)
+    extrato = _lancamentos([(1, 100, 250)] * 2)
+
+    resultado = conciliar_lancamentos(contabil, extrato)
+
+    vinculos = resultado['vinculos']
+    assert list(vinculos['Tipo']) == [TIPO_EXATO, TIPO_EXATO]
+    assert vinculos['Linha Contábil'].is_unique and vinculos['Linha Extrato'].is_unique
+    assert list(resultado['pendentes']['Lado']) == ['Contábil']
+    assert _resumo_da_chave(resultado, '0000001')['Pendente Contábil'] == 2.5
+
+
+def test_sem_lancamentos():
+    vazio = _lancamentos([])
+
+    resultado = conciliar_lancamentos(vazio, vazio)
+    assert resultado['vinculos'].empty and resultado['pendentes'].empty and resultado['resumo'].empty
+
+    resultado = conciliar_lancamentos(_lancamentos([(1, 100, 500), (1, 101, 300)]), vazio)
+    assert resultado['vinculos'].empty
+    assert list(resultado['pendentes']['Lado']) == ['Contábil', 'Contábil']
+    resumo = _resumo_da_chave(resultado, '0000001')
+    assert (resumo['Lançamentos Contábeis'], resumo['Movimentos Extrato'], resumo['Exatos']) == (2, 0, 0)
+    assert resumo['Diferença Pendente'] == 8.0
@@ -0,0 +1,15 @@
+from monitor_extratos import MonitorExtratos
+
+
+def test_estados_guardam_apenas_os_meses_conciliados_por_ultimo(tmp_path):
+    monitor = MonitorExtratos(str(tmp_path / 'extratos'), str(tmp_path / 'depara.xlsx'), str(tmp_path / 'contabeis'),
+                              str(tmp_path / 'resultados'), caminho_historico=None, max_meses=2)
+    junho = monitor._estado_mes('junho_2025')
+    monitor._estado_mes('julho_2025')
+    assert monitor._estado_mes('junho_2025') is junho  # junho volta a ser o mais recente
+    monitor._estado_mes('agosto_2025')
+
+    assert list(monitor.estados) == ['junho_2025', 'agosto_2025']
+    assert monitor.estados['junho_2025'] is junho
+    assert monitor._estado_mes('julho_2025') is not None
+    assert 'junho_2025' not in monitor.estados
@@ -0,0 +1,56 @@
+import threading
+import time
+import tracemalloc
+
+from rastreamento import Rastreamento
+
+
+def test_execucoes_simultaneas_medem_cpu_e_memoria_por_etapa():
+    assert not tracemalloc.is_tracing()
+    barreira = threading.Barrier(2)
+    rastreamentos = {'ocupada': Rastreamento(medir_memoria=True), 'ociosa': Rastreamento(medir_memoria=True)}
+    medindo_durante_a_outra = []
+
+    def ocupada():
+        with rastreamentos['ocupada'].etapa('calculo'):
+            barreira.wait()
+            fim = time.perf_counter() + 0.3
+            while time.perf_counter() < fim:
+                sum(range(1000))
+            # A outra execução já terminou a sua etapa: o tracemalloc continua ligado para esta
+            barreira.wait()
+            medindo_durante_a_outra.append(tracemalloc.is_tracing())
+
+    def ociosa():
+        with rastreamentos['ociosa'].etapa('espera'):
+            barreira.wait()
+            time.sleep(0.3)
+        barreira.wait()
+
+    threads = [threading.Thread(target=ocupada), threading.Thread(target=ociosa)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert medindo_durante_a_outra == [True]
+    assert not tracemalloc.is_tracing()
+    registro_ocupada = rastreamentos['ocupada'].etapas[0]
+    registro_ociosa = rastreamentos['ociosa'].etapas[0]
+    # Só a CPU da própria thread conta
+    assert registro_ocupada['cpu_segundos'] >= 0.2
+    assert registro_ociosa['cpu_segundos'] < 0.1
+    for registro in (registro_ocupada, registro_ociosa):
+        assert registro['pico_memoria_mb'] is None
+        assert registro['memoria_sobreposta'] is True
+
+
+def test_etapa_isolada_mede_pico_de_memoria():
+    rastreamento = Rastreamento(medir_memoria=True)
+    with rastreamento.etapa('alocacao'):
+        dados = bytearray(8 * 1024 * 1024)
+        del dados
+    registro = rastreamento.etapas[0]
+    assert registro['pico_memoria_mb'] >= 8
+    assert 'memoria_sobreposta' not in registro
+    assert not tracemalloc.is_tracing()
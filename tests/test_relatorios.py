@@ -0,0 +1,56 @@
+import io
+import re
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from conciliacao import COLUNAS_RESULTADO
+from relatorios import create_pdf, formatar_moeda_br, to_excel
+
+
+def _resultado(quantidade, divergentes_a_cada=0):
+    """Resultado da conciliação com 'quantidade' contas (diferença de 1,50 a cada N contas)."""
+    indice = pd.Index([f'001-2234-{i:07d}-BB' for i in range(quantidade)], name='Conta Bancária')
+    valores = np.zeros((quantidade, len(COLUNAS_RESULTADO)))
+    valores[:, 0] = valores[:, 1] = 1234567890.12
+    if divergentes_a_cada:
+        valores[::divergentes_a_cada, 2] = 1.5
+    return pd.DataFrame(valores, index=indice, columns=COLUNAS_RESULTADO)
+
+
+def test_excel_em_fluxo_mantem_cabecalho_mesclado_e_formatos():
+    df = _resultado(3)
+    df.iloc[1, 4] = np.nan
+    planilha = load_workbook(io.BytesIO(to_excel(df)))['Conciliacao']
+
+    assert sorted(str(faixa) for faixa in planilha.merged_cells.ranges) == ['B1:D1', 'E1:G1']
+    assert (planilha['B1'].value, planilha['E1'].value) == ('Conta Movimento', 'Aplicação Financeira')
+    assert [c.value for c in planilha[2]] == ['Conta Bancária'] + list(COLUNAS_RESULTADO.get_level_values(1))
+    assert [c.value for c in planilha[3]] == ['001-2234-0000000-BB', 1234567890.12, 1234567890.12, 0, 0, 0, 0]
+    assert planilha['F4'].value is None
+    assert planilha['B3'].number_format == '#,##0.00'
+    assert planilha.max_row == 5
+    # Largura pelo maior texto: a conta e o valor formatado '1.234.567.890,12'
+    assert planilha.column_dimensions['A'].width == len('001-2234-0000000-BB') + 2
+    assert planilha.column_dimensions['B'].width == len('1.234.567.890,12') + 2
+    assert planilha.column_dimensions['D'].width == len('Diferença') + 2
+
+
+def _paginas(pdf):
+    return len(re.findall(rb'/Type /Page\b', pdf))
+
+
+def test_formatacao_em_reais_de_uma_vez():
+    valores = pd.Series([-1234567.891, 0, np.nan, 1000, 0.05, 999999.995])
+    assert formatar_moeda_br(valores).tolist() == ['-1.234.567,89', '0,00', '-', '1.000,00', '0,05', '1.000.000,00']
+
+
+def test_pdf_paginado_com_resumo_e_so_divergentes():
+    df = _resultado(300, divergentes_a_cada=10)
+    paginas = _paginas(create_pdf(df))
+
+    assert paginas > 1
+    assert _paginas(create_pdf(df, resumo=True)) == paginas + 1
+    assert _paginas(create_pdf(df, somente_divergentes=True)) < paginas
+    assert _paginas(create_pdf(df, formatado=formatar_moeda_br(df))) == paginas